@@ -12,6 +12,10 @@ from .models import (
     PostView,
     ActivityLog,
     Menu,
+    PostViewRollup,
+    ActivityRollup,
+    RollupWatermark,
+    Tag,
 )
 
 
@@ -69,6 +73,16 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            # last_active is read-only here and moved on by LastActiveBuffer meanwhile
+            obj.save(update_fields=[
+                field.name for field in obj._meta.concrete_fields
+                if not field.primary_key and field.name != 'last_active'
+            ])
+        else:
+            super().save_model(request, obj, form, change)
+
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -89,10 +103,18 @@ class PostAdmin(admin.ModelAdmin):
                 )
             }
         ),
-        ('Analytics', {'fields': ('views',)}),
+        ('Analytics', {'fields': ('views', 'unique_views_count', 'likes_count', 'approved_comments_count')}),
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
     )
-    readonly_fields = ['slug', 'views', 'created_at', 'updated_at']
+    readonly_fields = [
+        'slug',
+        'views',
+        'unique_views_count',
+        'likes_count',
+        'approved_comments_count',
+        'created_at',
+        'updated_at',
+    ]
 
 
 @admin.register(Project)
@@ -120,7 +142,7 @@ class CommentAdmin(admin.ModelAdmin):
 
     @admin.display(boolean=True)
     def is_reply(self, obj):
-        return obj.parent is not None
+        return obj.parent_id is not None
     date_hierarchy = 'created_at'
 
 
@@ -166,3 +188,32 @@ class MenuAdmin(admin.ModelAdmin):
     search_fields = ['title', 'url', 'external_url']
     ordering = ['menu_type', 'order', 'title']
     raw_id_fields = ['parent']
+
+
+@admin.register(PostViewRollup)
+class PostViewRollupAdmin(admin.ModelAdmin):
+    list_display = ['post', 'period', 'bucket', 'views']
+    list_filter = ['period']
+    raw_id_fields = ['post']
+    date_hierarchy = 'bucket'
+
+
+@admin.register(ActivityRollup)
+class ActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ['action', 'entity_type', 'period', 'bucket', 'count']
+    list_filter = ['period', 'action', 'entity_type']
+    date_hierarchy = 'bucket'
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_id', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    search_fields = ['name', 'slug']
+    # Links are rebuilt from the posts' and projects' tag strings; edit those instead
+    readonly_fields = ['slug']
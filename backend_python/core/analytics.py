@@ -0,0 +1,193 @@
+"""Precomputed analytics for the admin dashboard.
+
+The dashboard polls ``/analytics``, so its totals are computed at most once
+per ``ANALYTICS_SNAPSHOT_MAX_AGE`` seconds and served from the cache in
+between. ``manage.py refresh_analytics`` can rebuild the snapshot on a
+schedule so requests never pay for it.
+
+Time series come from hourly/daily rollup tables that ``run_rollups``
+(``manage.py rollup_analytics``) fills incrementally from ``PostView`` and
+``ActivityLog``, so chart queries never scan the raw tables.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import (
+    ActivityLog, ActivityRollup, Comment, Post, PostView, PostViewRollup, Project, RollupWatermark,
+)
+from .serializers import PostSummarySerializer
+
+SNAPSHOT_CACHE_KEY = 'analytics:snapshot'
+SNAPSHOT_LOCK_KEY = 'analytics:snapshot:lock'
+SNAPSHOT_LOCK_TIMEOUT = 30
+
+
+def compute_analytics_snapshot():
+    """Build the dashboard totals from the denormalized post counters."""
+    post_totals = Post.objects.aggregate(
+        total_posts=Count('pk'),
+        total_likes=Coalesce(Sum('likes_count'), 0),
+        total_views=Coalesce(Sum('unique_views_count'), 0),
+    )
+    popular_posts = Post.objects.select_related('author').only(
+        'id', 'title', 'slug', 'status', 'views', 'unique_views_count', 'likes_count',
+        'approved_comments_count', 'created_at', 'author__username',
+    ).order_by('-unique_views_count', '-views')[:5]
+
+    return {
+        'total_posts': post_totals['total_posts'],
+        'total_projects': Project.objects.count(),
+        'total_comments': Comment.objects.count(),
+        'total_likes': post_totals['total_likes'],
+        'total_views': post_totals['total_views'],
+        'popular_posts': PostSummarySerializer(popular_posts, many=True).data,
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def refresh_analytics_snapshot():
+    """Recompute the snapshot and store it in the cache."""
+    data = compute_analytics_snapshot()
+    cache.set(SNAPSHOT_CACHE_KEY, {'created': time.time(), 'data': data}, timeout=None)
+    return data
+
+
+def get_analytics_snapshot(max_age=None):
+    """Return the cached snapshot, recomputing it if it is older than ``max_age`` seconds.
+
+    While one request recomputes a stale snapshot, concurrent requests keep
+    getting the stale copy instead of all hitting the database at once.
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'ANALYTICS_SNAPSHOT_MAX_AGE', 60)
+
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        return refresh_analytics_snapshot()
+    if time.time() - snapshot['created'] <= max_age:
+        return snapshot['data']
+
+    if not cache.add(SNAPSHOT_LOCK_KEY, True, timeout=SNAPSHOT_LOCK_TIMEOUT):
+        return snapshot['data']
+    try:
+        return refresh_analytics_snapshot()
+    finally:
+        cache.delete(SNAPSHOT_LOCK_KEY)
+
+
+ROLLUP_PERIODS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+# source name -> (source model, timestamp field, grouping fields, rollup model, rollup value field)
+ROLLUP_SOURCES = {
+    'post_views': (PostView, 'viewed_at', ('post_id',), PostViewRollup, 'views'),
+    'activity': (ActivityLog, 'created_at', ('action', 'entity_type'), ActivityRollup, 'count'),
+}
+
+
+def _merge_totals(rollup_model, key_fields, value_field, totals):
+    """Add ``totals[(*keys, period, bucket)]`` onto existing rollup rows, creating missing ones."""
+    if not totals:
+        return
+    lookups = {'period__in': {key[-2] for key in totals}, 'bucket__in': {key[-1] for key in totals}}
+    for index, field in enumerate(key_fields):
+        lookups[f'{field}__in'] = {key[index] for key in totals}
+
+    existing = {}
+    for row in rollup_model.objects.select_for_update().filter(**lookups):
+        key = tuple(getattr(row, field) for field in key_fields) + (row.period, row.bucket)
+        existing[key] = row
+
+    to_update, to_create = [], []
+    for key, total in totals.items():
+        row = existing.get(key)
+        if row is not None:
+            setattr(row, value_field, getattr(row, value_field) + total)
+            to_update.append(row)
+        else:
+            values = dict(zip(key_fields, key[:-2]))
+            to_create.append(rollup_model(period=key[-2], bucket=key[-1], **{value_field: total}, **values))
+    rollup_model.objects.bulk_update(to_update, [value_field], batch_size=500)
+    rollup_model.objects.bulk_create(to_create, batch_size=500)
+
+
+def rollup_lag():
+    return getattr(settings, 'ROLLUP_LAG', 600)
+
+
+def rollup_source(name, batch_size=5000, lag=None):
+    """Fold source rows above the watermark into the rollup tables; returns rows processed.
+
+    Rows are taken in primary-key order in chunks of ``batch_size`` ids, and each
+    chunk's rollup changes are committed together with the advanced watermark,
+    so an interrupted run resumes where it stopped without double counting.
+
+    Ids are assigned before commit, so a row with a lower id can become
+    visible after a higher one; a watermark at the highest visible id would
+    skip it for good. The watermark therefore only advances to the highest id
+    among rows older than ``lag`` seconds (``ROLLUP_LAG``): rows are written
+    within seconds of their timestamp, so any row with a lower id has
+    committed long before.
+    """
+    source, time_field, key_fields, rollup_model, value_field = ROLLUP_SOURCES[name]
+    cutoff = timezone.now() - timedelta(seconds=rollup_lag() if lag is None else lag)
+    settled = source.objects.filter(**{f'{time_field}__lt': cutoff})
+    high = settled.aggregate(high=Max('pk'))['high'] or 0
+    processed = 0
+
+    RollupWatermark.objects.get_or_create(name=name)
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(name=name)
+            if watermark.last_id >= high:
+                break
+            upper = min(watermark.last_id + batch_size, high)
+            chunk = source.objects.filter(pk__gt=watermark.last_id, pk__lte=upper).order_by()
+
+            totals = {}
+            for period, truncate in ROLLUP_PERIODS.items():
+                grouped = chunk.annotate(bucket=truncate(time_field)).values(*key_fields, 'bucket')
+                for row in grouped.annotate(total=Count('pk')):
+                    key = tuple(row[field] for field in key_fields) + (period, row['bucket'])
+                    totals[key] = row['total']
+                    if period == 'hour':
+                        processed += row['total']
+            _merge_totals(rollup_model, key_fields, value_field, totals)
+
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+    return processed
+
+
+def run_rollups(batch_size=5000, lag=None):
+    """Bring every rollup table up to date; returns rows processed per source."""
+    return {name: rollup_source(name, batch_size=batch_size, lag=lag) for name in ROLLUP_SOURCES}
+
+
+def view_series(period, start, end, post_id=None):
+    """Views per bucket in ``[start, end)``, for one post or summed over all posts."""
+    rollups = PostViewRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end)
+    if post_id is not None:
+        rollups = rollups.filter(post_id=post_id)
+    return list(rollups.values('bucket').annotate(views=Sum('views')).order_by('bucket'))
+
+
+def activity_series(period, start, end, action=None, entity_type=None):
+    """Activity entries per bucket and action in ``[start, end)``."""
+    rollups = ActivityRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end)
+    if action:
+        rollups = rollups.filter(action=action)
+    if entity_type:
+        rollups = rollups.filter(entity_type=entity_type)
+    return list(
+        rollups.values('bucket', 'action').annotate(count=Sum('count')).order_by('bucket', 'action')
+    )
@@ -0,0 +1,220 @@
+"""Async-native read endpoints, routed by ``portfolio.asgi`` ahead of the DRF views.
+
+Under ASGI a sync view holds a thread from the ``sync_to_async`` pool for
+its whole run, cache lookups and JSON rendering included. These views run
+on the event loop instead: only the queries themselves go through Django's
+async ORM (``aget``, ``async for``), and the cache through its async API.
+They reuse the viewsets' querysets and serializers, share response-cache
+entries with the sync views and return the same JSON; requests other than
+GET/HEAD are passed on to the sync DRF view of the same route.
+
+Before a view runs, the DRF view of its route is set up and its checks
+(content negotiation, authentication, permissions, throttles) run in one
+thread hop, so changing a viewset's ``permission_classes`` or
+``throttle_classes`` applies here too. A failed check returns DRF's error
+response; a request negotiated to another renderer than JSON, such as the
+browsable API, is finished by the DRF view.
+
+Serializers run on the loop, so every relation they read is loaded by the
+queryset up front; nothing may trigger a lazy query. Image manifests are
+read in a thread beforehand and passed in the serializer context.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import slugify
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .caching import acache_response, aconditional_get
+from .images import load_manifests
+from .models import Post
+from .views import (
+    CommentViewSet, PostViewSet, ProjectViewSet, _comment_scopes, _post_detail_scopes, _post_scopes,
+    active_menus, group_menus, menu_view, reply_queryset,
+)
+
+
+def _render(response):
+    """Render a DRF ``Response`` to JSON here rather than in a thread of the handler."""
+    if not isinstance(response, Response):
+        return response
+    rendered = HttpResponse(
+        JSONRenderer().render(response.data),
+        status=response.status_code,
+        content_type='application/json',
+    )
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            rendered[header] = value
+    patch_vary_headers(rendered, ['Accept'])
+    return rendered
+
+
+def _initial(sync_view, request, args, kwargs):
+    """Set up the DRF view behind ``sync_view`` as its dispatch would and run its checks.
+
+    Returns the view and, if a check failed, the rendered error response.
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    actions = getattr(sync_view, 'actions', None)
+    if actions is not None:
+        view.action_map = {'head': actions['get'], **actions}
+        for method, action in view.action_map.items():
+            setattr(view, method, getattr(view, action))
+    view.setup(request, *args, **kwargs)
+    view.request = view.initialize_request(request, *args, **kwargs)
+    view.headers = view.default_response_headers
+    try:
+        view.initial(view.request, *args, **kwargs)
+    except Exception as exc:
+        return view, _finalize(view, view.handle_exception(exc))
+    return view, None
+
+
+def _handle(view):
+    """The rest of the DRF dispatch of a view set up by ``_initial``."""
+    try:
+        handler = getattr(view, view.request.method.lower(), view.http_method_not_allowed)
+        response = handler(view.request, *view.args, **view.kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return _finalize(view, response)
+
+
+def _finalize(view, response):
+    return view.finalize_response(view.request, response, *view.args, **view.kwargs).render()
+
+
+def asgi_view(sync_view):
+    """Serve GET/HEAD with the decorated async view and other methods with ``sync_view``.
+
+    The async view receives the DRF ``Request`` that passed the checks of
+    ``sync_view``; its ``parser_context['kwargs']`` holds the URL kwargs,
+    as the sync views' scope functions expect.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            checked, error = await sync_to_async(_initial)(sync_view, request, args, kwargs)
+            if error is not None:
+                return error
+            if checked.request.accepted_renderer.format != 'json':
+                return await sync_to_async(_handle)(checked)
+            return _render(await view(checked.request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _viewset(viewset_class, request, action, **kwargs):
+    """Viewset instance for reusing its querysets and serializer context."""
+    return viewset_class(request=request, format_kwarg=None, action=action, kwargs=kwargs)
+
+
+async def _serializer_context(viewset, objs):
+    """The viewset's serializer context plus the image manifests of ``objs``."""
+    names = [obj.image.name for obj in objs if obj.image]
+    return {**viewset.get_serializer_context(), 'manifests': await sync_to_async(load_manifests)(names)}
+
+
+async def aattach_replies(comments):
+    """``attach_replies`` with the async ORM."""
+    level = comments
+    while level:
+        by_id = {comment.id: comment for comment in level}
+        for comment in level:
+            comment.reply_list = []
+        level = [reply async for reply in reply_queryset(by_id)]
+        for reply in level:
+            by_id[reply.parent_id].reply_list.append(reply)
+    return comments
+
+
+@asgi_view(PostViewSet.as_view({'get': 'list', 'post': 'create'}))
+@aconditional_get(_post_scopes)
+@acache_response(_post_scopes)
+async def post_list(request):
+    """Get a page of posts (optionally only those with ``?tag=``) or single post by ID"""
+    viewset = _viewset(PostViewSet, request, 'list')
+    selection = viewset.get_field_selection()
+    post_id = request.query_params.get('id')
+    if post_id:
+        try:
+            post = await viewset.get_list_queryset(selection).aget(id=post_id)
+        except (Post.DoesNotExist, ValueError):
+            return Response({
+                'status': 'error',
+                'message': 'Post not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        context = await _serializer_context(viewset, [post])
+        return Response({
+            'status': 'success',
+            'data': viewset.get_serializer(post, context=context, **selection).data
+        })
+
+    posts = viewset.get_list_queryset(selection)
+    tag = request.query_params.get('tag')
+    if tag:
+        posts = posts.filter(tag_links__tag__slug=slugify(tag))
+    paginator = viewset.paginator
+    page = await paginator.apaginate_queryset(posts, request, view=viewset)
+    context = await _serializer_context(viewset, page)
+    return paginator.get_paginated_response(
+        viewset.get_serializer(page, many=True, context=context, **selection).data
+    )
+
+
+@asgi_view(PostViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+}))
+@aconditional_get(_post_detail_scopes)
+async def post_detail(request, pk):
+    """Get a single post by primary key"""
+    viewset = _viewset(PostViewSet, request, 'retrieve', pk=pk)
+    try:
+        post = await viewset.get_queryset().select_related('author').with_comments().aget(pk=pk)
+    except Post.DoesNotExist:
+        return Response({'detail': 'No Post matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(viewset.get_serializer(post, context=await _serializer_context(viewset, [post])).data)
+
+
+@asgi_view(ProjectViewSet.as_view({'get': 'list', 'post': 'create'}))
+@aconditional_get(lambda request: ['projects'])
+@acache_response(lambda request: ['projects'])
+async def project_list(request):
+    """Get all projects, optionally only those with ``?tag=``"""
+    viewset = _viewset(ProjectViewSet, request, 'list')
+    projects = [project async for project in viewset.get_list_queryset()]
+    context = await _serializer_context(viewset, projects)
+    return Response({
+        'status': 'success',
+        'data': viewset.get_serializer(projects, many=True, context=context).data
+    })
+
+
+@asgi_view(CommentViewSet.as_view({'get': 'list', 'post': 'create'}))
+@aconditional_get(_comment_scopes)
+async def comment_list(request):
+    """Get comments with optional filters"""
+    viewset = _viewset(CommentViewSet, request, 'list')
+    comments = await aattach_replies([comment async for comment in viewset.get_list_queryset()])
+    return Response({
+        'status': 'success',
+        'data': viewset.get_serializer(comments, many=True).data
+    })
+
+
+@asgi_view(menu_view)
+@aconditional_get(lambda request: ['menus'])
+@acache_response(lambda request: ['menus'])
+async def menu_list(request):
+    """Get active menus grouped by type."""
+    return Response({'status': 'success', 'data': group_menus([menu async for menu in active_menus()])})
@@ -0,0 +1,175 @@
+"""Audit logging off the request path.
+
+``log_activity`` builds an ``ActivityLog`` row and hands it to a background
+thread, which inserts queued rows with ``bulk_create``. Request handlers
+never wait for the audit ``INSERT``.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ActivityLog, User
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogWriter:
+    """Bounded queue of ``ActivityLog`` rows written in batches by a worker thread.
+
+    The worker writes when ``batch_size`` rows are waiting or ``flush_interval``
+    seconds after the first row of a batch arrived. At most ``max_pending``
+    rows are queued; further events are dropped and counted in ``dropped``.
+    Pending rows are written when the process exits.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, max_pending=10000, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'AUDIT_LOG', {})
+        return cls(
+            batch_size=options.get('BATCH_SIZE', 200),
+            flush_interval=options.get('FLUSH_INTERVAL', 1.0),
+            max_pending=options.get('MAX_PENDING', 10000),
+            background=options.get('BACKGROUND', True),
+        )
+
+    def log(self, action, user=None, entity_type='', entity_id=None, details='', ip_address=None):
+        """Queue one audit event; returns ``False`` if it was dropped."""
+        entry = ActivityLog(
+            user=user if user is not None and user.is_authenticated else None,
+            action=action,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            details=details,
+            ip_address=ip_address,
+            created_at=timezone.now(),
+        )
+        if not self.background:
+            self._write([entry])
+            return True
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        self._ensure_worker()
+        return True
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def stop(self, timeout=5.0):
+        """Ask the worker to write everything still queued and wait for it."""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _write(self, batch):
+        try:
+            # Entries of users deleted since they were queued lose their user, as
+            # on_delete=SET_NULL would have done, so one stale id cannot fail the
+            # FK check for the whole batch
+            user_ids = {entry.user_id for entry in batch if entry.user_id is not None}
+            existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+            for entry in batch:
+                if entry.user_id is not None and entry.user_id not in existing:
+                    entry.user = None
+            ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Failed to write %d activity log entries', len(batch))
+            with self._lock:
+                self.failed += len(batch)
+        else:
+            with self._lock:
+                self.written += len(batch)
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._worker is None:
+                atexit.register(self.stop)
+            self._worker = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        batch, deadline = [], None
+        try:
+            while not self._stopping.is_set():
+                timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                except queue.Empty:
+                    pass
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._write(batch)
+                    batch, deadline = [], None
+                    close_old_connections()
+
+            batch.extend(self._drain())
+            if batch:
+                self._write(batch)
+        finally:
+            close_old_connections()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_activity_log_writer():
+    """Process-wide ``ActivityLogWriter`` configured from ``settings.AUDIT_LOG``."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ActivityLogWriter.from_settings()
+    return _writer
+
+
+def log_activity(action, user=None, entity_type='', entity_id=None, details='', ip_address=None):
+    """Record an audit event without blocking the caller on the database."""
+    return get_activity_log_writer().log(
+        action,
+        user=user,
+        entity_type=entity_type,
+        entity_id=entity_id,
+        details=details,
+        ip_address=ip_address,
+    )
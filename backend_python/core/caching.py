@@ -0,0 +1,288 @@
+"""Response caching and conditional GET for public read endpoints.
+
+Cached responses are stored under keys that embed a version number per
+invalidation scope (``posts``, ``post:<id>``, ``projects``, ``menus``).
+Model signals bump the versions of the scopes a change affects, which
+orphans exactly the entries that depended on them; they then age out of
+the cache on their own. The same versions, plus the time of the last bump,
+give every response an ETag and Last-Modified without touching the
+database or the serializers.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+class CacheMetrics:
+    """Per-process hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+metrics = CacheMetrics()
+
+
+def _cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(scope):
+    return f'rcv:{scope}'
+
+
+def _modified_key(scope):
+    return f'rclm:{scope}'
+
+
+def scope_versions(scopes):
+    """Current version of each scope, initialising missing ones.
+
+    A missing version (never set, or evicted) starts from the current time
+    in milliseconds so it can never collide with a version that older cached
+    entries were stored under.
+    """
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def scopes_last_modified(scopes):
+    """Unix time of the most recent invalidation of any of ``scopes``.
+
+    Scopes with no recorded invalidation are treated as modified now, which
+    at worst costs a client one full response.
+    """
+    cache = _cache()
+    keys = [_modified_key(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    now = int(time.time())
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, now, timeout=None)
+            stamps[key] = cache.get(key, now)
+    return max(stamps.values())
+
+
+def invalidate(*scopes):
+    """Bump the version of each scope so responses cached under it are no longer served."""
+    cache = _cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+    cache.set_many({_modified_key(scope): int(time.time()) for scope in scopes}, timeout=None)
+
+
+def invalidate_on_commit(*scopes):
+    """``invalidate`` once the current transaction commits.
+
+    Invalidating earlier would let a concurrent request re-cache the old
+    rows under the new version before the write becomes visible.
+    """
+    transaction.on_commit(lambda: invalidate(*scopes))
+
+
+async def ascope_versions(scopes):
+    """``scope_versions`` through the cache's async API."""
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, int(time.time() * 1000), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+async def ascopes_last_modified(scopes):
+    """``scopes_last_modified`` through the cache's async API."""
+    cache = _cache()
+    keys = [_modified_key(scope) for scope in scopes]
+    stamps = await cache.aget_many(keys)
+    now = int(time.time())
+    for key in keys:
+        if key not in stamps:
+            await cache.aadd(key, now, timeout=None)
+            stamps[key] = await cache.aget(key, now)
+    return max(stamps.values())
+
+
+def _request_key(request, scopes, versions):
+    user = request.user
+    auth = f'user:{user.pk}' if user.is_authenticated else 'anon'
+    query = sorted(request.query_params.lists())
+    raw = repr((request.get_host(), request.path, query, auth, list(zip(scopes, versions))))
+    return 'rc:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def response_cache_key(request, scopes):
+    """Key covering the host, path, query string, auth state and scope versions of a request."""
+    return _request_key(request, scopes, scope_versions(scopes))
+
+
+async def aresponse_cache_key(request, scopes):
+    return _request_key(request, scopes, await ascope_versions(scopes))
+
+
+def cache_response(scopes):
+    """Cache successful GET responses of a DRF view under the given invalidation scopes.
+
+    ``scopes`` is a callable receiving the request and returning the scope
+    names the response depends on. Works on ``@api_view`` functions and on
+    viewset methods.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            cache = _cache()
+            key = response_cache_key(request, scopes(request))
+            cached = cache.get(key)
+            metrics.record(cached is not None)
+            if cached is not None:
+                data, status_code = cached
+                return Response(data, status=status_code)
+
+            response = view(*args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.data, response.status_code))
+            return response
+        return wrapper
+    return decorator
+
+
+def _epoch_validators(key, last_modified):
+    period = _cache().default_timeout or 300
+    epoch = int(time.time() // period)
+    etag = '"' + hashlib.sha256(f'{key}:{epoch}'.encode()).hexdigest()[:32] + '"'
+    return etag, max(last_modified, epoch * period)
+
+
+def _validators(request, scopes):
+    """Strong ETag and Last-Modified time for a response depending on ``scopes``.
+
+    Writes that bypass model signals and explicit invalidation (ad hoc
+    ``QuerySet.update()`` calls) do not bump any version, so both validators
+    also roll over once per cache timeout. That bounds how long a client can
+    keep revalidating a stale copy to the same window as the response cache
+    itself.
+    """
+    return _epoch_validators(response_cache_key(request, scopes), scopes_last_modified(scopes))
+
+
+async def _avalidators(request, scopes):
+    return _epoch_validators(await aresponse_cache_key(request, scopes), await ascopes_last_modified(scopes))
+
+
+def _add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Always revalidate; responses differ per session
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def conditional_get(scopes):
+    """Add ETag/Last-Modified to GET responses and answer matching revalidations with 304.
+
+    ``scopes`` has the same meaning as for ``cache_response``. The check runs
+    before the view, so a 304 costs a few cache lookups and no queries.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            etag, last_modified = _validators(request, scopes(request))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(*args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _add_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def acache_response(scopes):
+    """``cache_response`` for async views; shares cache entries with the sync views."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await view(request, *args, **kwargs)
+
+            cache = _cache()
+            key = await aresponse_cache_key(request, scopes(request))
+            cached = await cache.aget(key)
+            metrics.record(cached is not None)
+            if cached is not None:
+                data, status_code = cached
+                return Response(data, status=status_code)
+
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, (response.data, response.status_code))
+            return response
+        return wrapper
+    return decorator
+
+
+def aconditional_get(scopes):
+    """``conditional_get`` for async views."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+
+            etag, last_modified = await _avalidators(request, scopes(request))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _add_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,345 @@
+"""Streaming NDJSON export and import of site content.
+
+Each line is one record::
+
+    {"model": "post", "pk": 12, "fields": {"title": "...", "author": "alice", ...}}
+
+Records are written model by model in ``CONTENT_TYPES`` order, so posts come
+before the comments that point at them and parent rows before their
+children. Users are referenced by username, posts by slug and menus by
+name. Comments are written grouped by post and reference their parent by
+its primary key in the source database, which the importer only needs to
+remember for the thread it is inserting.
+
+Denormalized post counters are not exported; the importer recounts them
+for the posts it touches.
+"""
+import hashlib
+import json
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import search
+from .caching import invalidate
+from .models import Comment, Menu, Post, Project, Tag, User
+
+# kind -> (model, exported fields, {exported name: lookup} for references to other rows)
+CONTENT_TYPES = {
+    'post': (Post, [
+        'title', 'content', 'excerpt', 'category', 'tags', 'image', 'image_url', 'status',
+        'featured', 'views', 'slug', 'created_at', 'updated_at',
+    ], {'author': 'author__username'}),
+    'project': (Project, [
+        'title', 'description', 'tags', 'link', 'github_link', 'demo_link', 'image', 'image_url',
+        'category', 'featured', 'technologies', 'created_at',
+    ], {}),
+    'comment': (Comment, [
+        'comment', 'status', 'created_at',
+    ], {
+        'post': 'post_id',
+        'post_slug': 'post__slug',
+        'user': 'user__username',
+        'parent': 'parent_id',
+    }),
+    'menu': (Menu, [
+        'name', 'title', 'url', 'external_url', 'icon', 'menu_type', 'order', 'is_active', 'created_at',
+    ], {'parent': 'parent_id', 'parent_name': 'parent__name'}),
+}
+
+# Export order for kinds not exported in primary key order
+EXPORT_ORDER = {'comment': ('post_id', 'pk')}
+
+
+def comment_key(post_id, user_id, created_at, text):
+    """Natural key of a comment: post, author, time to the millisecond and a hash of its text.
+
+    Milliseconds, because that is the precision the JSON export keeps.
+    """
+    created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+    return post_id, user_id, created_at, hashlib.sha256(text.encode()).hexdigest()
+
+
+class ContentFormatError(ValueError):
+    """A line of the import stream is not a valid content record."""
+
+
+def export_records(kinds=CONTENT_TYPES, chunk_size=1000):
+    """Yield one record dict per row, streaming each table with a server-side iterator."""
+    for kind in kinds:
+        model, fields, references = CONTENT_TYPES[kind]
+        rows = model.objects.order_by(*EXPORT_ORDER.get(kind, ['pk']))
+        rows = rows.values_list('pk', *fields, *references.values())
+        names = fields + list(references)
+        for pk, *values in rows.iterator(chunk_size=chunk_size):
+            yield {'model': kind, 'pk': pk, 'fields': dict(zip(names, values))}
+
+
+def write_ndjson(records, stream):
+    """Write records one per line; returns the number written."""
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def read_ndjson(stream):
+    """Yield records from an NDJSON stream, skipping blank lines."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ContentFormatError(f'line {number}: {e}') from e
+        if not isinstance(record, dict) or record.get('model') not in CONTENT_TYPES or 'fields' not in record:
+            raise ContentFormatError(f'line {number}: not a content record')
+        yield record
+
+
+def _bulk_create(model, objs):
+    """``bulk_create`` that keeps the objects' own ``auto_now``/``auto_now_add`` values.
+
+    The insert overwrites those fields with the current time, so the
+    exported values are written back with one ``bulk_update``.
+    """
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    stamps = [[getattr(obj, name) for name in fields] for obj in objs]
+    model.objects.bulk_create(objs)
+    if not (fields and objs):
+        return
+    for obj, values in zip(objs, stamps):
+        for name, value in zip(fields, values):
+            setattr(obj, name, value)
+    model.objects.bulk_update(objs, fields)
+
+
+class ContentImporter:
+    """Insert streamed records in ``bulk_create`` batches, remapping foreign keys.
+
+    References are looked up per batch by natural key: comments find their
+    post by slug and child menus their parent by name. Replies are matched
+    to their parent through an old-to-new id map that only covers the
+    thread of the current post, so memory stays bounded by ``batch_size``
+    records plus the largest thread. Posts whose slug already exists are
+    either mapped onto the existing post (``on_conflict='skip'``) or
+    inserted under a freshly allocated slug (``'rename'``), the one case
+    where the new id has to be remembered. Existing menus are matched by
+    name and skipped. With ``'skip'`` projects are also matched by title and
+    comments by ``comment_key``, so importing the same file twice adds
+    nothing the second time.
+    """
+
+    def __init__(self, batch_size=500, on_conflict='skip', default_author=None, progress=None):
+        self.batch_size = batch_size
+        self.on_conflict = on_conflict
+        self.default_author = default_author
+        self.progress = progress
+        self.renamed_posts = {}
+        self.thread_post = None
+        self.thread_ids = {}
+        self.created = Counter()
+        self.skipped = Counter()
+        self.started = None
+
+    def run(self, records):
+        self.started = time.perf_counter()
+        kind, batch = None, []
+        for record in records:
+            if batch and (record['model'] != kind or len(batch) >= self.batch_size):
+                self._flush(kind, batch)
+                batch = []
+            kind = record['model']
+            batch.append(record)
+        if batch:
+            self._flush(kind, batch)
+        invalidate('posts', 'projects', 'menus')
+        return self.created, self.skipped
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def _flush(self, kind, batch):
+        with transaction.atomic():
+            getattr(self, f'_import_{kind}')(batch)
+        if self.progress:
+            processed = sum(self.created.values()) + sum(self.skipped.values())
+            self.progress(kind, processed, self.elapsed())
+
+    @staticmethod
+    def _users(usernames):
+        return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+    @staticmethod
+    def _fill_timestamps(obj):
+        now = timezone.now()
+        for field in ('created_at', 'updated_at'):
+            if not hasattr(obj, field):
+                continue
+            value = getattr(obj, field)
+            if value is None:
+                setattr(obj, field, now)
+            elif isinstance(value, str):
+                setattr(obj, field, parse_datetime(value))
+
+    def _import_post(self, batch):
+        users = self._users({record['fields'].get('author') for record in batch})
+        slugs = [record['fields'].get('slug') for record in batch if record['fields'].get('slug')]
+        existing = dict(Post.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+
+        posts, renamed, batch_slugs = [], [], set()
+        for record in batch:
+            fields = dict(record['fields'])
+            author_id = users.get(fields.pop('author', None), self.default_author)
+            slug = fields.get('slug') or ''
+            if author_id is None:
+                self.skipped['post'] += 1
+                continue
+            if slug in existing and self.on_conflict == 'skip':
+                self.skipped['post'] += 1
+                continue
+            if slug in existing or slug in batch_slugs:
+                fields['slug'] = ''
+                if slug:
+                    renamed.append((slug, len(posts)))
+            batch_slugs.add(slug)
+            post = Post(author_id=author_id, **fields)
+            self._fill_timestamps(post)
+            posts.append(post)
+
+        # bulk_create skips save() and its signals: slugs, tags and the search index are done here
+        _bulk_create(Post, posts)
+        # Comments name their post by its old slug, which now belongs to another post
+        self.renamed_posts.update((slug, posts[index].pk) for slug, index in renamed)
+        Tag.sync_all(posts)
+        search.index_instances(posts)
+        self.created['post'] += len(posts)
+
+    def _import_project(self, batch):
+        existing = set()
+        if self.on_conflict == 'skip':
+            titles = {record['fields'].get('title') for record in batch}
+            existing = set(Project.objects.filter(title__in=titles).values_list('title', flat=True))
+
+        projects = []
+        for record in batch:
+            if record['fields'].get('title') in existing:
+                self.skipped['project'] += 1
+                continue
+            project = Project(**record['fields'])
+            self._fill_timestamps(project)
+            projects.append(project)
+        _bulk_create(Project, projects)
+        Tag.sync_all(projects)
+        search.index_instances(projects)
+        self.created['project'] += len(projects)
+
+    def _import_comment(self, batch):
+        # Comments arrive grouped by post: only the thread still going on at
+        # the end of the previous batch can have replies here
+        if batch[0]['fields'].get('post') != self.thread_post:
+            self.thread_ids = {}
+        users = self._users({record['fields'].get('user') for record in batch})
+        slugs = {record['fields'].get('post_slug') for record in batch} - set(self.renamed_posts)
+        by_slug = dict(Post.objects.filter(slug__in=slugs - {None}).values_list('slug', 'id'))
+        by_slug.update(self.renamed_posts)
+
+        pending = []
+        for record in batch:
+            fields = dict(record['fields'])
+            fields.pop('post', None)
+            post_id = by_slug.get(fields.pop('post_slug', None))
+            user_id = users.get(fields.pop('user', None))
+            old_parent = fields.pop('parent', None)
+            if post_id is None or user_id is None:
+                self.skipped['comment'] += 1
+                continue
+            # Replies whose parent was not imported become top-level comments
+            comment = Comment(post_id=post_id, user_id=user_id, **fields)
+            self._fill_timestamps(comment)
+            pending.append((record['pk'], old_parent, comment))
+
+        if self.on_conflict == 'skip':
+            pending = self._skip_existing_comments(pending)
+        comments = self._insert_tree(Comment, pending, self.thread_ids)
+        self.thread_post = batch[-1]['fields'].get('post')
+        self.thread_ids = {
+            record['pk']: self.thread_ids[record['pk']] for record in batch
+            if record['fields'].get('post') == self.thread_post and record['pk'] in self.thread_ids
+        }
+        Post.objects.filter(pk__in={comment.post_id for comment in comments}).recount()
+
+    def _skip_existing_comments(self, pending):
+        """Drop comments already in the database; their replies attach to the stored rows."""
+        if not pending:
+            return pending
+        comments = [comment for _, _, comment in pending]
+        stamps = [comment.created_at for comment in comments]
+        margin = timedelta(milliseconds=1)
+        rows = Comment.objects.filter(
+            post_id__in={comment.post_id for comment in comments},
+            created_at__range=(min(stamps) - margin, max(stamps) + margin),
+        ).values_list('id', 'post_id', 'user_id', 'created_at', 'comment')
+        existing = {comment_key(*row[1:]): row[0] for row in rows}
+
+        remaining = []
+        for key, parent_key, comment in pending:
+            natural_key = comment_key(comment.post_id, comment.user_id, comment.created_at, comment.comment)
+            existing_id = existing.get(natural_key)
+            if existing_id is None:
+                remaining.append((key, parent_key, comment))
+            else:
+                self.thread_ids[key] = existing_id
+                self.skipped['comment'] += 1
+        return remaining
+
+    def _import_menu(self, batch):
+        names = {record['fields'].get('name') for record in batch}
+        names |= {record['fields'].get('parent_name') for record in batch}
+        existing = dict(Menu.objects.filter(name__in=names).values_list('name', 'id'))
+
+        pending = []
+        for record in batch:
+            fields = dict(record['fields'])
+            fields.pop('parent', None)
+            parent_name = fields.pop('parent_name', None)
+            if fields.get('name') in existing:
+                self.skipped['menu'] += 1
+                continue
+            menu = Menu(**fields)
+            self._fill_timestamps(menu)
+            pending.append((fields.get('name'), parent_name, menu))
+
+        self._insert_tree(Menu, pending, existing)
+
+    def _insert_tree(self, model, pending, ids):
+        """Bulk insert ``(key, parent key, obj)`` rows of a self-referencing model.
+
+        ``ids`` maps keys of rows already in the database to their ids and
+        is extended with the rows inserted here. A row can point at a parent
+        in the same batch, so rows go in one tree level per ``bulk_create``;
+        parents are re-pointed to their new ids as they become known.
+        """
+        inserted = []
+        while pending:
+            waiting = {key for key, _, _ in pending}
+            ready = [item for item in pending if item[1] not in waiting] or pending
+            for _, parent_key, obj in ready:
+                if parent_key in ids:
+                    obj.parent_id = ids[parent_key]
+            _bulk_create(model, [obj for _, _, obj in ready])
+            ids.update((key, obj.pk) for key, _, obj in ready)
+            inserted.extend(obj for _, _, obj in ready)
+            done = {id(item) for item in ready}
+            pending = [item for item in pending if id(item) not in done]
+        self.created[model._meta.model_name] += len(inserted)
+        return inserted
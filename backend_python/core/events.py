@@ -0,0 +1,242 @@
+"""Live post activity pushed to browsers over server-sent events.
+
+``GET /posts/<id>/events`` (served by the ASGI application) keeps one
+connection per viewer open and streams:
+
+* ``counters`` - the post's like, comment and view counters, once on
+  connect and again whenever they change;
+* ``comment`` - a newly approved comment;
+* ``like`` - a user liked (``liked: true``) or unliked the post.
+
+Model signals publish to the topic ``post:<id>`` once their transaction
+commits. ``LocalBroker`` fans events out inside the process to an
+``asyncio.Queue`` per subscriber, on that subscriber's event loop; slow
+subscribers lose their oldest events instead of growing without bound.
+Nothing is queried or serialized for a topic nobody is subscribed to.
+
+With several processes, ``EVENTS['BROKER'] = 'redis'`` relays every event
+through the pub/sub of a Redis server so that each process delivers it to
+its own subscribers.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('likes_count', 'approved_comments_count', 'views', 'unique_views_count')
+
+
+def _options():
+    return getattr(settings, 'EVENTS', {})
+
+
+def post_topic(post_id):
+    return f'post:{post_id}'
+
+
+def format_event(event_type, data):
+    """One ``text/event-stream`` message."""
+    return f'event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+class Subscription:
+    """Bounded queue of events for one subscriber, fed from any thread."""
+
+    def __init__(self, broker, topic, maxsize):
+        self.broker = broker
+        self.topic = topic
+        self.dropped = 0
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next ``(type, data)`` event, or ``None`` after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub: topic -> subscriptions."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.published = 0
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        """Subscribe the running event loop to ``topic``."""
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def has_subscribers(self, topic):
+        return topic in self._topics
+
+    def publish(self, topic, event_type, data):
+        self.deliver(topic, (event_type, data))
+
+    def deliver(self, topic, event):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The subscriber's event loop is closed
+                self.unsubscribe(subscription)
+        self.published += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._topics),
+                'subscribers': sum(len(subscribers) for subscribers in self._topics.values()),
+                'published': self.published,
+            }
+
+
+class RedisBroker(LocalBroker):
+    """``LocalBroker`` whose events travel through Redis pub/sub to every process."""
+
+    CHANNEL_PREFIX = 'portfolio:events:'
+
+    def __init__(self, url, queue_size=100, client=None):
+        super().__init__(queue_size)
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self._listener = None
+
+    def subscribe(self, topic):
+        self._ensure_listener()
+        return super().subscribe(topic)
+
+    def has_subscribers(self, topic):
+        # Other processes may have subscribers
+        return True
+
+    def publish(self, topic, event_type, data):
+        message = json.dumps([event_type, data], cls=DjangoJSONEncoder)
+        self._redis.publish(f'{self.CHANNEL_PREFIX}{topic}', message)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='event-relay', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.CHANNEL_PREFIX}*')
+        for message in pubsub.listen():
+            try:
+                topic = message['channel'].decode()[len(self.CHANNEL_PREFIX):]
+                self.deliver(topic, tuple(json.loads(message['data'])))
+            except Exception:
+                logger.exception('Dropping malformed event message')
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Process-wide broker configured from ``settings.EVENTS``."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                options = _options()
+                queue_size = options.get('QUEUE_SIZE', 100)
+                if options.get('BROKER', 'local') == 'redis':
+                    _broker = RedisBroker(options.get('REDIS_URL', 'redis://127.0.0.1:6379/2'), queue_size)
+                else:
+                    _broker = LocalBroker(queue_size)
+    return _broker
+
+
+def publish_on_commit(post_id, event_type, build):
+    """Publish ``build()`` to the post's subscribers once the current transaction commits.
+
+    ``build`` runs only if the post has subscribers. Failures are logged,
+    never raised into the code that committed.
+    """
+    topic = post_topic(post_id)
+
+    def send():
+        if not get_broker().has_subscribers(topic):
+            return
+        try:
+            get_broker().publish(topic, event_type, build())
+        except Exception:
+            logger.exception('Failed to publish %s event to %s', event_type, topic)
+
+    transaction.on_commit(send)
+
+
+def publish_counters(post_ids):
+    """Send current counters of the given posts to their subscribers, with one query."""
+    broker = get_broker()
+    post_ids = [post_id for post_id in set(post_ids) if broker.has_subscribers(post_topic(post_id))]
+    if not post_ids:
+        return
+    try:
+        for row in Post.objects.filter(pk__in=post_ids).values('id', *COUNTER_FIELDS):
+            broker.publish(post_topic(row['id']), 'counters', row)
+    except Exception:
+        logger.exception('Failed to publish counters of posts %s', post_ids)
+
+
+def publish_counters_on_commit(post_id):
+    transaction.on_commit(lambda: publish_counters([post_id]))
+
+
+async def stream(topic, initial=()):
+    """Async generator of SSE messages for ``topic``, starting with the ``initial`` events."""
+    keepalive = _options().get('KEEPALIVE', 15)
+    subscription = get_broker().subscribe(topic)
+    try:
+        # Tell EventSource to wait a few seconds before reconnecting
+        yield 'retry: 3000\n\n'
+        for event_type, data in initial:
+            yield format_event(event_type, data)
+        while True:
+            event = await subscription.get(timeout=keepalive)
+            # A comment line keeps proxies from closing an idle connection
+            yield ': keepalive\n\n' if event is None else format_event(*event)
+    finally:
+        subscription.close()
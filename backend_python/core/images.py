@@ -0,0 +1,273 @@
+"""Resized and WebP variants of uploaded images.
+
+Every uploaded ``Post.image``, ``Project.image`` and ``User.profile_image``
+gets one variant per width in ``settings.IMAGE_VARIANTS['WIDTHS']``. Each
+variant is written twice: as WebP and as JPEG (PNG for images with
+transparency). Files are named after the SHA-256 of the source bytes
+(``variants/ab/abcdef…-card.webp``), so identical uploads share variants
+and the URLs never change meaning.
+
+Variants are produced in a small thread pool after an upload is committed,
+or on the first request for ``<MEDIA_URL>resize/<variant>/<format>/<source>``
+when they do not exist yet. A JSON manifest per source maps the source name
+to its digest and variant files; serializers read it to emit ``srcset``
+URLs that point straight at the hashed files.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .caching import invalidate
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'variants'
+# upload_to directories of the image fields that get variants
+SOURCE_DIRS = ('posts/', 'projects/', 'profiles/')
+MANIFEST_DIR = f'{VARIANT_DIR}/sources'
+FORMATS = ('webp', 'fallback')
+
+
+def _options():
+    return getattr(settings, 'IMAGE_VARIANTS', {})
+
+
+def variant_widths():
+    """Variant name -> maximum width, smallest first."""
+    widths = _options().get('WIDTHS', {'thumb': 320, 'card': 800, 'full': 1600})
+    return dict(sorted(widths.items(), key=lambda item: item[1]))
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_name(source_name):
+    return f'{MANIFEST_DIR}/{hashlib.sha256(source_name.encode()).hexdigest()[:32]}.json'
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+MANIFEST_CACHE_SIZE = 4096
+
+
+def load_manifest(source_name):
+    """Manifest of a source image, or ``None`` if its variants were not generated yet.
+
+    Found manifests are kept in memory; they never change for a given
+    source name because uploads are never overwritten in place.
+    """
+    manifest = _manifests.get(source_name)
+    if manifest is not None:
+        return manifest
+    try:
+        with open(default_storage.path(_manifest_name(source_name)), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _manifests_lock:
+        if len(_manifests) >= MANIFEST_CACHE_SIZE:
+            _manifests.clear()
+        _manifests[source_name] = manifest
+    return manifest
+
+
+def load_manifests(source_names):
+    """``{source name: manifest or None}`` for several images at once.
+
+    Lets async views read the manifest files in one thread before
+    serializing, and hand the result to ``variant_urls``.
+    """
+    return {name: load_manifest(name) for name in set(source_names)}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _save(image, path, fmt, alpha):
+    options = _options()
+    if fmt == 'webp':
+        image.save(path, 'WEBP', quality=options.get('WEBP_QUALITY', 80), method=4)
+    elif alpha:
+        image.save(path, 'PNG', optimize=True)
+    else:
+        image.save(path, 'JPEG', quality=options.get('QUALITY', 82), optimize=True, progressive=True)
+
+
+_generation_locks = {}
+_generation_locks_lock = threading.Lock()
+
+
+def _source_lock(source_name):
+    with _generation_locks_lock:
+        return _generation_locks.setdefault(source_name, threading.Lock())
+
+
+def generate_variants(source_name):
+    """Write every missing variant of a stored image and its manifest; returns the manifest.
+
+    Raises ``ValueError`` if the source is missing or not a readable image.
+    """
+    manifest = load_manifest(source_name)
+    if manifest is not None:
+        return manifest
+
+    with _source_lock(source_name):
+        manifest = load_manifest(source_name)
+        if manifest is not None:
+            return manifest
+        try:
+            path = default_storage.path(source_name)
+            digest = file_digest(path)
+            manifest = _render(path, digest)
+        except Image.DecompressionBombError as e:
+            raise ValueError(f'Image {source_name!r} exceeds the pixel limit: {e}') from e
+        except (OSError, UnidentifiedImageError) as e:
+            raise ValueError(f'Cannot process image {source_name!r}: {e}') from e
+        manifest['source'] = source_name
+        _write_atomic(
+            default_storage.path(_manifest_name(source_name)),
+            lambda tmp: _write_json(tmp, manifest),
+        )
+        # Cached listings still carry the lazy URLs; let them pick up the hashed ones
+        invalidate('posts', 'projects')
+    with _generation_locks_lock:
+        _generation_locks.pop(source_name, None)
+    return manifest
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def _render(path, digest):
+    widths = variant_widths()
+    with Image.open(path) as image:
+        # JPEG can decode straight at a reduced scale that still covers the largest variant
+        image.draft('RGB', (max(widths.values()), max(widths.values())))
+        image = ImageOps.exif_transpose(image)
+        alpha = _has_alpha(image)
+        image = image.convert('RGBA' if alpha else 'RGB')
+
+        variants = {}
+        # Largest first, each resized from the previous one rather than from the original
+        for name, max_width in reversed(list(widths.items())):
+            width = min(max_width, image.width)
+            if width < image.width:
+                image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+            files = {}
+            for fmt in FORMATS:
+                ext = 'webp' if fmt == 'webp' else ('png' if alpha else 'jpg')
+                name_on_disk = f'{VARIANT_DIR}/{digest[:2]}/{digest}-{name}.{ext}'
+                target = default_storage.path(name_on_disk)
+                if not os.path.exists(target):
+                    _write_atomic(target, lambda tmp, fmt=fmt, img=image: _save(img, tmp, fmt, alpha))
+                files[fmt] = name_on_disk
+            variants[name] = {'width': image.width, 'height': image.height, **files}
+
+    return {'digest': digest, 'variants': {name: variants[name] for name in widths}}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_options().get('WORKERS', 2),
+                    thread_name_prefix='image-variants',
+                )
+    return _executor
+
+
+def _generate_logged(source_name):
+    try:
+        generate_variants(source_name)
+    except ValueError:
+        logger.warning('Skipping image variants for %s', source_name, exc_info=True)
+
+
+def schedule_variants(field_file):
+    """Queue variant generation for a stored image unless it is already done or disabled."""
+    if not field_file or not _options().get('EAGER', True):
+        return
+    if load_manifest(field_file.name) is None:
+        _get_executor().submit(_generate_logged, field_file.name)
+
+
+def is_source(name):
+    """Whether ``name`` is a stored upload that variants may be generated for."""
+    return (
+        name.startswith(SOURCE_DIRS)
+        and '..' not in name.split('/')
+        and default_storage.exists(name)
+    )
+
+
+def lazy_url(source_name, variant, fmt):
+    """URL that generates a variant on first request and redirects to its hashed file."""
+    return f'{settings.MEDIA_URL}resize/{variant}/{fmt}/{source_name}'
+
+
+def variant_urls(field_file, request=None, manifests=None):
+    """``srcset``-ready URLs for an image field, or ``None`` without an image.
+
+    Points at the hashed files once the variants exist and at the lazy
+    ``resize`` URLs until then. The manifest is taken from ``manifests``
+    (see ``load_manifests``) when given, without touching the disk.
+    """
+    if not field_file:
+        return None
+    if manifests is not None:
+        manifest = manifests.get(field_file.name)
+    else:
+        manifest = load_manifest(field_file.name)
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    data = {}
+    for name, max_width in variant_widths().items():
+        if manifest is not None and name in manifest['variants']:
+            variant = manifest['variants'][name]
+            width = variant['width']
+            urls = {fmt: absolute(default_storage.url(variant[fmt])) for fmt in FORMATS}
+        else:
+            width = max_width
+            urls = {fmt: absolute(lazy_url(field_file.name, name, fmt)) for fmt in FORMATS}
+        data[name] = {'width': width, 'url': urls['fallback'], 'webp': urls['webp']}
+
+    # Small originals give several variants the same width; list each width once
+    distinct = {variant['width']: variant for variant in data.values()}.values()
+    data['srcset'] = ', '.join(f"{variant['url']} {variant['width']}w" for variant in distinct)
+    data['webp_srcset'] = ', '.join(f"{variant['webp']} {variant['width']}w" for variant in distinct)
+    return data
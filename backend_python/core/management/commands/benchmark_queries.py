@@ -0,0 +1,145 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ActivityLog, Comment, Menu, Post, PostView, Project, Tag, User
+
+
+class _Rollback(Exception):
+    pass
+
+
+def seed_dataset(posts=2000, comments_per_post=5, views_per_post=20, batch_size=1000):
+    """Bulk-insert a synthetic dataset shaped like production traffic."""
+    rng = random.Random(42)
+    now = timezone.now()
+    authors = User.objects.bulk_create([
+        User(username=f'bench-user-{i}', email=f'bench-user-{i}@example.com')
+        for i in range(50)
+    ])
+    statuses = ['published'] * 8 + ['draft', 'archived']
+    categories = ['python', 'django', 'react', 'devops', 'career']
+
+    new_posts = []
+    for i in range(posts):
+        category = rng.choice(categories)
+        new_posts.append(Post(
+            title=f'Benchmark post {i}',
+            slug=f'benchmark-post-{i}',
+            content='Lorem ipsum dolor sit amet. ' * 40,
+            excerpt='Lorem ipsum',
+            category=category,
+            tags=category,
+            author=rng.choice(authors),
+            status=rng.choice(statuses),
+            featured=rng.random() < 0.05,
+            views=rng.randint(0, 5000),
+        ))
+    new_posts = Post.objects.bulk_create(new_posts, batch_size=batch_size)
+    # auto_now_add ignores explicit values, so spread creation times afterwards
+    for i, post in enumerate(new_posts):
+        post.created_at = now - timedelta(minutes=i * 7)
+    Post.objects.bulk_update(new_posts, ['created_at'], batch_size=batch_size)
+    Tag.sync_all(new_posts)
+
+    Comment.objects.bulk_create([
+        Comment(
+            post=post,
+            user=rng.choice(authors),
+            comment='Great read!',
+            status=rng.choice(['approved', 'approved', 'approved', 'pending', 'spam']),
+        )
+        for post in new_posts
+        for _ in range(comments_per_post)
+    ], batch_size=batch_size)
+    PostView.objects.bulk_create([
+        PostView(post=post, ip_address=f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}')
+        for post in new_posts
+        for _ in range(views_per_post)
+    ], batch_size=batch_size)
+    ActivityLog.objects.bulk_create([
+        ActivityLog(action='comment_created', entity_type='comment', entity_id=i)
+        for i in range(posts * 2)
+    ], batch_size=batch_size)
+    Project.objects.bulk_create([
+        Project(title=f'Benchmark project {i}', description='Project') for i in range(200)
+    ], batch_size=batch_size)
+    Menu.objects.bulk_create([
+        Menu(
+            name=f'bench-menu-{i}',
+            title=f'Menu {i}',
+            url=f'/page-{i}',
+            menu_type=rng.choice(['header', 'footer', 'sidebar']),
+            order=i,
+            is_active=rng.random() < 0.7,
+        )
+        for i in range(100)
+    ], batch_size=batch_size)
+    return new_posts
+
+
+def hot_querysets(post_id):
+    """The filter/order paths of ``core.views`` and ``core.analytics``, keyed by a short label."""
+    week_ago = timezone.now() - timedelta(days=7)
+    return [
+        ('posts: cursor page', Post.objects.order_by('-created_at', '-id')[:20]),
+        (
+            'posts: cursor page for tag',
+            Post.objects.filter(tag_links__tag__slug='django').order_by('-created_at', '-id')[:20],
+        ),
+        ('posts: popular', Post.objects.order_by('-unique_views_count', '-views')[:5]),
+        ('comments: for post', Comment.objects.filter(post_id=post_id).order_by('-created_at')),
+        (
+            'comments: approved for post',
+            Comment.objects.filter(post_id=post_id, status='approved').order_by('-created_at'),
+        ),
+        ('comments: moderation queue', Comment.objects.filter(status='pending').order_by('-created_at')[:50]),
+        ('activity: latest', ActivityLog.objects.order_by('-created_at')[:50]),
+        ('post views: recent for post', PostView.objects.filter(post_id=post_id, viewed_at__gte=week_ago)),
+        ('projects: latest', Project.objects.order_by('-created_at')),
+        ('menus: active', Menu.objects.filter(is_active=True).order_by('menu_type', 'order', 'title')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway dataset and report timings and query plans for the hot querysets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000, help='Number of posts to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query when timing')
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Commit the seeded rows instead of rolling them back',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('Seeded rows rolled back')
+
+    def run(self, options):
+        started = time.perf_counter()
+        posts = seed_dataset(posts=options['posts'])
+        self.stdout.write(f'Seeded {len(posts)} posts in {time.perf_counter() - started:.2f}s')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        repeat = max(options['repeat'], 1)
+        for label, queryset in hot_querysets(posts[len(posts) // 2].pk):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: {elapsed_ms:.2f} ms'))
+            self.stdout.write(queryset.explain())
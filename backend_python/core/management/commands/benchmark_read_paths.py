@@ -0,0 +1,248 @@
+import asyncio
+import io
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/posts/', '/posts/?view=summary', '/projects/', '/comments/', '/menus']
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or ``None`` where ``resource`` is missing."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _with_marker(path, marker):
+    """``path`` with a unique query parameter, which gives it its own response cache entry."""
+    return f"{path}{'&' if '?' in path else '?'}_bench={marker}"
+
+
+def wsgi_get(handler, path):
+    """GET ``path`` through a WSGI handler and return the status code."""
+    url = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_ACCEPT': 'application/json',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split()[0]))
+
+    response = handler(environ, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return status[0]
+
+
+async def asgi_get(application, path):
+    """GET ``path`` through an ASGI application and return the status code."""
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    body_sent = False
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the response is complete
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class ThreadSampler(threading.Thread):
+    """Record the highest number of live threads (itself included) while running."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(name='thread-sampler', daemon=True)
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare sync WSGI worker threads with the async ASGI read path: '
+        'throughput, latency, threads and peak memory, each mode in a process of its own'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help=f"Paths to request in turn (default: {' '.join(DEFAULT_PATHS)})")
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Requests in flight at once in either mode (WSGI: that many worker threads)',
+        )
+        parser.add_argument(
+            '--vary',
+            action='store_true',
+            help='Add a unique query parameter to every request so that the response cache never hits',
+        )
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Also trace Python allocations and report the peak (slows both modes down)',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        if options['mode'] == 'both':
+            # A fresh process per mode: neither inherits the other's heap, threads or warm caches
+            for mode in ('wsgi', 'asgi'):
+                self.stdout.flush()
+                subprocess.run(self.child_command(mode, options), check=True)
+            return
+
+        paths = options['paths'] or DEFAULT_PATHS
+        urls = [paths[i % len(paths)] for i in range(options['requests'])]
+        mode = options['mode']
+        if options['vary']:
+            # Unique per mode too: both modes share the response cache
+            run_id = uuid.uuid4().hex[:8]
+            urls = [_with_marker(url, f'{run_id}-{mode}-{i}') for i, url in enumerate(urls)]
+        runner = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+        if options['memory']:
+            tracemalloc.start()
+        threads_before = threading.active_count()
+        sampler = ThreadSampler()
+        sampler.start()
+        started = time.perf_counter()
+        latencies, statuses = runner(urls, options)
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        traced = None
+        if options['memory']:
+            traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.report(mode, latencies, statuses, elapsed, sampler.peak - threads_before - 1, peak_rss(), traced)
+
+    def child_command(self, mode, options):
+        """``manage.py`` command line running this benchmark for ``mode`` alone."""
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_read_paths', *options['paths'],
+            '--mode', mode, '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+        ]
+        command += [f'--{flag}' for flag in ('vary', 'memory') if options[flag]]
+        return command
+
+    def run_wsgi(self, urls, options):
+        """Fire ``urls`` at the WSGI handler from a pool of worker threads."""
+        handler = WSGIHandler()
+
+        def timed(url):
+            started = time.perf_counter()
+            status = wsgi_get(handler, url)
+            return time.perf_counter() - started, status
+
+        # Warm-up: resolve URLconfs and open one connection outside the measurement
+        wsgi_get(handler, urls[0])
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(timed, urls))
+        return [latency for latency, _ in results], [status for _, status in results]
+
+    def run_asgi(self, urls, options):
+        """Fire ``urls`` at the ASGI application from tasks on one event loop."""
+        from portfolio.asgi import application
+
+        async def run():
+            await asgi_get(application, urls[0])
+            pending = iter(urls)
+            results = []
+
+            async def client():
+                for url in pending:
+                    started = time.perf_counter()
+                    status = await asgi_get(application, url)
+                    results.append((time.perf_counter() - started, status))
+
+            await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+            return results
+
+        results = asyncio.run(run())
+        return [latency for latency, _ in results], [status for _, status in results]
+
+    def report(self, mode, latencies, statuses, elapsed, threads, rss, traced):
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        errors = sum(1 for status in statuses if status >= 400)
+        self.stdout.write(self.style.MIGRATE_HEADING(mode.upper()))
+        self.stdout.write(f'  {len(latencies) / elapsed:.1f} req/s over {elapsed:.2f}s')
+        self.stdout.write(
+            f'  latency p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+        )
+        self.stdout.write(f'  peak extra threads: {threads}')
+        if rss is not None:
+            self.stdout.write(f'  peak process memory (RSS): {rss / 1024 / 1024:.1f} MB')
+        if traced is not None:
+            self.stdout.write(f'  peak traced memory: {traced / 1024 / 1024:.1f} MB')
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  {errors} responses with status >= 400'))
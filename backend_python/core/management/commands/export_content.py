@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.content_transfer import CONTENT_TYPES, export_records, write_ndjson
+
+
+class Command(BaseCommand):
+    help = 'Stream posts, projects, comments and menus to NDJSON (see core.content_transfer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            '-o',
+            default='-',
+            help='File to write (default: stdout)',
+        )
+        parser.add_argument(
+            '--model',
+            choices=list(CONTENT_TYPES),
+            action='append',
+            help='Content type to export (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows fetched from the database per round trip',
+        )
+
+    def handle(self, *args, **options):
+        selected = options['model'] or []
+        kinds = [kind for kind in CONTENT_TYPES if not selected or kind in selected]
+        records = export_records(kinds, chunk_size=max(options['chunk_size'], 1))
+
+        started = time.perf_counter()
+        if options['output'] == '-':
+            count = write_ndjson(records, sys.stdout)
+            report = sys.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                count = write_ndjson(records, stream)
+            report = self.stdout
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        report.write(f'Exported {count} records ({", ".join(kinds)}) in {elapsed:.2f}s ({rate:.0f} records/s)\n')
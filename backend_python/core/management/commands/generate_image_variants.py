@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants, load_manifest
+from core.models import Post, Project, User
+
+IMAGE_FIELDS = [(Post, 'image'), (Project, 'image'), (User, 'profile_image')]
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized/WebP variants for every uploaded image'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Images processed in parallel',
+        )
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            uploads = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            names.update(uploads.values_list(field, flat=True))
+        missing = sorted(name for name in names if load_manifest(name) is None)
+
+        started = time.perf_counter()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for name, error in zip(missing, pool.map(self.generate, missing)):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {len(missing) - failed} of {len(missing)} images '
+            f'({len(names) - len(missing)} already done) in {elapsed:.2f}s'
+        ))
+
+    @staticmethod
+    def generate(name):
+        try:
+            generate_variants(name)
+        except ValueError as e:
+            return str(e)
+        return None
@@ -0,0 +1,76 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.content_transfer import ContentFormatError, ContentImporter, read_ndjson
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Load NDJSON written by export_content, in batches and with foreign keys remapped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='NDJSON file to read ("-" for stdin)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows inserted per bulk_create',
+        )
+        parser.add_argument(
+            '--on-conflict',
+            choices=['skip', 'rename'],
+            default='skip',
+            help='For posts whose slug already exists: reuse the existing post, or import under a new slug; '
+                 'skip also leaves out projects and comments that were already imported',
+        )
+        parser.add_argument(
+            '--default-author',
+            help='Username to attribute posts to when their author does not exist here '
+                 '(default: skip those posts)',
+        )
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['default_author']:
+            default_author = User.objects.filter(
+                username=options['default_author']
+            ).values_list('id', flat=True).first()
+            if default_author is None:
+                raise CommandError(f"User {options['default_author']!r} does not exist")
+
+        importer = ContentImporter(
+            batch_size=max(options['batch_size'], 1),
+            on_conflict=options['on_conflict'],
+            default_author=default_author,
+            progress=self.report_progress if options['verbosity'] > 0 else None,
+        )
+        stream = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+        try:
+            created, skipped = importer.run(read_ndjson(stream))
+        except ContentFormatError as e:
+            raise CommandError(f'Invalid input, {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = importer.elapsed()
+        total = sum(created.values()) + sum(skipped.values())
+        rate = total / elapsed if elapsed else 0
+        for kind in created | skipped:
+            self.stdout.write(f'{kind}: {created[kind]} created, {skipped[kind]} skipped')
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} records in {elapsed:.2f}s ({rate:.0f} records/s)'))
+
+    last_report = 0.0
+
+    def report_progress(self, kind, processed, elapsed):
+        # At most one line per second, whatever the batch size
+        if time.monotonic() - self.last_report < 1:
+            return
+        self.last_report = time.monotonic()
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f'  {processed} records processed, now at {kind} ({rate:.0f} records/s)')
@@ -0,0 +1,167 @@
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from core.analytics import ROLLUP_SOURCES, rollup_lag
+from core.models import ActivityLog, PostView, RollupWatermark
+
+# table name -> (model, timestamp field, rollup watermark that must have passed a row)
+PRUNABLE_TABLES = {
+    'activity_log': (ActivityLog, 'created_at', 'activity'),
+    'post_views': (PostView, 'viewed_at', 'post_views'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Delete (and optionally archive) ActivityLog and PostView rows older than their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            choices=sorted(PRUNABLE_TABLES),
+            action='append',
+            help='Table to prune (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--max-age-days',
+            type=int,
+            help='Override the configured retention period for every selected table',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows deleted per DELETE statement',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause between batches to leave room for other writers',
+        )
+        parser.add_argument(
+            '--archive',
+            action=argparse.BooleanOptionalAction,
+            default=None,
+            help='Write pruned rows to gzip-compressed JSONL first (--no-archive to skip)',
+        )
+        parser.add_argument(
+            '--include-unrolled',
+            action='store_true',
+            help='Also delete rows not yet folded into the rollup tables',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many rows would be pruned without deleting anything',
+        )
+
+    def handle(self, *args, **options):
+        policies = getattr(settings, 'HISTORY_RETENTION', {})
+        batch_size = max(options['batch_size'], 1)
+        for table in options['table'] or sorted(PRUNABLE_TABLES):
+            policy = policies.get(table, {})
+            max_age_days = options['max_age_days'] or policy.get('MAX_AGE_DAYS')
+            if not max_age_days:
+                self.stdout.write(f'{table}: no retention period configured, skipping')
+                continue
+            archive = options['archive'] if options['archive'] is not None else policy.get('ARCHIVE', False)
+            self.prune(table, max_age_days, archive, batch_size, options)
+
+    def expired_rows(self, table, max_age_days, include_unrolled):
+        model, time_field, watermark_name = PRUNABLE_TABLES[table]
+        cutoff = timezone.now() - timedelta(days=max_age_days)
+        rows = model.objects.filter(**{f'{time_field}__lt': cutoff})
+        if not include_unrolled:
+            # Never drop rows the rollup job has not aggregated yet
+            watermark = RollupWatermark.objects.filter(name=watermark_name).first()
+            last_id = watermark.last_id if watermark else 0
+            settled = min(cutoff, timezone.now() - timedelta(seconds=rollup_lag()))
+            in_rolled_up_days = Q(pk__in=[])
+            for day in self.rolled_up_days(table, settled, last_id):
+                in_rolled_up_days |= Q(**{f'{time_field}__gte': day, f'{time_field}__lt': day + timedelta(days=1)})
+            rows = rows.filter(in_rolled_up_days, pk__lte=last_id)
+        return rows.order_by('pk')
+
+    def rolled_up_days(self, table, before, last_id):
+        """Whole days ending before ``before`` whose rows are all counted in the daily rollup.
+
+        The rows of a day at or below the watermark must not outnumber its
+        daily rollup total; more raw rows than rolled up ones means some row
+        was skipped by the rollup job, and the day is kept so its rows can
+        still be recounted.
+        """
+        model, time_field, watermark_name = PRUNABLE_TABLES[table]
+        _, _, _, rollup_model, value_field = ROLLUP_SOURCES[watermark_name]
+        end = timezone.localtime(before).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        raw = model.objects.filter(**{f'{time_field}__lt': end, 'pk__lte': last_id}).order_by()
+        raw = dict(raw.annotate(day=TruncDay(time_field)).values('day').annotate(total=Count('pk'))
+                   .values_list('day', 'total'))
+        rolled_up = rollup_model.objects.filter(period='day', bucket__lt=end).order_by()
+        rolled_up = dict(rolled_up.values('bucket').annotate(total=Sum(value_field)).values_list('bucket', 'total'))
+
+        days = []
+        for day, total in sorted(raw.items()):
+            if total <= rolled_up.get(day, 0):
+                days.append(day)
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'{table}: keeping {day:%Y-%m-%d}, {total - rolled_up.get(day, 0)} rows missing from its rollup'
+                ))
+        return days
+
+    def prune(self, table, max_age_days, archive, batch_size, options):
+        rows = self.expired_rows(table, max_age_days, options['include_unrolled'])
+        if options['dry_run']:
+            self.stdout.write(f'{table}: {rows.count()} rows older than {max_age_days} days would be pruned')
+            return
+
+        archive_file = None
+        started = time.perf_counter()
+        deleted = 0
+        last_pk = 0
+        try:
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk).values()[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1]['id']
+                if archive:
+                    archive_file = archive_file or self.open_archive(table)
+                    for row in batch:
+                        archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                    archive_file.flush()
+                rows.model.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+                deleted += len(batch)
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive_file:
+                archive_file.close()
+
+        elapsed = time.perf_counter() - started
+        rate = deleted / elapsed if elapsed else 0
+        message = f'{table}: pruned {deleted} rows in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        if archive_file:
+            message += f', archived to {archive_file.name}'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def open_archive(self, table):
+        directory = getattr(settings, 'HISTORY_ARCHIVE_DIR', None)
+        if not directory:
+            raise CommandError('HISTORY_ARCHIVE_DIR is not configured')
+        os.makedirs(directory, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        return gzip.open(os.path.join(directory, f'{table}-{stamp}.jsonl.gz'), 'wt', encoding='utf-8')
+
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Re-index every published post and project for /search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Documents written per batch',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.perf_counter()
+        with transaction.atomic():
+            total = rebuild_index(batch_size=max(options['batch_size'], 1))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} documents with the {backend.name} backend in {elapsed:.2f}s'
+        ))
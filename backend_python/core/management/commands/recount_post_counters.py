@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like/comment/view counters on posts to repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recount every post instead of only the ones whose counters drifted',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of posts rewritten per UPDATE statement',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted posts without changing them',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all() if options['all'] else Post.objects.with_drifted_counts()
+        post_ids = list(posts.order_by('pk').values_list('pk', flat=True))
+        label = 'posts' if options['all'] else 'posts with drifted counters'
+        self.stdout.write(f'Found {len(post_ids)} {label}')
+
+        if options['dry_run'] or not post_ids:
+            return
+
+        batch_size = max(options['batch_size'], 1)
+        updated = 0
+        for start in range(0, len(post_ids), batch_size):
+            updated += Post.objects.filter(pk__in=post_ids[start:start + batch_size]).recount()
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} posts'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import refresh_analytics_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached analytics snapshot served by /analytics'
+
+    def handle(self, *args, **options):
+        data = refresh_analytics_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Analytics snapshot refreshed at {data['generated_at']}"))
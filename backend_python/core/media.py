@@ -0,0 +1,160 @@
+"""Serving ``MEDIA_ROOT`` from the application in production.
+
+``serve_media`` streams files with ``FileResponse``: under a WSGI server
+that provides ``wsgi.file_wrapper`` (gunicorn, uWSGI) the body is sent
+with ``sendfile()`` straight from the page cache, otherwise it is read in
+``block_size`` chunks, so a file is never loaded into memory whole.
+
+Single byte ranges (``Range: bytes=…``, honouring ``If-Range``) answer 206,
+which lets browsers seek in video and resume downloads. Content-hash names
+(uploads stored as ``<sha256>.<ext>`` and ``variants/ab/<sha256>-<name>.<ext>``)
+never change content, so they are cached for a year as ``immutable``; other
+files get ``MEDIA_MAX_AGE`` and revalidate with ETag / Last-Modified.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}(?:-[\w-]+)?$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def is_hashed(path):
+    """Whether a media path is named after the SHA-256 of its content."""
+    return bool(HASHED_NAME_RE.match(os.path.splitext(os.path.basename(path))[0]))
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive byte positions requested by a ``Range`` header.
+
+    Returns ``None`` when the whole file should be sent: no header, a syntax
+    error or several ranges (which this view answers in full rather than
+    as multipart). Raises ``RangeNotSatisfiable`` when the range lies
+    outside the file.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        start, end = max(size - int(last), 0), size - 1
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+    else:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class _FileRange:
+    """File object limited to ``length`` bytes from its current position.
+
+    Exposes ``fileno()`` so ``wsgi.file_wrapper`` can still use
+    ``sendfile()``; the server bounds it by the response's Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _validators(path, stat):
+    if is_hashed(path):
+        etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return etag, int(stat.st_mtime)
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _add_headers(response, path, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if is_hashed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_MAX_AGE', 3600))
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Stream a file from ``MEDIA_ROOT`` with caching headers and Range support"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('No such file')
+    if not os.path.isfile(full_path):
+        raise Http404('No such file')
+
+    etag, last_modified = _validators(path, stat)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _add_headers(not_modified, path, etag, last_modified)
+
+    size = stat.st_size
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if encoding or not content_type:
+        # Stored .gz/.br files are sent as they are, not as content-encoded text
+        content_type = 'application/octet-stream'
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _add_headers(response, path, etag, last_modified)
+    if byte_range is not None and not _if_range_matches(request, etag, last_modified):
+        byte_range = None
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(_FileRange(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _add_headers(response, path, etag, last_modified)
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    Like = apps.get_model('core', 'Like')
+    Comment = apps.get_model('core', 'Comment')
+    PostView = apps.get_model('core', 'PostView')
+
+    def count(queryset):
+        totals = queryset.order_by().values('post').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(totals, output_field=models.IntegerField()), 0)
+
+    Post.objects.update(
+        likes_count=count(Like.objects.filter(post=OuterRef('pk'))),
+        approved_comments_count=count(Comment.objects.filter(post=OuterRef('pk'), status='approved')),
+        unique_views_count=count(PostView.objects.filter(post=OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_user_options_comment_parent_post_featured_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='approved_comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='unique_views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+from django.utils.html import strip_tags
+
+# core.search.TABLE; spelled out so the migration does not import app code
+TABLE = 'core_search_index'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+                f"title, body, kind UNINDEXED, tokenize='porter unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: core.search falls back to its in-process index
+            pass
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            f"kind varchar(20) NOT NULL, "
+            f"object_id bigint NOT NULL, "
+            f"title text NOT NULL, "
+            f"body text NOT NULL, "
+            f"document tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+            f") STORED, "
+            f"PRIMARY KEY (kind, object_id))"
+        )
+        schema_editor.execute(f'CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def populate_search_index(apps, schema_editor):
+    if TABLE not in schema_editor.connection.introspection.table_names():
+        return
+    Post = apps.get_model('core', 'Post')
+    Project = apps.get_model('core', 'Project')
+    rows = []
+    for post in Post.objects.filter(status='published').iterator():
+        parts = [post.excerpt, strip_tags(post.content), post.category, post.tags]
+        body = ' '.join(part for part in parts if part)
+        rows.append(('post', post.pk, post.title, body))
+    for project in Project.objects.iterator():
+        parts = [project.description, project.category, project.tags, project.technologies]
+        body = ' '.join(part for part in parts if part)
+        rows.append(('project', project.pk, project.title, body))
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            kinds = ('post', 'project')
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, title, body, kind) VALUES (%s, %s, %s, %s)',
+                [(pk * len(kinds) + kinds.index(kind), title, body, kind) for kind, pk, title, body in rows],
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (kind, object_id, title, body) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
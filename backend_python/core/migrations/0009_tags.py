@@ -0,0 +1,93 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+NAME_MAX_LENGTH = 100
+BATCH_SIZE = 1000
+
+
+def _split(value):
+    tags, seen = {}, set()
+    for name in (value or '').split(','):
+        name = name.strip()[:NAME_MAX_LENGTH]
+        slug = slugify(name)[:NAME_MAX_LENGTH]
+        if slug and slug not in seen:
+            seen.add(slug)
+            tags[slug] = name
+    return tags
+
+
+def copy_csv_tags(apps, schema_editor):
+    """Create Tag rows and links from the comma separated ``tags`` columns."""
+    Tag = apps.get_model('core', 'Tag')
+    sources = [
+        (apps.get_model('core', 'Post'), apps.get_model('core', 'PostTag'), 'post_id'),
+        (apps.get_model('core', 'Project'), apps.get_model('core', 'ProjectTag'), 'project_id'),
+    ]
+
+    names = {}
+    for model, _, _ in sources:
+        for value in model.objects.exclude(tags='').values_list('tags', flat=True).iterator():
+            for slug, name in _split(value).items():
+                names.setdefault(slug, name)
+    Tag.objects.bulk_create(
+        [Tag(slug=slug, name=name) for slug, name in names.items()],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    for model, link_model, owner in sources:
+        links = []
+        for pk, value in model.objects.exclude(tags='').values_list('pk', 'tags').iterator():
+            links.extend(link_model(**{owner: pk, 'tag_id': tag_ids[slug]}) for slug in _split(value))
+            if len(links) >= BATCH_SIZE:
+                link_model.objects.bulk_create(links, ignore_conflicts=True)
+                links = []
+        link_model.objects.bulk_create(links, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='core.project')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_links', to='core.tag')),
+            ],
+            options={
+                'unique_together': {('tag', 'project')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='core.post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='core.tag')),
+            ],
+            options={
+                'unique_together': {('tag', 'post')},
+            },
+        ),
+        migrations.RunPython(copy_csv_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_tags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_active',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_user_last_active_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_category_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_published_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_featured_idx',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:36
+
+import core.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_drop_unused_post_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Upload a featured image (optional)', null=True, storage=core.uploads.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Upload a project screenshot', null=True, storage=core.uploads.ContentAddressedStorage(), upload_to='projects/'),
+        ),
+    ]
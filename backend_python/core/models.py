@@ -1,14 +1,22 @@
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .uploads import content_addressed_storage
+
 
 class User(AbstractUser):
     """Custom user model"""
 
     email = models.EmailField(unique=True)
     is_admin = models.BooleanField(default=False)
-    last_active = models.DateTimeField(auto_now=True)
+    # Not auto_now: written in batches by core.presence.LastActiveBuffer, not on every save()
+    last_active = models.DateTimeField(default=timezone.now)
     bio = models.TextField(blank=True, help_text="Tell us about yourself")
     website = models.URLField(blank=True, help_text="Share your portfolio or website")
     location = models.CharField(max_length=100, blank=True, help_text="Where are you based?")
@@ -27,6 +35,84 @@ class User(AbstractUser):
         return self.username
 
 
+def _count_subquery(queryset):
+    """Wrap a queryset filtered on ``post=OuterRef('pk')`` as a scalar COUNT subquery."""
+    counts = queryset.order_by().values('post').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def _view_total():
+    """Views per post: daily rollups plus raw ``PostView`` rows not yet rolled up.
+
+    Raw rows at or below the rollup watermark may have been pruned, so they
+    are counted through the rollup table instead.
+    """
+    watermark = RollupWatermark.objects.filter(name='post_views').values_list('last_id', flat=True).first()
+    watermark = watermark or 0
+    rolled_up = PostViewRollup.objects.filter(post=OuterRef('pk'), period='day').order_by()
+    rolled_up = rolled_up.values('post').annotate(total=Sum('views')).values('total')
+    return (
+        Coalesce(Subquery(rolled_up, output_field=models.IntegerField()), 0)
+        + _count_subquery(PostView.objects.filter(post=OuterRef('pk'), pk__gt=watermark))
+    )
+
+
+def split_tags(value):
+    """Tag names in a comma separated string, without blanks or repeats (compared by slug)."""
+    names, seen = [], set()
+    for name in (value or '').split(','):
+        name = name.strip()[:Tag.NAME_MAX_LENGTH]
+        slug = slugify(name)
+        if slug and slug not in seen:
+            seen.add(slug)
+            names.append(name)
+    return names
+
+
+class PostQuerySet(models.QuerySet):
+    """Query helpers for loading and maintaining post listings."""
+
+    def with_counts(self):
+        """Annotate live ``num_likes``, ``num_approved_comments`` and ``num_unique_views``."""
+        return self.annotate(
+            num_likes=_count_subquery(Like.objects.filter(post=OuterRef('pk'))),
+            num_approved_comments=_count_subquery(
+                Comment.objects.filter(post=OuterRef('pk'), status='approved')
+            ),
+            num_unique_views=_view_total(),
+        )
+
+    def with_drifted_counts(self):
+        """Posts whose denormalized counters disagree with the source tables."""
+        return self.with_counts().filter(
+            ~Q(likes_count=F('num_likes'))
+            | ~Q(approved_comments_count=F('num_approved_comments'))
+            | ~Q(unique_views_count=F('num_unique_views'))
+        )
+
+    def recount(self):
+        """Rewrite the denormalized counters from the source tables in one UPDATE."""
+        return self.update(
+            likes_count=_count_subquery(Like.objects.filter(post=OuterRef('pk'))),
+            approved_comments_count=_count_subquery(
+                Comment.objects.filter(post=OuterRef('pk'), status='approved')
+            ),
+            unique_views_count=_view_total(),
+        )
+
+    def with_comments(self):
+        """Prefetch every comment of each post together with its author."""
+        return self.prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.select_related('user'))
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """``bulk_create`` that first gives slug-less posts unique slugs."""
+        objs = list(objs)
+        Post.assign_slugs(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Post(models.Model):
     """Blog post model"""
 
@@ -43,6 +129,7 @@ class Post(models.Model):
     tags = models.CharField(max_length=255, blank=True)
     image = models.ImageField(
         upload_to='posts/',
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         help_text="Upload a featured image (optional)"
@@ -56,34 +143,124 @@ class Post(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     featured = models.BooleanField(default=False, help_text="Highlight this post in listings")
     views = models.PositiveIntegerField(default=0)
+    # Denormalized counters, kept in sync by ``core.signals``
+    # (repair drift with ``manage.py recount_post_counters``)
+    likes_count = models.PositiveIntegerField(default=0)
+    approved_comments_count = models.PositiveIntegerField(default=0)
+    unique_views_count = models.PositiveIntegerField(default=0)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()
+
+    # Room for a "-N" suffix inside the slug column, and attempts before giving up on a race
+    SLUG_BASE_MAX_LENGTH = 240
+    SLUG_RETRIES = 5
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Cursor pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            # Popular posts on the analytics dashboard
+            models.Index(fields=['-unique_views_count', '-views'], name='post_popular_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored tags so signals only rebuild tag links when they change
+        instance._loaded_tags = instance.__dict__.get('tags')
+        return instance
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title) or slugify(self.author.username)
-            candidate = base_slug
-            index = 1
-            while Post.objects.filter(slug=candidate).exclude(pk=self.pk).exists():
-                index += 1
-                candidate = f"{base_slug}-{index}"
-            self.slug = candidate
-        super().save(*args, **kwargs)
-
-    @property
-    def likes_count(self):
-        return self.likes.count()
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(self.SLUG_RETRIES):
+            self.assign_slugs([self])
+            try:
+                # Savepoint, so a lost race leaves the surrounding transaction usable
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                lost_race = Post.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not lost_race or attempt == self.SLUG_RETRIES - 1:
+                    raise
+                self.slug = ''
+
+    def slug_base(self):
+        """Slug derived from the title (or author), short enough to take a ``-N`` suffix."""
+        base = slugify(self.title) or slugify(self.author.username) or 'post'
+        return base[:self.SLUG_BASE_MAX_LENGTH].rstrip('-')
+
+    @classmethod
+    def taken_slug_suffixes(cls, bases, exclude_pk=None):
+        """Suffixes in use per slug base: 1 for ``base`` itself, N for ``base-N``.
+
+        One query covers every base; the ``startswith`` prefix lets the
+        database walk the slug index instead of probing candidates one by one.
+        """
+        taken = {base: set() for base in bases}
+        if not taken:
+            return taken
+        condition = Q()
+        for base in taken:
+            condition |= Q(slug=base) | Q(
+                slug__startswith=f'{base}-',
+                slug__regex=rf'^{re.escape(base)}-[0-9]+$',
+            )
+        slugs = cls.objects.filter(condition)
+        if exclude_pk is not None:
+            slugs = slugs.exclude(pk=exclude_pk)
+        for slug in slugs.values_list('slug', flat=True):
+            if slug in taken:
+                taken[slug].add(1)
+            base, _, number = slug.rpartition('-')
+            if base in taken and number.isdigit():
+                taken[base].add(int(number))
+        return taken
+
+    @classmethod
+    def assign_slugs(cls, posts):
+        """Give every post without a slug a unique one, using one query for the whole batch.
+
+        Each post gets the lowest free suffix of its base, the bare base
+        first (``title``, then ``title-2``, ``title-3``, ...), so gaps left by
+        deleted or renamed posts are reused. Concurrent writers
+        can still pick the same slug; the unique index rejects the loser,
+        which ``save`` retries.
+        """
+        pending = [post for post in posts if not post.slug]
+        if not pending:
+            return
+        bases = [post.slug_base() for post in pending]
+        exclude_pk = pending[0].pk if len(pending) == 1 else None
+        taken = cls.taken_slug_suffixes(set(bases), exclude_pk=exclude_pk)
+        # Lowest suffix not yet tried per base, so a batch never rescans its own picks
+        next_free = {}
+        for post, base in zip(pending, bases):
+            used = taken[base]
+            number = next_free.get(base, 1)
+            while number in used:
+                number += 1
+            used.add(number)
+            next_free[base] = number + 1
+            post.slug = base if number == 1 else f'{base}-{number}'
 
     @property
     def comments_count(self):
-        return self.comments.filter(status='approved').count()
+        return self.approved_comments_count
+
+    @classmethod
+    def adjust_counter(cls, post_id, field, delta):
+        """Atomically add ``delta`` to one counter column without reading the row."""
+        if delta:
+            cls.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, 0)})
 
 
 class Project(models.Model):
@@ -105,6 +282,7 @@ class Project(models.Model):
     demo_link = models.URLField(max_length=255, blank=True, help_text="Live demo URL")
     image = models.ImageField(
         upload_to='projects/',
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         help_text="Upload a project screenshot"
@@ -117,11 +295,129 @@ class Project(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='project_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_tags = instance.__dict__.get('tags')
+        return instance
 
     def __str__(self):
         return self.title
 
 
+def _tag_count_subquery(queryset):
+    """Wrap a link queryset filtered on ``tag=OuterRef('pk')`` as a scalar COUNT subquery."""
+    counts = queryset.order_by().values('tag').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class TagQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        """Annotate ``post_count`` (published posts only) and ``project_count``."""
+        return self.annotate(
+            post_count=_tag_count_subquery(
+                PostTag.objects.filter(tag=OuterRef('pk'), post__status='published')
+            ),
+            project_count=_tag_count_subquery(ProjectTag.objects.filter(tag=OuterRef('pk'))),
+        )
+
+
+class Tag(models.Model):
+    """Normalized tag shared by posts and projects.
+
+    The comma separated ``tags`` column on ``Post``/``Project`` stays the
+    editable source; ``core.signals`` mirrors it into ``PostTag`` and
+    ``ProjectTag`` rows, which back tag filtering and the tag cloud.
+    """
+    NAME_MAX_LENGTH = 100
+
+    name = models.CharField(max_length=NAME_MAX_LENGTH)
+    slug = models.SlugField(max_length=NAME_MAX_LENGTH, unique=True)
+
+    objects = TagQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def sync(cls, instance):
+        """Make the tag links of a post or project match its ``tags`` string."""
+        cls.sync_all([instance])
+
+    @classmethod
+    def sync_all(cls, instances):
+        """``sync`` for a batch of posts or projects of one model, in a fixed number of queries."""
+        if not instances:
+            return
+        if isinstance(instances[0], Post):
+            link_model, owner = PostTag, 'post_id'
+        else:
+            link_model, owner = ProjectTag, 'project_id'
+        wanted_slugs = {}
+        names = {}
+        for instance in instances:
+            wanted_slugs[instance.pk] = []
+            for name in split_tags(instance.tags):
+                slug = slugify(name)[:cls.NAME_MAX_LENGTH]
+                wanted_slugs[instance.pk].append(slug)
+                names.setdefault(slug, name)
+        tag_ids = {}
+        if names:
+            cls.objects.bulk_create(
+                [cls(name=name, slug=slug) for slug, name in names.items()],
+                ignore_conflicts=True,
+            )
+            tag_ids = dict(cls.objects.filter(slug__in=names).values_list('slug', 'id'))
+
+        links = link_model.objects.filter(**{f'{owner}__in': wanted_slugs})
+        current = set(links.values_list(owner, 'tag_id'))
+        wanted = {(pk, tag_ids[slug]) for pk, slugs in wanted_slugs.items() for slug in slugs}
+        stale = current - wanted
+        if stale:
+            condition = Q()
+            for pk, tag_id in stale:
+                condition |= Q(**{owner: pk, 'tag_id': tag_id})
+            links.filter(condition).delete()
+        if wanted - current:
+            link_model.objects.bulk_create(
+                [link_model(**{owner: pk, 'tag_id': tag_id}) for pk, tag_id in wanted - current],
+                ignore_conflicts=True,
+            )
+
+
+class PostTag(models.Model):
+    """Tag assigned to a post."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='post_links')
+
+    class Meta:
+        # Leading tag column serves ?tag= filters; the post FK index serves per-post lookups
+        unique_together = ('tag', 'post')
+
+    def __str__(self):
+        return f'{self.post_id} #{self.tag_id}'
+
+
+class ProjectTag(models.Model):
+    """Tag assigned to a project."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tag_links')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='project_links')
+
+    class Meta:
+        unique_together = ('tag', 'project')
+
+    def __str__(self):
+        return f'{self.project_id} #{self.tag_id}'
+
+
 class Comment(models.Model):
     """Comment model"""
     STATUS_CHOICES = [
@@ -140,13 +436,30 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+            models.Index(
+                fields=['post', '-created_at'],
+                name='comment_approved_idx',
+                condition=Q(status='approved'),
+            ),
+            models.Index(fields=['status', '-created_at'], name='comment_status_created_idx'),
+            models.Index(fields=['-created_at'], name='comment_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so signals can tell approvals apart from edits
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
     
     def __str__(self):
         return f'Comment by {self.user.username} on {self.post.title}'
     
     @property
     def is_reply(self):
-        return self.parent is not None
+        return self.parent_id is not None
 
 
 class Like(models.Model):
@@ -162,6 +475,34 @@ class Like(models.Model):
     def __str__(self):
         return f'{self.user.username} likes {self.post.title}'
 
+    @classmethod
+    def set_liked(cls, post_id, user_id, liked=None):
+        """Like or unlike a post in one transaction; ``liked=None`` flips the current state.
+
+        The post row is locked first, so concurrent calls for one post run one
+        after another, and the like signals adjust ``likes_count`` inside the
+        same transaction. Setting the state the like already has changes
+        nothing. Returns ``(liked, changed, likes_count)``; raises
+        ``Post.DoesNotExist`` for an unknown post.
+        """
+        with transaction.atomic():
+            Post.objects.select_for_update().only('pk').get(pk=post_id)
+            changed = False
+            if liked is not True:
+                changed = cls.objects.filter(post_id=post_id, user_id=user_id).delete()[0] > 0
+                if liked is None:
+                    liked = not changed
+            if liked:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(post_id=post_id, user_id=user_id)
+                    changed = True
+                except IntegrityError:
+                    # Already liked
+                    pass
+            likes_count = Post.objects.filter(pk=post_id).values_list('likes_count', flat=True).get()
+        return liked, changed, likes_count
+
 
 class Contact(models.Model):
     """Contact message model"""
@@ -191,7 +532,14 @@ class PostView(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_records')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='post_views')
     ip_address = models.GenericIPAddressField()
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered views are written after the fact with their original time
+    viewed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'viewed_at'], name='postview_post_viewed_idx'),
+            models.Index(fields=['viewed_at'], name='postview_viewed_idx'),
+        ]
     
     def __str__(self):
         return f'View on {self.post.title}'
@@ -205,10 +553,14 @@ class ActivityLog(models.Model):
     entity_id = models.IntegerField(null=True, blank=True)
     details = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: entries are written asynchronously with the time of the event
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='activity_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.action} by {self.user.username if self.user else 'Anonymous'}"
@@ -242,6 +594,13 @@ class Menu(models.Model):
 
     class Meta:
         ordering = ['menu_type', 'order', 'title']
+        indexes = [
+            models.Index(
+                fields=['menu_type', 'order', 'title'],
+                name='menu_active_idx',
+                condition=Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.menu_type})"
@@ -253,3 +612,56 @@ class Menu(models.Model):
     @property
     def has_children(self):
         return self.children.exists()
+
+
+class RollupWatermark(models.Model):
+    """Highest source row id already folded into the rollup tables, per source."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_id}'
+
+
+class PostViewRollup(models.Model):
+    """Post views aggregated per hour or per day."""
+
+    PERIOD_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour or day")
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'period', 'bucket')
+        ordering = ['bucket']
+        indexes = [
+            models.Index(fields=['period', 'bucket'], name='viewrollup_period_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} {self.period} {self.bucket}: {self.views}'
+
+
+class ActivityRollup(models.Model):
+    """Activity log entries counted per action and entity type, per hour or per day."""
+    action = models.CharField(max_length=50)
+    entity_type = models.CharField(max_length=50, blank=True)
+    period = models.CharField(max_length=4, choices=PostViewRollup.PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour or day")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('action', 'entity_type', 'period', 'bucket')
+        ordering = ['bucket']
+        indexes = [
+            models.Index(fields=['period', 'bucket'], name='actrollup_period_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.period} {self.bucket}: {self.count}'
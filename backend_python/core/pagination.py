@@ -0,0 +1,31 @@
+from asgiref.sync import sync_to_async
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class PostCursorPagination(CursorPagination):
+    """Keyset pagination on ``created_at`` for post listings.
+
+    Each page is fetched with an indexed range filter on ``created_at``
+    instead of an ``OFFSET``, so the cost of a page does not depend on how
+    deep into the archive it is. The cursor only records a ``created_at``
+    position: posts created in the same instant are stepped through with a
+    small offset stored in the cursor, and ``id`` only keeps their order
+    stable between requests.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, run in a thread for its one query."""
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'status': 'success',
+            'data': data,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        })
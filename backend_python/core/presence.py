@@ -0,0 +1,365 @@
+"""Who is online, without a database write per request.
+
+``PresenceMiddleware`` records a heartbeat for every authenticated request
+in ``PresenceTracker``: an insertion-ordered map of user id -> last
+heartbeat in which each heartbeat moves the user to the end. Users older
+than ``window`` seconds therefore sit at the front and are dropped from
+there, and the online list is read from the back until the first expired
+entry, so both cost O(active users) no matter how many users exist.
+
+The database only sees coalesced writes: a user's ``OnlineUser`` row is
+written at most once per ``write_interval``, by a background thread that
+flushes every ``flush_interval`` seconds with one ``UPDATE ... CASE``.
+``User.last_active`` goes through ``LastActiveBuffer`` the same way, and
+is only moved forward in steps of at least ``granularity`` seconds.
+
+The window lives in process memory. With several worker processes, set
+``PRESENCE['CACHE']`` to a shared cache alias: each worker then publishes a
+snapshot of its active users there on every flush, and the online list
+merges the snapshots of all workers.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import OnlineUser, User
+
+logger = logging.getLogger(__name__)
+
+WORKERS_KEY = 'presence:workers'
+
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def _timestamps_case(field, timestamps):
+    """``CASE`` expression setting each row's value from ``{id: unix time}``."""
+    return Case(
+        *[When(**{field: key}, then=Value(_datetime(ts))) for key, ts in timestamps.items()],
+        output_field=DateTimeField(),
+    )
+
+
+class _BackgroundFlusher:
+    """Daemon thread calling ``flush()`` every ``flush_interval`` seconds, started on first use."""
+    thread_name = None
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._worker is None:
+                atexit.register(self.flush)
+            self._worker = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush %s', self.thread_name)
+            finally:
+                close_old_connections()
+
+
+class PresenceTracker(_BackgroundFlusher):
+    """Sliding window of user heartbeats with coalesced database writes."""
+    thread_name = 'presence'
+
+    def __init__(self, window=300, write_interval=60, flush_interval=10, cache_alias=None, background=True):
+        self.window = window
+        self.write_interval = write_interval
+        self.flush_interval = flush_interval
+        self.cache_alias = cache_alias
+        self.background = background
+        self.flushed = 0
+        self._seen = OrderedDict()  # user id -> (timestamp, username, is_admin), oldest first
+        self._written = {}  # user id -> timestamp last written to the database
+        self._dirty = {}  # user id -> timestamp still to be written
+        self._token = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'PRESENCE', {})
+        return cls(
+            window=options.get('WINDOW', 300),
+            write_interval=options.get('WRITE_INTERVAL', 60),
+            flush_interval=options.get('FLUSH_INTERVAL', 10),
+            cache_alias=options.get('CACHE') or None,
+            background=options.get('BACKGROUND', True),
+        )
+
+    def heartbeat(self, user_id, username='', is_admin=False, now=None):
+        """Mark a user as seen; their database rows are written on a later flush."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._seen.pop(user_id, None)
+            self._seen[user_id] = (now, username, is_admin)
+            if now - self._written.get(user_id, 0) >= self.write_interval:
+                self._dirty[user_id] = now
+            self._expire(now)
+        if self.background:
+            self._ensure_worker()
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self._seen:
+            user_id, (seen, _, _) = next(iter(self._seen.items()))
+            if seen >= cutoff:
+                break
+            self._seen.popitem(last=False)
+            self._written.pop(user_id, None)
+
+    def _local_online(self, now):
+        cutoff = now - self.window
+        users = []
+        with self._lock:
+            for user_id, (seen, username, is_admin) in reversed(self._seen.items()):
+                if seen < cutoff:
+                    break
+                users.append((user_id, seen, username, is_admin))
+        return users
+
+    def online(self, now=None):
+        """Users seen within the window, most recent first."""
+        now = time.time() if now is None else now
+        users = self._local_online(now)
+        if self.cache_alias:
+            users = self._merge_shared(users, now)
+        return [
+            {'id': user_id, 'user': user_id, 'username': username, 'is_admin': is_admin,
+             'last_seen': _datetime(seen)}
+            for user_id, seen, username, is_admin in users
+        ]
+
+    @property
+    def active(self):
+        return len(self._seen)
+
+    def flush(self):
+        """Write pending heartbeats to ``OnlineUser``; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if dirty:
+                try:
+                    self._write(dirty)
+                except Exception:
+                    # Retry on the next flush unless a newer heartbeat is already pending
+                    with self._lock:
+                        for user_id, ts in dirty.items():
+                            self._dirty.setdefault(user_id, ts)
+                    raise
+                with self._lock:
+                    self._written.update((user_id, ts) for user_id, ts in dirty.items() if user_id in self._seen)
+                self.flushed += len(dirty)
+            if self.cache_alias:
+                self._publish(time.time())
+            return len(dirty)
+
+    def _write(self, dirty):
+        with transaction.atomic():
+            OnlineUser.objects.filter(user_id__in=dirty).update(last_seen=_timestamps_case('user_id', dirty))
+            existing = set(OnlineUser.objects.filter(user_id__in=dirty).values_list('user_id', flat=True))
+            live = set(User.objects.filter(pk__in=set(dirty) - existing).values_list('pk', flat=True))
+            OnlineUser.objects.bulk_create([OnlineUser(user_id=user_id) for user_id in live])
+
+    # Shared window: one snapshot per worker process in a shared cache
+
+    def _publish(self, now):
+        cache = caches[self.cache_alias]
+        snapshot = self._local_online(now)
+        cache.set(f'presence:{self._token}', snapshot, self.window)
+        workers = cache.get(WORKERS_KEY) or []
+        if self._token not in workers:
+            cache.set(WORKERS_KEY, workers + [self._token], None)
+
+    def _merge_shared(self, users, now):
+        cache = caches[self.cache_alias]
+        workers = cache.get(WORKERS_KEY) or []
+        snapshots = cache.get_many([f'presence:{token}' for token in workers])
+        cutoff = now - self.window
+        merged = {user_id: (user_id, seen, username, is_admin) for user_id, seen, username, is_admin in users}
+        for snapshot in snapshots.values():
+            for user_id, seen, username, is_admin in snapshot:
+                if seen >= cutoff and seen > merged.get(user_id, (None, 0))[1]:
+                    merged[user_id] = (user_id, seen, username, is_admin)
+        if len(snapshots) < len(workers):
+            # Snapshots of stopped workers expired; forget them (live ones re-register on publish)
+            live = [token for token in workers if f'presence:{token}' in snapshots or token == self._token]
+            cache.set(WORKERS_KEY, live, None)
+        return sorted(merged.values(), key=lambda user: user[1], reverse=True)
+
+    def stats(self):
+        return {'active': self.active, 'pending': len(self._dirty), 'flushed': self.flushed}
+
+
+class LastActiveBuffer(_BackgroundFlusher):
+    """Latest activity time per user, written to ``User.last_active`` in batches.
+
+    ``touch`` is ignored unless it moves the user's time forward by at least
+    ``granularity`` seconds, so a busy user costs one write per granularity
+    step rather than one per request. Pending times are flushed every
+    ``flush_interval`` seconds in ``UPDATE ... CASE`` statements of up to
+    ``batch_size`` users, which never move a stored value backwards. The
+    last written time of up to ``max_tracked`` recent users is remembered
+    to decide what to skip.
+    """
+    thread_name = 'last-active'
+
+    def __init__(self, granularity=60, flush_interval=30, batch_size=500, max_tracked=100000, background=True):
+        self.granularity = granularity
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_tracked = max_tracked
+        self.background = background
+        self.flushed = 0
+        self.skipped = 0
+        self._pending = {}  # user id -> timestamp to write
+        self._stored = OrderedDict()  # user id -> timestamp known to be stored, least recent first
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'LAST_ACTIVE', {})
+        return cls(
+            granularity=options.get('GRANULARITY', 60),
+            flush_interval=options.get('FLUSH_INTERVAL', 30),
+            batch_size=options.get('BATCH_SIZE', 500),
+            max_tracked=options.get('MAX_TRACKED', 100000),
+            background=options.get('BACKGROUND', True),
+        )
+
+    def touch(self, user_id, stored=None, now=None):
+        """Record activity of a user; returns whether it will be written.
+
+        ``stored`` is the user's current ``last_active`` if the row is at
+        hand, so the first touch after a restart can be skipped as well.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            baseline = self._pending.get(user_id) or self._stored.get(user_id)
+            if baseline is None and stored is not None:
+                baseline = stored.timestamp()
+            if baseline is not None and now - baseline < self.granularity:
+                self.skipped += 1
+                return False
+            self._pending[user_id] = now
+        if self.background:
+            self._ensure_worker()
+        return True
+
+    def flush(self):
+        """Write pending activity times; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = dict(items[start:start + self.batch_size])
+                try:
+                    User.objects.filter(pk__in=batch).update(
+                        last_active=Greatest(F('last_active'), _timestamps_case('pk', batch)),
+                    )
+                except Exception:
+                    with self._lock:
+                        for user_id, ts in items[start:]:
+                            self._pending.setdefault(user_id, ts)
+                    raise
+                with self._lock:
+                    for user_id, ts in batch.items():
+                        self._stored[user_id] = ts
+                        self._stored.move_to_end(user_id)
+                    while len(self._stored) > self.max_tracked:
+                        self._stored.popitem(last=False)
+                self.flushed += len(batch)
+            return len(items)
+
+    def stats(self):
+        return {'pending': len(self._pending), 'flushed': self.flushed, 'skipped': self.skipped}
+
+
+_presence_tracker = None
+_presence_tracker_lock = threading.Lock()
+
+
+def get_presence_tracker():
+    """Process-wide ``PresenceTracker`` configured from ``settings.PRESENCE``."""
+    global _presence_tracker
+    if _presence_tracker is None:
+        with _presence_tracker_lock:
+            if _presence_tracker is None:
+                _presence_tracker = PresenceTracker.from_settings()
+    return _presence_tracker
+
+
+_last_active_buffer = None
+_last_active_buffer_lock = threading.Lock()
+
+
+def get_last_active_buffer():
+    """Process-wide ``LastActiveBuffer`` configured from ``settings.LAST_ACTIVE``."""
+    global _last_active_buffer
+    if _last_active_buffer is None:
+        with _last_active_buffer_lock:
+            if _last_active_buffer is None:
+                _last_active_buffer = LastActiveBuffer.from_settings()
+    return _last_active_buffer
+
+
+class PresenceMiddleware:
+    """Record a heartbeat and activity for every request made by a logged-in user.
+
+    Both records are in-memory, so under ASGI the middleware runs on the
+    event loop and only loads the user through ``request.auser()``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.record(getattr(request, 'user', None))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if hasattr(request, 'auser'):
+            user = await request.auser()
+            # Keep the loaded user so that request.user does not query again
+            request.user = user
+            self.record(user)
+        return await self.get_response(request)
+
+    @staticmethod
+    def record(user):
+        if user is not None and user.is_authenticated:
+            get_presence_tracker().heartbeat(user.pk, user.username, user.is_admin)
+            get_last_active_buffer().touch(user.pk, stored=user.last_active)
@@ -0,0 +1,396 @@
+"""Full-text search over published posts and projects.
+
+Documents live in one ``core_search_index`` table, kept up to date by the
+model signals in ``core.signals`` and rebuilt with
+``manage.py rebuild_search_index``. The engine depends on the database:
+
+* SQLite: an FTS5 virtual table ranked with ``bm25()``.
+* PostgreSQL: a weighted ``tsvector`` column with a GIN index, ranked with
+  ``ts_rank_cd()``.
+* Anything else (or SQLite built without FTS5): an in-process inverted
+  index loaded from the database on first use and ranked with BM25.
+
+Every query term is matched as a prefix and all terms must match. Results
+carry the title and a body snippet with the matches wrapped in ``<mark>``.
+"""
+import bisect
+import math
+import re
+import threading
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape, strip_tags
+
+from .models import Post, Project
+
+TABLE = 'core_search_index'
+KINDS = ('post', 'project')
+MAX_TERMS = 8
+SNIPPET_WORDS = 24
+TITLE_WEIGHT = 10.0
+
+# Match markers that cannot occur in indexed text; swapped for <mark> after escaping
+_START, _STOP = '\ue000', '\ue001'
+_TOKEN_RE = re.compile(r'\w+')
+
+Document = namedtuple('Document', 'kind object_id title body')
+SearchHit = namedtuple('SearchHit', 'kind object_id rank title snippet')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def query_terms(query):
+    """Distinct lower-cased terms of a user query, capped at ``MAX_TERMS``."""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_TERMS]
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def document_for(instance):
+    """Search document for a model instance, or ``None`` if it must not be searchable."""
+    if isinstance(instance, Post):
+        if instance.status != 'published':
+            return None
+        body = _join(instance.excerpt, strip_tags(instance.content), instance.category, instance.tags)
+        return Document('post', instance.pk, instance.title, body)
+    if isinstance(instance, Project):
+        body = _join(instance.description, instance.category, instance.tags, instance.technologies)
+        return Document('project', instance.pk, instance.title, body)
+    return None
+
+
+def _kind_of(instance):
+    return 'post' if isinstance(instance, Post) else 'project'
+
+
+def searchable_querysets():
+    """Querysets holding every instance that belongs in the index."""
+    return [
+        Post.objects.filter(status='published').only(
+            'id', 'title', 'excerpt', 'content', 'category', 'tags', 'status'
+        ),
+        Project.objects.only('id', 'title', 'description', 'category', 'tags', 'technologies'),
+    ]
+
+
+def render_highlight(text):
+    """HTML-escape ``text`` and turn the match markers into ``<mark>`` tags."""
+    return str(escape(text)).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+class SqliteFtsBackend:
+    """FTS5 virtual table; the rowid encodes the kind and primary key."""
+
+    name = 'sqlite-fts5'
+
+    @staticmethod
+    def _rowid(kind, object_id):
+        return object_id * len(KINDS) + KINDS.index(kind)
+
+    def index(self, documents):
+        documents = list(documents)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [(self._rowid(doc.kind, doc.object_id),) for doc in documents],
+            )
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, title, body, kind) VALUES (%s, %s, %s, %s)',
+                [(self._rowid(doc.kind, doc.object_id), doc.title, doc.body, doc.kind) for doc in documents],
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [self._rowid(kind, object_id)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+    def search(self, terms, kinds, limit):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        placeholders = ', '.join(['%s'] * len(kinds))
+        sql = (
+            f'SELECT rowid, kind, bm25({TABLE}, {TITLE_WEIGHT}, 1.0, 0.0) AS score, '
+            f"highlight({TABLE}, 0, %s, %s), snippet({TABLE}, 1, %s, %s, '…', {SNIPPET_WORDS}) "
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s AND kind IN ({placeholders}) '
+            f'ORDER BY score LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_START, _STOP, _START, _STOP, match, *kinds, limit])
+            rows = cursor.fetchall()
+        return [
+            SearchHit(kind, rowid // len(KINDS), -score, title, snippet)
+            for rowid, kind, score, title, snippet in rows
+        ]
+
+
+class PostgresBackend:
+    """Table with a generated, weighted ``tsvector`` column under a GIN index."""
+
+    name = 'postgresql'
+
+    def index(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (kind, object_id, title, body) VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (kind, object_id) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body',
+                [tuple(doc) for doc in documents],
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = %s', [kind, object_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLE}')
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {TABLE}')
+
+    def search(self, terms, kinds, limit):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        title_options = f'StartSel={_START}, StopSel={_STOP}, HighlightAll=true'
+        body_options = (
+            f'StartSel={_START}, StopSel={_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=8, '
+            f'MaxFragments=2, FragmentDelimiter=" … "'
+        )
+        # Rank and limit first so ts_headline only runs on the rows returned
+        sql = (
+            f"SELECT kind, object_id, score, ts_headline('english', title, query, %s), "
+            f"ts_headline('english', body, query, %s) FROM ("
+            f"  SELECT kind, object_id, title, body, query, ts_rank_cd(document, query) AS score"
+            f"  FROM {TABLE}, to_tsquery('english', %s) query"
+            f"  WHERE document @@ query AND kind = ANY(%s)"
+            f"  ORDER BY score DESC LIMIT %s"
+            f") ranked ORDER BY score DESC"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [title_options, body_options, tsquery, list(kinds), limit])
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+class InvertedIndexBackend:
+    """In-process inverted index ranked with BM25.
+
+    Loaded from the database on first search; after that only the documents
+    saved in this process are updated, so other worker processes catch up on
+    their next restart or ``rebuild_search_index``.
+    """
+
+    name = 'python'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self._documents = {}   # (kind, id) -> (Document, weighted length)
+        self._postings = {}    # term -> {(kind, id): weighted term frequency}
+        self._terms = []       # sorted vocabulary for prefix lookups
+        self._terms_dirty = False
+        self._total_length = 0.0
+
+    def _load(self):
+        self._loaded = True
+        for queryset in searchable_querysets():
+            self.index(filter(None, (document_for(obj) for obj in queryset.iterator(chunk_size=500))))
+
+    def _add(self, doc):
+        key = (doc.kind, doc.object_id)
+        frequencies = Counter()
+        for term in tokenize(doc.title):
+            frequencies[term] += TITLE_WEIGHT
+        for term in tokenize(doc.body):
+            frequencies[term] += 1
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._terms_dirty = True
+            postings[key] = frequency
+        length = sum(frequencies.values())
+        self._documents[key] = (doc, length)
+        self._total_length += length
+
+    def _discard(self, key):
+        entry = self._documents.pop(key, None)
+        if entry is None:
+            return
+        doc, length = entry
+        self._total_length -= length
+        for term in set(tokenize(doc.title)) | set(tokenize(doc.body)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+
+    def index(self, documents):
+        with self._lock:
+            for doc in documents:
+                self._discard((doc.kind, doc.object_id))
+                self._add(doc)
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            self._discard((kind, object_id))
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._loaded = True
+
+    def optimize(self):
+        pass
+
+    def _expand(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._terms, prefix)
+        expanded = []
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            expanded.append(term)
+        return expanded
+
+    def search(self, terms, kinds, limit):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores = None
+            for prefix in terms:
+                term_scores = Counter()
+                for term in self._expand(prefix):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._documents[key][1] / average_length)
+                        term_scores[key] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                # Every term has to match
+                scores = term_scores if scores is None else Counter(
+                    {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+                )
+                if not scores:
+                    return []
+            ranked = sorted(
+                ((score, key) for key, score in scores.items() if key[0] in kinds),
+                key=lambda item: item[0],
+                reverse=True,
+            )[:limit]
+            documents = [self._documents[key][0] for _, key in ranked]
+
+        pattern = re.compile(r'\b(?:%s)\w*' % '|'.join(map(re.escape, terms)), re.IGNORECASE)
+        return [
+            SearchHit(doc.kind, doc.object_id, score, _mark(doc.title, pattern), _snippet(doc.body, pattern))
+            for (score, _), doc in zip(ranked, documents)
+        ]
+
+
+def _mark(text, pattern):
+    return pattern.sub(lambda match: f'{_START}{match.group(0)}{_STOP}', text)
+
+
+def _snippet(text, pattern, words=SNIPPET_WORDS):
+    """Window of ``words`` words around the first match in ``text``."""
+    tokens = text.split()
+    first = next((i for i, token in enumerate(tokens) if pattern.search(token)), 0)
+    start = max(first - words // 3, 0)
+    window = ' '.join(tokens[start:start + words])
+    prefix = '… ' if start else ''
+    suffix = ' …' if start + words < len(tokens) else ''
+    return prefix + _mark(window, pattern) + suffix
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _detect_backend():
+    choice = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if choice == 'python':
+        return InvertedIndexBackend()
+    if connection.vendor in ('sqlite', 'postgresql') and TABLE in connection.introspection.table_names():
+        return SqliteFtsBackend() if connection.vendor == 'sqlite' else PostgresBackend()
+    return InvertedIndexBackend()
+
+
+def get_search_backend():
+    """Process-wide search backend for the default database."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _detect_backend()
+    return _backend
+
+
+def search(query, kinds=KINDS, limit=20):
+    """Ranked matches for ``query`` among the given kinds of document."""
+    terms = query_terms(query)
+    kinds = [kind for kind in kinds if kind in KINDS]
+    if not terms or not kinds or limit <= 0:
+        return []
+    return get_search_backend().search(terms, kinds, limit)
+
+
+def update_index(instance):
+    """Index a saved post or project, or drop it if it is no longer searchable."""
+    doc = document_for(instance)
+    if doc is None:
+        remove_from_index(instance)
+    else:
+        get_search_backend().index([doc])
+
+
+def index_instances(instances):
+    """Index a batch of newly written posts or projects, skipping unsearchable ones."""
+    documents = [doc for doc in map(document_for, instances) if doc is not None]
+    if documents:
+        get_search_backend().index(documents)
+
+
+def remove_from_index(instance):
+    get_search_backend().remove(_kind_of(instance), instance.pk)
+
+
+def rebuild_index(batch_size=500):
+    """Re-index every searchable instance from scratch; returns the number indexed."""
+    backend = get_search_backend()
+    backend.clear()
+    total = 0
+    for queryset in searchable_querysets():
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(document_for(obj))
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            backend.index(batch)
+            total += len(batch)
+    backend.optimize()
+    return total
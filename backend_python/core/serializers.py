@@ -1,10 +1,28 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, Post, Project, Comment, Like, Contact, OnlineUser, PostView, ActivityLog
+from .images import variant_urls
+from .models import User, Post, Project, Comment, Like, Contact, OnlineUser, PostView, ActivityLog, split_tags
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that accepts ``fields`` / ``exclude`` kwargs to trim its output."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+        if exclude:
+            for field_name in exclude:
+                self.fields.pop(field_name, None)
 
 
 class UserSerializer(serializers.ModelSerializer):
     profile_image = serializers.ImageField(read_only=True)
+    profile_image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -19,10 +37,22 @@ class UserSerializer(serializers.ModelSerializer):
             'website',
             'location',
             'profile_image',
+            'profile_image_variants',
             'phone',
         ]
         read_only_fields = ['id', 'last_active', 'is_admin', 'date_joined']
 
+    def get_profile_image_variants(self, obj):
+        return variant_urls(obj.profile_image, self.context.get('request'))
+
+    def update(self, instance, validated_data):
+        # Write only the submitted fields: a full save would put back the last_active
+        # read with request.user over a newer one from LastActiveBuffer
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
@@ -56,6 +86,61 @@ class LoginSerializer(serializers.Serializer):
         raise serializers.ValidationError("Invalid credentials")
 
 
+def drop_orphan_replies(comments):
+    """``comments`` without the replies whose parent is not among them, nor the replies below those.
+
+    A filtered selection (e.g. approved comments only) can hold replies to
+    comments it left out; those threads are not shown.
+    """
+    by_id = {comment.id: comment for comment in comments}
+    in_thread = {}
+    for comment in comments:
+        chain = []
+        while comment.id not in in_thread and comment.parent_id in by_id:
+            chain.append(comment.id)
+            comment = by_id[comment.parent_id]
+        if comment.id not in in_thread:
+            in_thread[comment.id] = comment.parent_id is None
+        for comment_id in chain:
+            in_thread[comment_id] = in_thread[comment.id]
+    return [comment for comment in comments if in_thread[comment.id]]
+
+
+def build_comment_tree(comments, max_depth=None, max_replies=None):
+    """Nest already-fetched comments under their parents and return the roots.
+
+    Runs in O(n) without touching the database. Every comment gets
+    ``reply_count`` (all of its direct replies) and ``reply_list`` (at most
+    ``max_replies`` of them, and none below ``max_depth`` levels). Only
+    top-level comments are roots: replies whose parent is not among
+    ``comments`` are left out of the tree (see ``drop_orphan_replies``).
+    """
+    by_id = {comment.id: comment for comment in comments}
+    children = {}
+    roots = []
+    for comment in comments:
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            children.setdefault(comment.parent_id, []).append(comment)
+
+    for comment in comments:
+        comment.reply_count = len(children.get(comment.id, ()))
+        comment.reply_list = []
+
+    level, depth = roots, 0
+    while level and (max_depth is None or depth < max_depth):
+        next_level = []
+        for comment in level:
+            replies = children.get(comment.id, [])
+            if max_replies is not None:
+                replies = replies[:max_replies]
+            comment.reply_list = replies
+            next_level.extend(replies)
+        level, depth = next_level, depth + 1
+    return roots
+
+
 class CommentSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     user_full_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -86,9 +171,10 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'username', 'user_full_name', 'user_profile_image', 'post_title', 'is_reply', 'replies', 'rating']
 
     def get_replies(self, obj):
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True, context=self.context).data
-        return []
+        replies = getattr(obj, 'reply_list', None)
+        if replies is None:
+            replies = obj.replies.all()
+        return type(self)(replies, many=True, context=self.context).data
 
     def get_rating(self, obj):
         """Approximate rating based on comment sentiment/length."""
@@ -107,12 +193,23 @@ class CommentSerializer(serializers.ModelSerializer):
         return 5
 
 
-class PostSerializer(serializers.ModelSerializer):
+class CommentTreeSerializer(CommentSerializer):
+    """Comment thread node built by ``build_comment_tree``."""
+    reply_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['reply_count']
+        read_only_fields = CommentSerializer.Meta.read_only_fields + ['reply_count']
+
+
+class PostSerializer(DynamicFieldsModelSerializer):
     author_name = serializers.CharField(source='author.username', read_only=True)
-    author_id = serializers.IntegerField(source='author.id', read_only=True)
+    author_id = serializers.IntegerField(read_only=True)
     likes = serializers.IntegerField(source='likes_count', read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments_count = serializers.IntegerField(source='approved_comments_count', read_only=True)
+    comments = serializers.SerializerMethodField()
     tags = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -124,6 +221,7 @@ class PostSerializer(serializers.ModelSerializer):
             'category',
             'tags',
             'image',
+            'image_variants',
             'image_url',
             'author',
             'author_name',
@@ -131,16 +229,33 @@ class PostSerializer(serializers.ModelSerializer):
             'status',
             'featured',
             'views',
+            'unique_views_count',
             'slug',
             'likes',
+            'comments_count',
             'comments',
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'author_id', 'author_name', 'likes', 'comments', 'slug', 'views']
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'author_id', 'author_name',
+            'likes', 'comments_count', 'comments', 'slug', 'views', 'unique_views_count',
+        ]
+
+    # Fields dropped by the lightweight listing mode (``?view=summary``)
+    SUMMARY_EXCLUDE = ('content', 'comments')
+
+    def get_comments(self, obj):
+        # Replies belong to the same post, so the prefetched rows hold the whole thread
+        comments = list(obj.comments.all())
+        build_comment_tree(comments)
+        return CommentSerializer(comments, many=True, context=self.context).data
 
     def get_tags(self, obj):
-        return [tag.strip() for tag in obj.tags.split(',') if tag.strip()] if obj.tags else []
+        return split_tags(obj.tags)
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, self.context.get('request'), self.context.get('manifests'))
 
     def to_internal_value(self, data):
         internal = super().to_internal_value(data)
@@ -150,8 +265,32 @@ class PostSerializer(serializers.ModelSerializer):
         return internal
 
 
+class PostSummarySerializer(serializers.ModelSerializer):
+    """Slim read-only post representation for dashboards and rankings."""
+    author_name = serializers.CharField(source='author.username', read_only=True)
+    likes = serializers.IntegerField(source='likes_count', read_only=True)
+    comments_count = serializers.IntegerField(source='approved_comments_count', read_only=True)
+
+    class Meta:
+        model = Post
+        fields = [
+            'id',
+            'title',
+            'slug',
+            'status',
+            'author_name',
+            'views',
+            'unique_views_count',
+            'likes',
+            'comments_count',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
 class ProjectSerializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
@@ -164,6 +303,7 @@ class ProjectSerializer(serializers.ModelSerializer):
             'github_link',
             'demo_link',
             'image',
+            'image_variants',
             'image_url',
             'category',
             'featured',
@@ -173,7 +313,10 @@ class ProjectSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
     def get_tags(self, obj):
-        return [tag.strip() for tag in obj.tags.split(',') if tag.strip()] if obj.tags else []
+        return split_tags(obj.tags)
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, self.context.get('request'), self.context.get('manifests'))
 
     def to_internal_value(self, data):
         internal = super().to_internal_value(data)
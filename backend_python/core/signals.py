@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import events, images, search
+from .caching import invalidate_on_commit
+from .models import Comment, Like, Menu, Post, PostView, Project, Tag, User
+
+
+def _like_event(like, liked):
+    return lambda: {'post': like.post_id, 'user': like.user_id, 'liked': liked}
+
+
+def _comment_event(comment):
+    return lambda: {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'user': comment.user_id,
+        'username': comment.user.username,
+        'parent': comment.parent_id,
+        'comment': comment.comment,
+        'created_at': comment.created_at,
+    }
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        Post.adjust_counter(instance.post_id, 'likes_count', 1)
+        events.publish_on_commit(instance.post_id, 'like', _like_event(instance, True))
+        events.publish_counters_on_commit(instance.post_id)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    Post.adjust_counter(instance.post_id, 'likes_count', -1)
+    events.publish_on_commit(instance.post_id, 'like', _like_event(instance, False))
+    events.publish_counters_on_commit(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_loaded_status', None)
+    delta = (instance.status == 'approved') - (previous == 'approved')
+    Post.adjust_counter(instance.post_id, 'approved_comments_count', delta)
+    instance._loaded_status = instance.status
+    if delta > 0:
+        events.publish_on_commit(instance.post_id, 'comment', _comment_event(instance))
+    if delta:
+        events.publish_counters_on_commit(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_status', instance.status) == 'approved':
+        Post.adjust_counter(instance.post_id, 'approved_comments_count', -1)
+        events.publish_counters_on_commit(instance.post_id)
+
+
+@receiver(post_save, sender=PostView)
+def post_view_created(sender, instance, created, **kwargs):
+    if created:
+        Post.adjust_counter(instance.post_id, 'unique_views_count', 1)
+        events.publish_counters_on_commit(instance.post_id)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    invalidate_on_commit('posts', f'post:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Like)
+def post_activity_changed(sender, instance, **kwargs):
+    invalidate_on_commit('posts', f'post:{instance.post_id}')
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate_on_commit('projects')
+
+
+@receiver([post_save, post_delete], sender=Menu)
+def menu_changed(sender, instance, **kwargs):
+    invalidate_on_commit('menus')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Project)
+def searchable_saved(sender, instance, **kwargs):
+    search.update_index(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Project)
+def searchable_deleted(sender, instance, **kwargs):
+    search.remove_from_index(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Project)
+def tags_saved(sender, instance, created, **kwargs):
+    previous = '' if created else getattr(instance, '_loaded_tags', None)
+    if instance.tags != previous:
+        Tag.sync(instance)
+        instance._loaded_tags = instance.tags
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Project)
+def image_saved(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(lambda: images.schedule_variants(instance.image))
+
+
+@receiver(post_save, sender=User)
+def profile_image_saved(sender, instance, **kwargs):
+    if instance.profile_image:
+        transaction.on_commit(lambda: images.schedule_variants(instance.profile_image))
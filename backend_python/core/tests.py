@@ -1,3 +1,965 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework import permissions
+from rest_framework.test import APIClient
+
+from . import analytics, events, images, search
+from .admin import UserAdmin
+from .content_transfer import ContentImporter, export_records, read_ndjson, write_ndjson
+from .audit import ActivityLogWriter
+from .models import (
+    User, Post, PostTag, Project, Comment, Like, OnlineUser, PostView, PostViewRollup, RollupWatermark,
+    ActivityLog, Menu,
+)
+from .presence import LastActiveBuffer, PresenceTracker
+from .serializers import UserSerializer
+from .tracking import LRUKeySet, PostViewBuffer, ViewDeduplicator, client_ip
+from .uploads import ContentAddressedStorage
+from .views import CommentViewSet, PostViewSet, ProjectViewSet, menu_view
+
+
+def create_user(username='author', **fields):
+    """User ``username`` with email ``<username>@example.com`` and password ``pass``."""
+    return User.objects.create_user(username=username, email=f'{username}@example.com', password='pass', **fields)
+
+
+def create_post(author, title='Post', **fields):
+    """Post by ``author``; ``content`` defaults to a placeholder."""
+    fields.setdefault('content', 'x')
+    return Post.objects.create(title=title, author=author, **fields)
+
+
+def use_temp_media_root(test, **overrides):
+    """Point MEDIA_ROOT at a temporary directory for the rest of ``test``; returns its path."""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root, **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return media_root
+
+
+class FakeRedis:
+    """The part of ``redis.Redis`` used by ``RedisBroker``: publish and a pattern subscription."""
+
+    def __init__(self):
+        self.channels = []
+        self.messages = queue.Queue()
+
+    def publish(self, channel, message):
+        self.channels.append(channel)
+        self.messages.put({'channel': channel.encode(), 'data': message.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self
+
+    def psubscribe(self, pattern):
+        self.pattern = pattern
+
+    def listen(self):
+        return iter(self.messages.get, None)
+
+
+class PostListQueryCountTests(TestCase):
+    """The post listing must not issue queries per post, comment or reply."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.author = create_user()
+        self.readers = [create_user(f'reader{i}') for i in range(3)]
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = create_post(self.author, f'Post {i}', content='Body', status='published')
+            for reader in self.readers:
+                Like.objects.create(post=post, user=reader)
+            root = Comment.objects.create(post=post, user=self.readers[0], comment='Root')
+            reply = Comment.objects.create(post=post, user=self.readers[1], comment='Reply', parent=root)
+            Comment.objects.create(post=post, user=self.readers[2], comment='Nested', parent=reply)
+            Comment.objects.create(post=post, user=self.readers[2], comment='Spam', status='spam')
+
+    def test_list_runs_fixed_number_of_queries(self):
+        for count in (1, 10):
+            # Cached lists are invalidated when the writes commit
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.all().delete()
+                self.create_posts(count)
+            # posts with counts and authors + comments with their users
+            with self.assertNumQueries(2):
+                response = self.client.get('/posts/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['data']), count)
+
+    def test_list_reports_precomputed_counts_and_threads(self):
+        self.create_posts(1)
+        post = self.client.get('/posts/').json()['data'][0]
+        self.assertEqual(post['likes'], 3)
+        self.assertEqual(post['comments_count'], 3)
+        root = next(comment for comment in post['comments'] if comment['comment'] == 'Root')
+        self.assertEqual(root['replies'][0]['comment'], 'Reply')
+        self.assertEqual(root['replies'][0]['replies'][0]['comment'], 'Nested')
+
+    def test_summary_view_skips_comment_queries(self):
+        self.create_posts(5)
+        with self.assertNumQueries(1):
+            response = self.client.get('/posts/?view=summary')
+        self.assertNotIn('comments', response.json()['data'][0])
+
+    def test_cursor_pages_through_posts_sharing_a_timestamp(self):
+        self.create_posts(5)
+        Post.objects.update(created_at=timezone.now())
+        titles, url = [], '/posts/?view=summary&page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            titles += [post['title'] for post in body['data']]
+            url = body['next']
+        self.assertEqual(sorted(titles), [f'Post {i}' for i in range(5)])
+
+
+class CommentTreeTests(TestCase):
+    """Comment threads are loaded with a fixed number of queries however deep they go."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        user = create_user('reader')
+        self.post = create_post(user, 'Discussed')
+        self.root = Comment.objects.create(post=self.post, user=user, comment='root')
+        self.replies = [
+            Comment.objects.create(post=self.post, user=user, parent=self.root, comment=f'reply {i}')
+            for i in range(3)
+        ]
+        Comment.objects.create(post=self.post, user=user, parent=self.replies[0], comment='nested')
+        Comment.objects.create(post=self.post, user=user, parent=self.root, comment='hidden', status='pending')
+
+    def test_tree_is_one_query_and_honours_limits(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/comments/tree/?post_id={self.post.id}')
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        [root] = body['data']
+        self.assertEqual((root['reply_count'], len(root['replies'])), (3, 3))
+        nested = next(reply for reply in root['replies'] if reply['id'] == self.replies[0].id)
+        self.assertEqual([reply['comment'] for reply in nested['replies']], ['nested'])
+
+        [root] = self.client.get(f'/comments/tree/?post_id={self.post.id}&max_depth=1&max_replies=2').json()['data']
+        self.assertEqual((root['reply_count'], len(root['replies'])), (3, 2))
+        self.assertTrue(all(reply['replies'] == [] for reply in root['replies']))
+
+    def test_replies_to_filtered_out_comments_are_dropped(self):
+        pending = Comment.objects.create(post=self.post, user=self.root.user, comment='pending', status='pending')
+        reply = Comment.objects.create(post=self.post, user=self.root.user, parent=pending, comment='orphan')
+        Comment.objects.create(post=self.post, user=self.root.user, parent=reply, comment='below orphan')
+
+        body = self.client.get(f'/comments/tree/?post_id={self.post.id}').json()
+        self.assertEqual([root['id'] for root in body['data']], [self.root.id])
+        self.assertEqual(body['count'], 5)
+        body = self.client.get(f'/comments/tree/?post_id={self.post.id}&status=all').json()
+        self.assertEqual(sorted(root['id'] for root in body['data']), [self.root.id, pending.id])
+        self.assertEqual(body['count'], 9)
+
+    def test_list_loads_replies_one_query_per_level(self):
+        # Comments, then one query for each of the two reply levels and one finding none below
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/comments/?post_id={self.post.id}')
+        [root] = [comment for comment in response.json()['data'] if comment['id'] == self.root.id]
+        self.assertEqual(len(root['replies']), 4)
+
+
+class ContentTransferTests(TestCase):
+    """An export imports back with new primary keys, renamed slugs and the original timestamps."""
+
+    def setUp(self):
+        self.author = create_user()
+        # Whole seconds: the JSON export keeps milliseconds only
+        self.past = (timezone.now() - timedelta(days=400)).replace(microsecond=0)
+        posts = [create_post(self.author, title) for title in ('First', 'Second')]
+        root = Comment.objects.create(post=posts[0], user=self.author, comment='root')
+        Comment.objects.create(post=posts[0], user=self.author, parent=root, comment='reply')
+        Comment.objects.create(post=posts[1], user=self.author, comment='other')
+        parent = Menu.objects.create(name='about', title='About')
+        Menu.objects.create(name='team', title='Team', parent=parent)
+        Post.objects.update(created_at=self.past, updated_at=self.past)
+        Comment.objects.update(created_at=self.past)
+        Menu.objects.update(created_at=self.past)
+        self.old_ids = set(Post.objects.values_list('id', flat=True)) | set(Comment.objects.values_list('id', flat=True))
+
+    def round_trip(self, **options):
+        stream = io.StringIO()
+        write_ndjson(export_records(['post', 'comment', 'menu']), stream)
+        Post.objects.all().delete()
+        Menu.objects.all().delete()
+        create_post(self.author, 'First', content='squatter')
+        stream.seek(0)
+        return ContentImporter(**options).run(read_ndjson(stream))
+
+    def test_round_trip_remaps_keys_renames_collisions_and_keeps_timestamps(self):
+        # One record per batch: replies and child menus find parents inserted by earlier batches
+        created, skipped = self.round_trip(batch_size=1, on_conflict='rename')
+        self.assertEqual((created['post'], created['comment'], created['menu']), (2, 3, 2))
+
+        squatter = Post.objects.get(slug='first')
+        imported = Post.objects.exclude(pk=squatter.pk).get(title='First')
+        self.assertNotEqual(imported.slug, 'first')
+        self.assertFalse(squatter.comments.exists())
+        reply = imported.comments.get(comment='reply')
+        self.assertEqual(reply.parent, imported.comments.get(comment='root'))
+        self.assertEqual(imported.approved_comments_count, 2)
+        self.assertEqual(Comment.objects.get(comment='other').post.slug, 'second')
+        self.assertFalse(self.old_ids & {imported.id, reply.id, reply.parent_id})
+        self.assertEqual(Menu.objects.get(name='team').parent.name, 'about')
+
+        self.assertEqual((imported.created_at, imported.updated_at), (self.past, self.past))
+        self.assertEqual(reply.created_at, self.past)
+        self.assertEqual(Menu.objects.get(name='about').created_at, self.past)
+        # Later saves still stamp the time
+        imported.save()
+        self.assertGreater(imported.updated_at, self.past)
+
+    def test_importing_twice_in_skip_mode_adds_nothing_the_second_time(self):
+        Project.objects.create(title='Portfolio', description='d')
+        stream = io.StringIO()
+        write_ndjson(export_records(), stream)
+        Post.objects.all().delete()
+        Project.objects.all().delete()
+        Menu.objects.all().delete()
+
+        runs = []
+        for _ in range(2):
+            stream.seek(0)
+            runs.append(ContentImporter(batch_size=2, on_conflict='skip').run(read_ndjson(stream)))
+        (first, _), (second, skipped) = runs
+        self.assertEqual(dict(first), {'post': 2, 'project': 1, 'comment': 3, 'menu': 2})
+        self.assertEqual(sum(second.values()), 0)
+        self.assertEqual(dict(skipped), {'post': 2, 'project': 1, 'comment': 3, 'menu': 2})
+        self.assertEqual((Comment.objects.count(), Project.objects.count()), (3, 1))
+
+    def test_skip_maps_comments_onto_the_existing_post(self):
+        created, skipped = self.round_trip(on_conflict='skip')
+        self.assertEqual((created['post'], skipped['post']), (1, 1))
+        self.assertEqual(Post.objects.get(slug='first').comments.count(), 2)
+
+
+class ResponseCacheInvalidationTests(TestCase):
+    """Cached responses are invalidated when a write commits, not before."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.author = create_user()
+
+    def titles(self, path='/projects/'):
+        return [item['title'] for item in self.client.get(path).json()['data']]
+
+    def test_save_and_delete_invalidate_on_commit(self):
+        self.assertEqual(self.titles(), [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            project = Project.objects.create(title='New', description='d')
+            # Not committed yet: the cached list stays valid and cannot pick up a new version
+            self.assertEqual(self.titles(), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.titles(), ['New'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.delete()
+        self.assertEqual(self.titles(), [])
+
+    def test_view_flush_invalidates_post(self):
+        post = create_post(self.author, 'Viewed')
+        path = f'/posts/?id={post.id}'
+        self.assertEqual(self.client.get(path).json()['data']['views'], 0)
+        listed = self.client.get('/posts/')['ETag']
+        buffer = PostViewBuffer(background=False)
+        buffer.record(post.id, '10.0.0.1')
+        buffer.flush()
+        self.assertEqual(self.client.get(path).json()['data']['views'], 1)
+        # Listings are left alone: a flush every few seconds would keep them from being cached
+        self.assertEqual(self.client.get('/posts/')['ETag'], listed)
+
+
+class ConditionalGetTests(TestCase):
+    """Revalidations with a current ETag or Last-Modified get a 304 without running the view."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+
+    def test_revalidation_round_trips(self):
+        first = self.client.get('/projects/')
+        etag, last_modified = first['ETag'], first['Last-Modified']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/projects/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            response = self.client.get('/projects/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(title='New', description='d')
+        response = self.client.get('/projects/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/projects/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class AnalyticsSnapshotTests(TestCase):
+    """Only the request holding the lock rebuilds a stale snapshot; the others serve the old copy."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def test_stale_snapshot_is_served_while_another_request_refreshes(self):
+        caches['default'].set(analytics.SNAPSHOT_CACHE_KEY, {'created': 0, 'data': {'total_posts': -1}})
+        caches['default'].add(analytics.SNAPSHOT_LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.get_analytics_snapshot(max_age=60), {'total_posts': -1})
+
+        caches['default'].delete(analytics.SNAPSHOT_LOCK_KEY)
+        self.assertEqual(analytics.get_analytics_snapshot(max_age=60)['total_posts'], 0)
+        self.assertIsNone(caches['default'].get(analytics.SNAPSHOT_LOCK_KEY))
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.get_analytics_snapshot(max_age=60)['total_posts'], 0)
+
+
+class RollupTests(TestCase):
+    """Rollups advance their watermark only over settled rows and never count a row twice."""
+
+    def setUp(self):
+        author = create_user()
+        self.post = create_post(author, 'Viewed')
+
+    def view(self, age):
+        return PostView.objects.create(post=self.post, ip_address='10.0.0.1', viewed_at=timezone.now() - age)
+
+    def daily_views(self):
+        return sum(PostViewRollup.objects.filter(period='day').values_list('views', flat=True))
+
+    def test_watermark_stops_at_rows_younger_than_lag(self):
+        old = [self.view(timedelta(hours=2)) for _ in range(3)]
+        recent = self.view(timedelta(seconds=5))
+        self.assertEqual(analytics.rollup_source('post_views', batch_size=2, lag=600), 3)
+        watermark = RollupWatermark.objects.get(name='post_views')
+        self.assertEqual(watermark.last_id, old[-1].pk)
+        self.assertEqual(self.daily_views(), 3)
+
+        # Nothing new is settled: a second run changes nothing
+        self.assertEqual(analytics.rollup_source('post_views', lag=600), 0)
+        self.assertEqual(self.daily_views(), 3)
+
+        # Once settled, the recent row is folded in exactly once
+        self.assertEqual(analytics.rollup_source('post_views', lag=0), 1)
+        watermark.refresh_from_db()
+        self.assertEqual(watermark.last_id, recent.pk)
+        self.assertEqual(self.daily_views(), 4)
+
+
+class PruneHistoryTests(TestCase):
+    """Pruning only removes rows whose views are already counted by a rollup."""
+
+    def setUp(self):
+        author = create_user()
+        self.post = create_post(author, 'Old')
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+
+    def view(self, days):
+        viewed_at = timezone.now() - timedelta(days=days)
+        return PostView.objects.create(post=self.post, ip_address='10.0.0.1', viewed_at=viewed_at)
+
+    def view_total(self):
+        return Post.objects.with_counts().get(pk=self.post.pk).num_unique_views
+
+    def prune(self, *args):
+        output = io.StringIO()
+        with override_settings(HISTORY_ARCHIVE_DIR=self.archive_dir):
+            call_command('prune_history', '--table', 'post_views', '--max-age-days', '30', *args, stdout=output)
+        return output.getvalue()
+
+    def test_pruned_rows_are_still_counted(self):
+        for days in (100, 100, 60, 1):
+            self.view(days)
+        analytics.rollup_source('post_views', lag=0)
+        self.prune('--no-archive')
+        self.assertEqual(PostView.objects.count(), 1)
+        self.assertEqual(self.view_total(), 4)
+
+    def test_dry_run_deletes_nothing_and_archive_keeps_rows(self):
+        self.view(100)
+        analytics.rollup_source('post_views', lag=0)
+        self.assertIn('1 rows older than 30 days would be pruned', self.prune('--dry-run'))
+        self.assertEqual(PostView.objects.count(), 1)
+
+        self.prune('--archive')
+        self.assertEqual(PostView.objects.count(), 0)
+        [name] = os.listdir(self.archive_dir)
+        with gzip.open(os.path.join(self.archive_dir, name), 'rt') as archive:
+            self.assertEqual(json.loads(archive.readline())['post_id'], self.post.pk)
+
+    def test_rows_behind_the_watermark_but_not_rolled_up_are_kept(self):
+        self.view(100)
+        analytics.rollup_source('post_views', lag=0)
+        # A row that committed after the watermark passed its id
+        straggler = self.view(100)
+        RollupWatermark.objects.filter(name='post_views').update(last_id=straggler.pk)
+        output = self.prune('--no-archive')
+        self.assertIn('1 rows missing from its rollup', output)
+        self.assertTrue(PostView.objects.filter(pk=straggler.pk).exists())
+        # Never rolled up and never pruned: the rows remain for a recount
+        self.assertEqual(PostView.objects.count(), 2)
+
+
+class VisitorIdentityTests(TestCase):
+    """Visitors are identified by an address they cannot forge and counted once per window."""
+
+    def request(self, remote, forwarded=None):
+        request = RequestFactory().get('/', REMOTE_ADDR=remote)
+        if forwarded:
+            request.META['HTTP_X_FORWARDED_FOR'] = forwarded
+        return request
+
+    def test_forwarded_for_is_only_believed_from_trusted_proxies(self):
+        spoofed = self.request('203.0.113.9', forwarded='198.51.100.1')
+        self.assertEqual(client_ip(spoofed), '203.0.113.9')
+        with override_settings(TRUSTED_PROXIES=['10.0.0.0/8']):
+            # The client prepended a fake hop; the proxy appended the real address
+            proxied = self.request('10.1.2.3', forwarded='198.51.100.1, 203.0.113.9, 10.4.5.6')
+            self.assertEqual(client_ip(proxied), '203.0.113.9')
+            self.assertEqual(client_ip(spoofed), '203.0.113.9')
+        with override_settings(TRUSTED_PROXIES=['*']):
+            self.assertEqual(client_ip(self.request('172.16.0.1', forwarded='1.2.3.4, 203.0.113.9')), '203.0.113.9')
+
+    def test_deduplicators_count_a_visitor_once_per_window(self):
+        for backend in ('bloom', 'lru'):
+            with self.subTest(backend=backend):
+                dedup = ViewDeduplicator(backend=backend, window=60)
+                self.assertFalse(dedup.is_duplicate(1, '10.0.0.1', now=0))
+                self.assertTrue(dedup.is_duplicate(1, '10.0.0.1', now=30))
+                self.assertFalse(dedup.is_duplicate(2, '10.0.0.1', now=30))
+                self.assertFalse(dedup.is_duplicate(1, '10.0.0.2', now=30))
+                self.assertFalse(dedup.is_duplicate(1, '10.0.0.1', now=60))
+
+    def test_lru_forgets_the_oldest_keys(self):
+        keys = LRUKeySet(max_entries=2)
+        keys.add('a')
+        keys.add('b')
+        keys.add('a')
+        keys.add('c')
+        self.assertTrue(keys.add('a'))
+        self.assertFalse(keys.add('b'))
+
+
+class PostViewBufferTests(TestCase):
+    """Views are written in batches and dropped instead of blocking when the queue is full."""
+
+    def setUp(self):
+        author = create_user()
+        self.post = create_post(author, 'Viewed')
+
+    def test_buffer_flushes_at_flush_size_and_drops_when_full(self):
+        buffer = PostViewBuffer(flush_size=2, max_pending=3, background=False)
+        self.assertEqual(buffer.record(self.post.id, '10.0.0.1'), PostViewBuffer.RECORDED)
+        self.assertEqual(PostView.objects.count(), 0)
+        buffer.record(self.post.id, '10.0.0.2')
+        self.assertEqual((PostView.objects.count(), buffer.pending), (2, 0))
+
+        full = PostViewBuffer(flush_size=100, max_pending=2, background=False)
+        statuses = [full.record(self.post.id, f'10.0.1.{i}') for i in range(3)]
+        self.assertEqual(statuses[-1], PostViewBuffer.DROPPED)
+        self.assertEqual(full.stats()['dropped'], 1)
+        self.assertEqual(full.flush(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.views, self.post.unique_views_count), (4, 4))
+
+    def test_repeat_views_count_as_views_but_not_unique_views(self):
+        buffer = PostViewBuffer(background=False, deduplicator=ViewDeduplicator(backend='lru', window=60))
+        for ip in ('10.0.0.1', '10.0.0.1', '10.0.0.1', '10.0.0.2'):
+            buffer.record(self.post.id, ip)
+        self.assertEqual(buffer.flush(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.views, self.post.unique_views_count), (4, 2))
+        self.assertEqual(PostView.objects.count(), 2)
+
+    def test_views_of_deleted_posts_are_skipped(self):
+        buffer = PostViewBuffer(background=False)
+        buffer.record(self.post.id, '10.0.0.1')
+        buffer.record(self.post.id + 1000, '10.0.0.1')
+        self.assertEqual(buffer.flush(), 1)
+
+
+class ActivityLogTests(TestCase):
+    """Audit events are queued without blocking, dropped when the queue is full and keep the real peer address."""
+
+    def test_full_queue_drops_and_failed_writes_are_counted(self):
+        writer = ActivityLogWriter(max_pending=2)
+        with mock.patch.object(writer, '_ensure_worker'):
+            results = [writer.log('post_created', entity_id=i) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(writer.stats(), {'queue_depth': 2, 'written': 0, 'dropped': 1, 'failed': 0})
+
+        # The worker writes whatever is still queued once asked to stop
+        writer._stopping.set()
+        writer._run()
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(writer.stats()['written'], 2)
+
+        failing = ActivityLogWriter(background=False)
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertLogs('core.audit', 'ERROR'):
+            failing.log('post_deleted')
+        self.assertEqual((failing.stats()['failed'], failing.stats()['written']), (1, 0))
+
+    def test_entries_of_deleted_users_are_kept_without_the_user(self):
+        kept = create_user('kept')
+        gone = create_user('gone')
+        writer = ActivityLogWriter()
+        with mock.patch.object(writer, '_ensure_worker'):
+            writer.log('login', user=kept)
+            writer.log('login', user=gone)
+        gone.delete()
+
+        writer._stopping.set()
+        writer._run()
+        self.assertEqual(writer.stats()['written'], 2)
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list('user_id', flat=True), key=lambda user_id: user_id or 0),
+            [None, kept.id],
+        )
+
+    def test_audit_address_ignores_forwarded_for_from_untrusted_peers(self):
+        author = create_user()
+        with mock.patch('core.views.log_activity') as log_activity:
+            response = APIClient().post(
+                '/posts/', {'title': 'Audited', 'content': 'x', 'author': author.id}, format='json',
+                REMOTE_ADDR='203.0.113.9', HTTP_X_FORWARDED_FOR='198.51.100.1',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(log_activity.call_args.kwargs['ip_address'], '203.0.113.9')
+
+
+class SearchTests(TestCase):
+    """Search matches prefixes, ranks title hits first and follows saves."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        author = create_user()
+        self.tuning = create_post(author, 'Query tuning', content='<p>Indexes & plans</p>', status='published')
+        create_post(author, 'Cooking', content='Tuning an oven', status='published')
+        create_post(author, 'Tuning draft', content='Unpublished')
+        Project.objects.create(title='Dashboard', description='Query tuning dashboard')
+
+    def assert_search_behaviour(self):
+        hits = search.search('tun')
+        self.assertEqual([(hit.kind, hit.object_id) for hit in hits][0], ('post', self.tuning.pk))
+        self.assertEqual(len(hits), 3)
+        self.assertEqual(search.render_highlight(hits[0].title), 'Query <mark>tuning</mark>')
+        self.assertEqual([hit.kind for hit in search.search('tun', kinds=['project'])], ['project'])
+
+        self.tuning.status = 'draft'
+        self.tuning.save()
+        self.assertNotIn(self.tuning.pk, [hit.object_id for hit in search.search('query', kinds=['post'])])
+
+    def test_database_backend(self):
+        self.assert_search_behaviour()
+
+    def test_python_backend(self):
+        backend = search._backend
+        search._backend = search.InvertedIndexBackend()
+        try:
+            self.assert_search_behaviour()
+        finally:
+            search._backend = backend
+
+    def test_endpoint_escapes_text_around_highlights(self):
+        response = self.client.get('/search?q=index')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['snippet'], '<mark>Indexes</mark> &amp; plans')
+        self.assertEqual(self.client.get('/search?q=').status_code, 400)
+
+
+class TagTests(TestCase):
+    """Tag strings are mirrored into link rows that drive filtering and the tag cloud."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.author = create_user()
+
+    def test_filter_and_cloud_follow_tag_edits(self):
+        first = create_post(self.author, 'First', status='published', tags='Django, Python, django')
+        create_post(self.author, 'Second', status='published', tags='python')
+        create_post(self.author, 'Draft', tags='Python')
+        Project.objects.create(title='Tool', tags='Python,Rust')
+
+        titles = [post['title'] for post in self.client.get('/posts/?tag=Django').json()['data']]
+        self.assertEqual(titles, ['First'])
+        cloud = self.client.get('/tags').json()['data']
+        self.assertEqual(cloud[0], {'name': 'Python', 'slug': 'python', 'posts': 2, 'projects': 1})
+        self.assertEqual([tag['slug'] for tag in cloud], ['python', 'django', 'rust'])
+
+        first.tags = 'Rust'
+        first.save()
+        self.assertEqual(
+            set(PostTag.objects.filter(post=first).values_list('tag__slug', flat=True)), {'rust'}
+        )
+        self.assertEqual(self.client.get('/posts/?tag=django').json()['data'], [])
+
+
+class SlugAllocationTests(TestCase):
+    """Slugs get the lowest free ``-N`` suffix from a single lookup."""
+
+    def test_save_and_bulk_create_pick_next_suffix(self):
+        author = create_user()
+        for _ in range(3):
+            create_post(author, 'Same title')
+        create_post(author, 'Same title extended')
+
+        post = Post(title='Same title', content='x', author=author)
+        with self.assertNumQueries(1):
+            Post.assign_slugs([post])
+        self.assertEqual(post.slug, 'same-title-4')
+
+        posts = Post.objects.bulk_create(
+            [Post(title=title, content='x', author=author) for title in ('Same title', 'Same title', 'Other')]
+        )
+        self.assertEqual([post.slug for post in posts], ['same-title-4', 'same-title-5', 'other'])
+
+    def test_lowest_free_suffix_is_reused(self):
+        author = create_user()
+        create_post(author, 'Python', slug='python-3')
+        self.assertEqual(create_post(author, 'Python').slug, 'python')
+        posts = Post.objects.bulk_create([Post(title='Python', content='x', author=author) for _ in range(2)])
+        self.assertEqual([post.slug for post in posts], ['python-2', 'python-4'])
+
+
+class ImageVariantTests(TestCase):
+    """Lazy variant URLs generate resized copies once and redirect to their content-hash names."""
+
+    def setUp(self):
+        self.media_root = use_temp_media_root(self)
+        caches['responses'].clear()
+        self.client = APIClient()
+
+    def test_variants_are_resized_and_shared_by_identical_uploads(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(buffer, 'JPEG')
+        author = create_user()
+        posts = [
+            create_post(author, f'Post {i}', image=SimpleUploadedFile(f'photo{i}.jpg', buffer.getvalue()))
+            for i in range(2)
+        ]
+
+        variants = self.client.get(f'/posts/?id={posts[0].id}').json()['data']['image_variants']
+        response = self.client.get(variants['card']['webp'])
+        self.assertEqual(response.status_code, 302)
+        manifest = images.load_manifest(posts[0].image.name)
+        self.assertTrue(response['Location'].endswith(f"{manifest['digest']}-card.webp"))
+        with Image.open(f"{self.media_root}/{manifest['variants']['card']['webp']}") as card:
+            self.assertEqual(card.size, (800, 400))
+
+        other = images.generate_variants(posts[1].image.name)
+        self.assertEqual(other['variants'], manifest['variants'])
+
+
+class StreamingUploadTests(TestCase):
+    """API uploads are validated while streaming and stored once per distinct content."""
+
+    def setUp(self):
+        use_temp_media_root(self, IMAGE_VARIANTS={'EAGER': False})
+        self.author = create_user()
+        self.client = APIClient()
+
+    def upload(self, name, content):
+        return self.client.post('/posts/', {
+            'title': name, 'content': 'x', 'author': self.author.id,
+            'image': SimpleUploadedFile(name, content),
+        }, format='multipart')
+
+    def test_identical_images_are_stored_once(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        self.assertEqual(self.upload('a.png', buffer.getvalue()).status_code, 201)
+        self.assertEqual(self.upload('b.png', buffer.getvalue()).status_code, 201)
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertRegex(names.pop(), r'^posts/[0-9a-f]{64}\.png$')
+        # Other file fields keep the default storage and their upload names
+        self.assertNotIsInstance(default_storage, ContentAddressedStorage)
+        self.assertNotIsInstance(User._meta.get_field('profile_image').storage, ContentAddressedStorage)
+
+    def test_invalid_and_oversized_uploads_are_rejected(self):
+        response = self.upload('fake.png', b'not an image at all')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+        with override_settings(UPLOADS={'MAX_SIZE': 1024}):
+            response = self.upload('big.jpg', b'\xff\xd8\xff' + bytes(4096))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Post.objects.exists())
+
+    def test_decompression_bomb_is_rejected_from_its_header(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            response = self.upload('bomb.png', buffer.getvalue())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['message'].startswith('Image dimensions too large'))
+
+
+class MediaServingTests(TestCase):
+    """Media files are streamed with Range support and long-lived caching for content-hash names."""
+
+    def setUp(self):
+        self.media_root = use_temp_media_root(self)
+        self.name = f"{'a' * 64}.png"
+        with open(f'{self.media_root}/{self.name}', 'wb') as f:
+            f.write(bytes(range(256)))
+
+    def test_range_and_caching_headers(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/256')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=300-').status_code, 416)
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class PresenceTests(TestCase):
+    """Heartbeats expire from the window and reach the database at most once per interval."""
+
+    def test_window_and_coalesced_writes(self):
+        alice = create_user('alice')
+        bob = create_user('bob')
+        tracker = PresenceTracker(window=300, write_interval=60, background=False)
+
+        tracker.heartbeat(alice.pk, 'alice', now=1000)
+        tracker.heartbeat(bob.pk, 'bob', now=1100)
+        self.assertEqual([user['username'] for user in tracker.online(now=1200)], ['bob', 'alice'])
+        self.assertEqual([user['username'] for user in tracker.online(now=1350)], ['bob'])
+
+        self.assertEqual(tracker.flush(), 2)
+        tracker.heartbeat(bob.pk, 'bob', now=1130)
+        self.assertEqual(tracker.flush(), 0)
+        tracker.heartbeat(bob.pk, 'bob', now=1170)
+        self.assertEqual(tracker.flush(), 1)
+        self.assertEqual(OnlineUser.objects.get(user=bob).last_seen.timestamp(), 1170)
+
+    def test_last_active_skips_small_steps_and_never_moves_back(self):
+        user = create_user('carol')
+        joined = user.last_active.timestamp()
+        buffer = LastActiveBuffer(granularity=60, background=False)
+
+        self.assertFalse(buffer.touch(user.pk, stored=user.last_active, now=joined + 30))
+        self.assertTrue(buffer.touch(user.pk, stored=user.last_active, now=joined + 90))
+        self.assertFalse(buffer.touch(user.pk, now=joined + 120))
+        user.save()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertAlmostEqual(User.objects.get(pk=user.pk).last_active.timestamp(), joined + 90, places=3)
+
+        User.objects.filter(pk=user.pk).update(last_active=user.last_active.replace(year=2100))
+        buffer.touch(user.pk, now=joined + 600)
+        buffer.flush()
+        self.assertEqual(User.objects.get(pk=user.pk).last_active.year, 2100)
+
+    def test_profile_and_admin_edits_of_a_stale_user_keep_last_active(self):
+        user = create_user('dave')
+        stale = User.objects.get(pk=user.pk)
+        buffer = LastActiveBuffer(granularity=60, background=False)
+        buffer.touch(user.pk, stored=user.last_active, now=user.last_active.timestamp() + 3600)
+        buffer.flush()
+        expected = user.last_active.timestamp() + 3600
+
+        serializer = UserSerializer(stale, data={'bio': 'Edited'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        stored = User.objects.get(pk=user.pk)
+        self.assertEqual(stored.bio, 'Edited')
+        self.assertAlmostEqual(stored.last_active.timestamp(), expected, places=3)
+
+        stale.location = 'Berlin'
+        UserAdmin(User, admin.site).save_model(None, stale, None, change=True)
+        stored = User.objects.get(pk=user.pk)
+        self.assertEqual(stored.location, 'Berlin')
+        self.assertAlmostEqual(stored.last_active.timestamp(), expected, places=3)
+
+        # A plain save() still writes every field, last_active included
+        stale.save()
+        self.assertEqual(User.objects.get(pk=user.pk).last_active, stale.last_active)
+
+
+class PostEventsTests(TestCase):
+    """The ASGI event stream sends the post's counters, then likes as they commit."""
+
+    def create_live_post(self):
+        self.user = create_user()
+        return create_post(self.user, 'Live')
+
+    def like(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=post, user=self.user)
+
+    async def test_stream_sends_counters_and_likes(self):
+        post = await sync_to_async(self.create_live_post)()
+        response = await self.async_client.get(f'/posts/{post.id}/events')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            self.assertIn(b'"likes_count": 0', await anext(stream))
+            await sync_to_async(self.like)(post)
+            self.assertIn(b'"liked": true', await anext(stream))
+            self.assertIn(b'"likes_count": 1', await anext(stream))
+        finally:
+            await stream.aclose()
+
+    def test_wsgi_requests_are_refused(self):
+        post = self.create_live_post()
+        self.assertEqual(self.client.get(f'/posts/{post.id}/events').status_code, 501)
+
+    async def test_redis_broker_relays_events_through_pubsub(self):
+        client = FakeRedis()
+        broker = events.RedisBroker('redis://unused', client=client)
+        subscription = broker.subscribe('post:1')
+        try:
+            broker.publish('post:1', 'like', {'liked': True})
+            self.assertEqual(client.channels, ['portfolio:events:post:1'])
+            self.assertEqual(await subscription.get(timeout=5), ('like', {'liked': True}))
+            self.assertIsNone(await subscription.get(timeout=0.05))
+        finally:
+            subscription.close()
+            client.messages.put(None)
+
+
+class LikeTests(TestCase):
+    """Likes are set idempotently and their state is read for many posts at once."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('reader')
+        self.posts = [create_post(self.user, f'Post {i}') for i in range(3)]
+
+    def toggle(self, post, **data):
+        return self.client.post(
+            '/posts/toggle_like/', {'post_id': post.id, 'user_id': self.user.id, **data}, format='json'
+        ).json()
+
+    def test_toggle_flips_and_explicit_state_is_idempotent(self):
+        post = self.posts[0]
+        self.assertEqual(self.toggle(post)['liked'], True)
+        repeated = self.toggle(post, liked=True)
+        self.assertEqual((repeated['changed'], repeated['likes']), (False, 1))
+        self.assertEqual(self.toggle(post)['likes'], 0)
+        self.assertEqual(self.toggle(post, liked=False)['changed'], False)
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+    def test_like_state_uses_one_query(self):
+        Like.set_liked(self.posts[1].id, self.user.id, True)
+        ids = ','.join(str(post.id) for post in self.posts)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/posts/like_state/?post_ids={ids}&user_id={self.user.id}')
+        data = response.json()['data']
+        self.assertEqual(data[str(self.posts[1].id)], {'liked': True, 'likes': 1})
+        self.assertEqual(data[str(self.posts[0].id)], {'liked': False, 'likes': 0})
+
+
+@override_settings(ROOT_URLCONF='portfolio.asgi_urls')
+class AsyncReadViewTests(TestCase):
+    """The async read endpoints return what the DRF views return for the same request."""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = create_user()
+        self.post = create_post(self.user, 'Async', tags='perf')
+        root = Comment.objects.create(post=self.post, user=self.user, comment='Root', status='approved')
+        Comment.objects.create(post=self.post, user=self.user, comment='Reply', status='approved', parent=root)
+        Project.objects.create(title='Project', description='d', tags='perf')
+
+    def sync_get(self, path):
+        caches['responses'].clear()
+        with override_settings(ROOT_URLCONF='portfolio.urls'):
+            return APIClient().get(path, HTTP_ACCEPT='application/json')
+
+    async def test_async_responses_match_sync_views(self):
+        paths = [
+            '/posts/', '/posts/?view=summary&tag=perf', f'/posts/?id={self.post.id}', f'/posts/{self.post.id}/',
+            '/posts/999/', '/projects/?tag=perf', f'/comments/?post_id={self.post.id}', '/menus',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                await caches['responses'].aclear()
+                response = await self.async_client.get(path)
+                expected = await sync_to_async(self.sync_get)(path)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    async def test_viewset_permissions_and_negotiation_apply(self):
+        class DenyAll(permissions.BasePermission):
+            def has_permission(self, request, view):
+                return False
+
+        routes = [
+            (PostViewSet, '/posts/'), (PostViewSet, f'/posts/{self.post.id}/'),
+            (ProjectViewSet, '/projects/'), (CommentViewSet, '/comments/'), (menu_view.cls, '/menus'),
+        ]
+        for view_class, path in routes:
+            with self.subTest(path=path), mock.patch.object(view_class, 'permission_classes', [DenyAll]):
+                response = await self.async_client.get(path)
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(response.json(), (await sync_to_async(self.sync_get)(path)).json())
+
+        response = await self.async_client.get('/posts/', headers={'accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    async def test_image_manifests_are_not_read_on_the_event_loop(self):
+        await Post.objects.filter(pk=self.post.pk).aupdate(image='posts/async.png')
+        await Project.objects.aupdate(image='projects/async.png')
+        on_loop = []
+
+        def load_manifest(name):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(name)
+            except RuntimeError:
+                pass
+
+        with mock.patch('core.images.load_manifest', side_effect=load_manifest) as loaded:
+            for path in ('/posts/', f'/posts/{self.post.id}/', '/projects/'):
+                response = await self.async_client.get(path)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(loaded.call_count, 3)
+        self.assertEqual(on_loop, [])
+
+    async def test_writes_fall_through_to_sync_views(self):
+        response = await self.async_client.post('/comments/', {'post': self.post.id, 'comment': 'Hi'})
+        self.assertEqual(response.status_code, (await sync_to_async(self.sync_post)()).status_code)
+
+    def sync_post(self):
+        with override_settings(ROOT_URLCONF='portfolio.urls'):
+            return APIClient().post('/comments/', {'post': self.post.id, 'comment': 'Hi'})
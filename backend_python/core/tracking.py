@@ -0,0 +1,350 @@
+"""In-process buffering for high-volume analytics writes.
+
+Page views are far too frequent to insert one ``PostView`` row per request,
+so they are deduplicated in memory, queued here and written in batches by a
+background thread.
+"""
+import atexit
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import events
+from .caching import invalidate
+from .models import Post, PostView
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_ip(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8)
+def _proxy_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies if proxy != '*')
+
+
+def client_ip(request):
+    """Client address, read from ``X-Forwarded-For`` only behind a trusted proxy.
+
+    ``REMOTE_ADDR`` is used unless it belongs to ``TRUSTED_PROXIES``
+    (addresses or networks; ``*`` trusts whatever peer connects, for load
+    balancers without fixed addresses). Behind a trusted proxy the hops of
+    ``X-Forwarded-For`` are read from the right, skipping trusted proxies,
+    and the first other address is the client: everything left of it was
+    supplied by the client and may be forged.
+    """
+    remote = _parse_ip(request.META.get('REMOTE_ADDR', ''))
+    proxies = tuple(getattr(settings, 'TRUSTED_PROXIES', ()))
+    networks = _proxy_networks(proxies)
+
+    def trusted(address):
+        return any(address in network for network in networks)
+
+    if remote is None or not ('*' in proxies or trusted(remote)):
+        return str(remote) if remote is not None else None
+    hops = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+    for hop in reversed(hops):
+        address = _parse_ip(hop)
+        if address is None:
+            break
+        if not trusted(address):
+            return str(address)
+    return str(remote)
+
+
+def _grouped_increment(counts):
+    """``CASE`` expression adding ``counts[post_id]`` to the row's current value."""
+    return Case(
+        *[When(pk=post_id, then=Value(count)) for post_id, count in counts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` keys at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_memory(cls, max_bytes, error_rate=0.001):
+        """The largest filter that fits in ``max_bytes`` at ``error_rate``."""
+        capacity = max_bytes * 8 * math.log(2) ** 2 / -math.log(error_rate)
+        return cls(capacity, error_rate)
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Insert ``key``; returns ``True`` if it was (probably) already present."""
+        present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                present = False
+                self._bits[byte] |= 1 << bit
+        if not present:
+            self.count += 1
+        return present
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class LRUKeySet:
+    """Exact set of the ``max_entries`` most recently added keys."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+
+    def add(self, key):
+        """Insert ``key``; returns ``True`` if it was already present."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        self._keys[key] = None
+        if len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+        return False
+
+
+class ViewDeduplicator:
+    """Remembers which visitors viewed which post within the current time bucket.
+
+    Keys are ``(post_id, user or IP, bucket)`` where ``bucket`` is the
+    ``window``-second slot of the view, so a visitor counts once per post per
+    window. The ``bloom`` backend uses a fixed ``max_bytes`` of memory and may
+    wrongly treat a new view as a repeat with probability ``error_rate``; it is
+    reset when the bucket changes or when it reaches capacity. The ``lru``
+    backend is exact but holds up to ``max_entries`` keys.
+    """
+
+    def __init__(self, backend='bloom', window=1800, error_rate=0.001, max_bytes=1024 * 1024,
+                 max_entries=100000):
+        if backend not in ('bloom', 'lru'):
+            raise ValueError(f'Unknown view deduplication backend: {backend}')
+        self.backend = backend
+        self.window = window
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._bucket = None
+        self._seen = None
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'POST_VIEW_DEDUP', {})
+        return cls(
+            backend=options.get('BACKEND', 'bloom'),
+            window=options.get('WINDOW', 1800),
+            error_rate=options.get('ERROR_RATE', 0.001),
+            max_bytes=options.get('MAX_BYTES', 1024 * 1024),
+            max_entries=options.get('MAX_ENTRIES', 100000),
+        )
+
+    def _new_set(self):
+        if self.backend == 'lru':
+            return LRUKeySet(self.max_entries)
+        return BloomFilter.for_memory(self.max_bytes, self.error_rate)
+
+    def is_duplicate(self, post_id, ip_address, user_id=None, now=None):
+        """Record the view and report whether it repeats one in the current window."""
+        bucket = int((time.time() if now is None else now) // self.window)
+        if bucket != self._bucket or (self.backend == 'bloom' and self._seen.is_full):
+            self._bucket = bucket
+            self._seen = self._new_set()
+        visitor = f'u{user_id}' if user_id is not None else f'ip{ip_address}'
+        return self._seen.add(f'{post_id}:{visitor}:{bucket}')
+
+
+class PostViewBuffer:
+    """Bounded queue of page views flushed with ``bulk_create``.
+
+    Repeat views found by ``deduplicator`` (if given) are not queued as
+    ``PostView`` rows; they are only tallied per post and added to
+    ``Post.views`` on the next flush, while ``unique_views_count`` counts
+    the rows. Views are flushed when ``flush_size`` events are pending or
+    every ``flush_interval`` seconds, whichever comes first. At most
+    ``max_pending`` events are held; once full, new events are dropped (and
+    counted in ``dropped``) rather than blocking requests or growing memory.
+    """
+
+    RECORDED = 'recorded'
+    DUPLICATE = 'duplicate'
+    DROPPED = 'dropped'
+
+    def __init__(self, flush_size=500, flush_interval=5.0, max_pending=10000, background=True,
+                 deduplicator=None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.background = background
+        self.deduplicator = deduplicator
+        self.dropped = 0
+        self.duplicates = 0
+        self.flushed = 0
+        self._pending = deque()
+        self._repeats = Counter()  # post id -> duplicate views since the last flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'POST_VIEW_BUFFER', {})
+        return cls(
+            flush_size=options.get('FLUSH_SIZE', 500),
+            flush_interval=options.get('FLUSH_INTERVAL', 5.0),
+            max_pending=options.get('MAX_PENDING', 10000),
+            background=options.get('BACKGROUND', True),
+            deduplicator=ViewDeduplicator.from_settings(),
+        )
+
+    def record(self, post_id, ip_address, user_id=None):
+        """Queue one view; returns ``RECORDED``, ``DUPLICATE`` or ``DROPPED``."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return self.DROPPED
+            if self.deduplicator and self.deduplicator.is_duplicate(post_id, ip_address, user_id):
+                self.duplicates += 1
+                self._repeats[post_id] += 1
+                return self.DUPLICATE
+            self._pending.append((post_id, user_id, ip_address, timezone.now()))
+            should_flush = len(self._pending) >= self.flush_size
+
+        if self.background:
+            self._ensure_worker()
+            if should_flush:
+                self._wake.set()
+        elif should_flush:
+            self.flush()
+        return self.RECORDED
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write every pending view and bump ``Post.views``; returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+                repeats, self._repeats = self._repeats, Counter()
+            if not batch and not repeats:
+                return 0
+
+            try:
+                written = self._write(batch, repeats)
+            except Exception:
+                with self._lock:
+                    self.dropped += len(batch)
+                raise
+            self.flushed += written
+            return written
+
+    def _write(self, batch, repeats):
+        # Skip views of posts deleted since they were queued, so one stale
+        # id cannot fail the FK check for the whole batch
+        post_ids = {post_id for post_id, _, _, _ in batch} | set(repeats)
+        existing = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        rows = [
+            PostView(post_id=post_id, user_id=user_id, ip_address=ip, viewed_at=viewed_at)
+            for post_id, user_id, ip, viewed_at in batch
+            if post_id in existing
+        ]
+        unique = Counter(row.post_id for row in rows)
+        views = unique + Counter({post_id: count for post_id, count in repeats.items() if post_id in existing})
+        if not views:
+            return 0
+
+        with transaction.atomic():
+            PostView.objects.bulk_create(rows, batch_size=self.flush_size)
+            Post.objects.filter(pk__in=views).update(
+                views=F('views') + _grouped_increment(views),
+                unique_views_count=F('unique_views_count') + _grouped_increment(unique),
+            )
+        # After the commit, so no request can cache the old counters under the new
+        # version. Only the posts' own scopes: listings would otherwise be
+        # invalidated on every flush, and may show counters up to the cache
+        # timeout old
+        invalidate(*(f'post:{post_id}' for post_id in views))
+        events.publish_counters(views)
+        return len(rows)
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'flushed': self.flushed,
+            'duplicates': self.duplicates,
+            'dropped': self.dropped,
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._worker is None:
+                atexit.register(self.flush)
+            self._worker = threading.Thread(target=self._run, name='post-view-buffer', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            started = time.monotonic()
+            try:
+                written = self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered post views')
+            else:
+                if written:
+                    logger.debug('Flushed %d post views in %.3fs', written, time.monotonic() - started)
+            finally:
+                close_old_connections()
+
+
+_post_view_buffer = None
+_post_view_buffer_lock = threading.Lock()
+
+
+def get_post_view_buffer():
+    """Process-wide ``PostViewBuffer`` configured from ``settings.POST_VIEW_BUFFER``."""
+    global _post_view_buffer
+    if _post_view_buffer is None:
+        with _post_view_buffer_lock:
+            if _post_view_buffer is None:
+                _post_view_buffer = PostViewBuffer.from_settings()
+    return _post_view_buffer
@@ -0,0 +1,184 @@
+"""Streaming image uploads with early rejection and content-addressed storage.
+
+``HashingImageUploadHandler`` replaces Django's memory/temporary-file
+handlers on the API views that accept images. Every file part is written
+to a temporary file chunk by chunk while its SHA-256 is computed, so a
+worker holds at most one chunk of any upload in memory. Uploads are
+rejected as soon as they can be:
+
+* the request's ``Content-Length`` already exceeds the limit: before any
+  of the body is read;
+* the first chunk does not start like an allowed image format;
+* the image header declares more than ``MAX_PIXELS`` pixels;
+* the running byte count passes ``MAX_SIZE``.
+
+``content_addressed_storage``, the storage of the post and project image
+fields, then stores each file under its digest, so an identical upload
+reuses the file already on disk instead of writing a copy. Other file
+fields keep the default storage and their upload names.
+"""
+import hashlib
+import io
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Leading bytes of each accepted format (WebP also needs "WEBP" at offset 8)
+SIGNATURES = {
+    'JPEG': (b'\xff\xd8\xff',),
+    'PNG': (b'\x89PNG\r\n\x1a\n',),
+    'GIF': (b'GIF87a', b'GIF89a'),
+    'WEBP': (b'RIFF',),
+}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+# Give up on finding the image dimensions after this many bytes
+HEADER_LIMIT = 1024 * 1024
+# Room for the non-file form fields sent alongside an upload
+FORM_OVERHEAD = 64 * 1024
+
+
+def upload_limits():
+    options = getattr(settings, 'UPLOADS', {})
+    return {
+        'max_size': options.get('MAX_SIZE', 10 * 1024 * 1024),
+        'max_pixels': options.get('MAX_PIXELS', 40_000_000),
+        'formats': set(options.get('FORMATS', SIGNATURES)),
+    }
+
+
+class UploadRejected(APIException):
+    """An upload was refused; the body uses the API's error envelope."""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, message):
+        super().__init__({'status': 'error', 'message': message})
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def sniff_format(prefix):
+    """Image format named by the first bytes of a file, or ``None``."""
+    for fmt, signatures in SIGNATURES.items():
+        if prefix.startswith(signatures) and (fmt != 'WEBP' or prefix[8:12] == b'WEBP'):
+            return fmt
+    return None
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """Temporary upload that knows its SHA-256 and verified image format."""
+    sha256 = None
+    image_format = None
+
+
+class HashingImageUploadHandler(FileUploadHandler):
+    """Stream each file part to disk, hashing and validating it on the way."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limits = upload_limits()
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > self.limits['max_size'] + FORM_OVERHEAD:
+            raise UploadTooLarge(self._too_large_message())
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.header = bytearray()
+        self.verified = False
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.limits['max_size']:
+            self._reject(UploadTooLarge(self._too_large_message()))
+        if not self.verified:
+            self._inspect(raw_data)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.verified:
+            self._inspect(b'', final=True)
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def _too_large_message(self):
+        return f"File too large (limit {filesizeformat(self.limits['max_size'])})"
+
+    def _reject(self, error):
+        self.file.close()
+        raise error
+
+    def _inspect(self, chunk, final=False):
+        """Check the format from the first bytes and the dimensions once the header is in."""
+        if not self.header:
+            fmt = sniff_format(bytes(chunk[:12]))
+            if fmt is None or fmt not in self.limits['formats']:
+                self._reject(UploadRejected('Unsupported file type; upload a JPEG, PNG, GIF or WebP image'))
+        self.header += chunk
+        try:
+            with Image.open(io.BytesIO(self.header)) as image:
+                width, height = image.size
+                self.file.image_format = image.format
+        except Image.DecompressionBombError:
+            # Past Pillow's own pixel limit: no more of the header will change that
+            self._reject(UploadRejected(f"Image dimensions too large (limit {self.limits['max_pixels']:,} pixels)"))
+        except (OSError, UnidentifiedImageError, SyntaxError):
+            # Header not complete yet (or never will be)
+            if final or len(self.header) >= HEADER_LIMIT:
+                self._reject(UploadRejected('Invalid or corrupt image'))
+            return
+        if width * height > self.limits['max_pixels']:
+            self._reject(UploadRejected(f'Image dimensions too large ({width}x{height})'))
+        self.verified = True
+        self.header = bytearray()
+
+
+class StreamingUploadMixin:
+    """Parse multipart bodies of a DRF view with ``HashingImageUploadHandler``."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [HashingImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps hashed uploads once, named after their digest.
+
+    Files without a ``sha256`` (admin uploads, generated files) are stored
+    as usual.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            return super().save(name, content, max_length=max_length)
+
+        extension = EXTENSIONS.get(getattr(content, 'image_format', None)) or os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), f'{digest}{extension}')
+        if self.exists(name):
+            content.close()
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -17,10 +17,16 @@ urlpatterns = [
     
     # Analytics and activity
     path('analytics', views.analytics_view, name='analytics'),
+    path('analytics/views', views.view_series_view, name='analytics-views'),
+    path('analytics/activity', views.activity_series_view, name='analytics-activity'),
     path('activity', views.activity_view, name='activity'),
     path('online_users', views.online_users_view, name='online-users'),
     path('menus', views.menu_view, name='menus'),
+    path('search', views.search_view, name='search'),
+    path('tags', views.tags_view, name='tags'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('database-info', views.database_info_view, name='database-info'),
+    path('posts/<int:pk>/events', views.post_events_view, name='post-events'),
     
     # Router URLs
     path('', include(router.urls)),
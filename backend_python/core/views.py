@@ -1,16 +1,32 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
+from rest_framework.fields import BooleanField
 from rest_framework.response import Response
 from django.contrib.auth import login, logout
-from django.db.models import Count
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
 from django.utils import timezone
-from datetime import timedelta
-from .models import User, Post, Project, Comment, Like, Contact, OnlineUser, PostView, ActivityLog, Menu
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+from datetime import datetime, time, timedelta
+from .analytics import ROLLUP_PERIODS, activity_series, get_analytics_snapshot, view_series
+from .audit import get_activity_log_writer, log_activity
+from . import caching, events, images, search
+from .caching import cache_response, conditional_get
+from .models import User, Post, Project, Comment, Like, Contact, OnlineUser, PostView, ActivityLog, Menu, Tag
+from .pagination import PostCursorPagination
+from .presence import get_last_active_buffer, get_presence_tracker
+from .tracking import client_ip, get_post_view_buffer
+from .uploads import StreamingUploadMixin
 from .serializers import (
     UserSerializer, RegisterSerializer, LoginSerializer,
-    PostSerializer, ProjectSerializer, CommentSerializer,
+    PostSerializer, ProjectSerializer, CommentSerializer, CommentTreeSerializer,
     LikeSerializer, ContactSerializer, OnlineUserSerializer,
-    PostViewSerializer, ActivityLogSerializer
+    PostViewSerializer, ActivityLogSerializer, build_comment_tree, drop_orphan_replies
 )
 
 
@@ -45,8 +61,8 @@ def login_view(request):
         else:
             request.session.set_expiry(0)
 
+        get_last_active_buffer().touch(user.pk, stored=user.last_active)
         user.last_active = timezone.now()
-        user.save(update_fields=['last_active'])
         return Response({
             'status': 'success',
             'message': 'Login successful',
@@ -95,39 +111,134 @@ def current_user_view(request):
     }, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+def _split_param(value):
+    """Split a comma separated query parameter into a list of names."""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _int_param(value, default=None):
+    """Parse a non-negative integer query parameter, falling back to ``default``."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number >= 0 else default
+
+
+def _bool_param(value):
+    """Parse an optional boolean parameter; ``None`` when absent, ``ValueError`` when not a boolean."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (bool, int, str)):
+        if value in BooleanField.TRUE_VALUES:
+            return True
+        if value in BooleanField.FALSE_VALUES:
+            return False
+    raise ValueError(f'Not a boolean: {value!r}')
+
+
+# Most posts one like_state request may ask about (the largest post page)
+LIKE_STATE_MAX_POSTS = PostCursorPagination.max_page_size
+
+
+def _post_scopes(request):
+    """Cache scopes of a post list request, or of one post when ``?id=`` is given."""
+    post_id = request.query_params.get('id')
+    return [f'post:{post_id}'] if post_id else ['posts']
+
+
+def _post_detail_scopes(request):
+    return [f"post:{request.parser_context['kwargs'].get('pk')}"]
+
+
+def _comment_scopes(request):
+    """Comments change the scope of the post they belong to."""
+    post_id = request.query_params.get('post_id')
+    return [f'post:{post_id}'] if post_id else ['posts']
+
+
+class PostViewSet(StreamingUploadMixin, viewsets.ModelViewSet):
     """Post CRUD operations"""
     queryset = Post.objects.all()
     serializer_class = PostSerializer
-    
+    pagination_class = PostCursorPagination
+
+    def get_field_selection(self):
+        """Read ``fields``, ``exclude`` and ``view=summary`` from the query string."""
+        params = self.request.query_params
+        selection = {}
+        fields = _split_param(params.get('fields'))
+        exclude = _split_param(params.get('exclude'))
+        if params.get('view') == 'summary':
+            exclude.extend(PostSerializer.SUMMARY_EXCLUDE)
+        if fields:
+            selection['fields'] = fields
+        if exclude:
+            selection['exclude'] = exclude
+        return selection
+
+    def get_list_queryset(self, selection):
+        """Load authors and comments in bulk; skip what the response omits."""
+        posts = self.get_queryset().select_related('author')
+        fields = selection.get('fields')
+        excluded = selection.get('exclude', ())
+
+        def selected(name):
+            return name not in excluded and (not fields or name in fields)
+
+        if not selected('content'):
+            posts = posts.defer('content')
+        if selected('comments'):
+            posts = posts.with_comments()
+        return posts
+
+    @conditional_get(_post_scopes)
+    @cache_response(_post_scopes)
     def list(self, request):
-        """Get all posts or single post by ID"""
+        """Get a page of posts (optionally only those with ``?tag=``) or single post by ID"""
+        selection = self.get_field_selection()
         post_id = request.query_params.get('id')
         if post_id:
             try:
-                post = Post.objects.get(id=post_id)
+                post = self.get_list_queryset(selection).get(id=post_id)
                 return Response({
                     'status': 'success',
-                    'data': self.get_serializer(post).data
+                    'data': self.get_serializer(post, **selection).data
                 })
-            except Post.DoesNotExist:
+            except (Post.DoesNotExist, ValueError):
                 return Response({
                     'status': 'error',
                     'message': 'Post not found'
                 }, status=status.HTTP_404_NOT_FOUND)
-        
-        posts = self.get_queryset()
-        serializer = self.get_serializer(posts, many=True)
-        return Response({
-            'status': 'success',
-            'data': serializer.data
-        })
+
+        posts = self.get_list_queryset(selection)
+        tag = request.query_params.get('tag')
+        if tag:
+            posts = posts.filter(tag_links__tag__slug=slugify(tag))
+        page = self.paginate_queryset(posts)
+        serializer = self.get_serializer(page, many=True, **selection)
+        return self.get_paginated_response(serializer.data)
     
+    @conditional_get(_post_detail_scopes)
+    def retrieve(self, request, *args, **kwargs):
+        """Get a single post by primary key"""
+        return super().retrieve(request, *args, **kwargs)
+
     def create(self, request):
         """Create a new post"""
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            log_activity(
+                'post_created',
+                user=request.user,
+                entity_type='post',
+                entity_id=serializer.instance.id,
+                details=serializer.instance.title,
+                ip_address=client_ip(request)
+            )
             return Response({
                 'status': 'success',
                 'message': 'Post created successfully',
@@ -151,6 +262,14 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(post, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            log_activity(
+                'post_updated',
+                user=request.user,
+                entity_type='post',
+                entity_id=post.id,
+                details=post.title,
+                ip_address=client_ip(request)
+            )
             return Response({
                 'status': 'success',
                 'message': 'Post updated successfully'
@@ -165,6 +284,14 @@ class PostViewSet(viewsets.ModelViewSet):
         try:
             post = Post.objects.get(pk=pk)
             post.delete()
+            log_activity(
+                'post_deleted',
+                user=request.user,
+                entity_type='post',
+                entity_id=int(pk),
+                details=post.title,
+                ip_address=client_ip(request)
+            )
             return Response({
                 'status': 'success',
                 'message': 'Post deleted successfully'
@@ -175,6 +302,24 @@ class PostViewSet(viewsets.ModelViewSet):
                 'message': 'Post not found'
             }, status=status.HTTP_404_NOT_FOUND)
     
+    @action(detail=True, methods=['post'], url_path='view')
+    def record_view(self, request, pk=None):
+        """Queue a page view of a post unless the visitor viewed it within the dedup window"""
+        post_id = _int_param(pk)
+        ip_address = client_ip(request)
+        if post_id is None or ip_address is None:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid post id or client address'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.pk if request.user.is_authenticated else None
+        result = get_post_view_buffer().record(post_id, ip_address, user_id=user_id)
+        return Response({
+            'status': 'success',
+            'result': result
+        }, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=['get'])
     def check_like(self, request):
         """Check if user has liked a post"""
@@ -193,79 +338,138 @@ class PostViewSet(viewsets.ModelViewSet):
             'liked': liked
         })
     
-    @action(detail=False, methods=['post'])
-    def like(self, request):
-        """Like a post"""
-        post_id = request.data.get('post_id')
-        user_id = request.data.get('user_id')
-        
-        if not post_id or not user_id:
+    @action(detail=False, methods=['get'])
+    def like_state(self, request):
+        """Liked state and like count of up to ``LIKE_STATE_MAX_POSTS`` posts, with one query"""
+        params = request.query_params
+        post_ids = [_int_param(post_id) for post_id in _split_param(params.get('post_ids'))]
+        if 'user_id' in params:
+            user_id = _int_param(params['user_id'])
+            valid_user = user_id is not None
+        else:
+            user_id = request.user.pk if request.user.is_authenticated else None
+            valid_user = True
+
+        if not valid_user or not post_ids or None in post_ids or len(post_ids) > LIKE_STATE_MAX_POSTS:
             return Response({
                 'status': 'error',
-                'message': 'Invalid post_id or user_id'
+                'message': f'Pass 1 to {LIKE_STATE_MAX_POSTS} comma separated post_ids and an optional user_id'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        if user_id is None:
+            liked = Value(False)
+        else:
+            liked = Exists(Like.objects.filter(post=OuterRef('pk'), user_id=user_id))
+        rows = Post.objects.filter(pk__in=post_ids).annotate(liked=liked).values_list('id', 'liked', 'likes_count')
+        return Response({
+            'status': 'success',
+            'data': {str(post_id): {'liked': liked, 'likes': likes} for post_id, liked, likes in rows}
+        })
+
+    @action(detail=False, methods=['post'])
+    def toggle_like(self, request):
+        """Flip a like, or set it with ``liked``; repeating a request with ``liked`` changes nothing"""
         try:
-            Like.objects.get_or_create(post_id=post_id, user_id=user_id)
-            return Response({
-                'status': 'success',
-                'message': 'Liked'
-            })
-        except Exception as e:
+            liked = _bool_param(request.data.get('liked'))
+        except ValueError:
             return Response({
                 'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
+                'message': 'liked must be true or false'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return self._set_liked(request.data, liked)
+
+    @action(detail=False, methods=['post'])
+    def like(self, request):
+        """Like a post"""
+        return self._set_liked(request.data, True)
+
     @action(detail=False, methods=['delete'])
     def unlike(self, request):
         """Unlike a post"""
-        post_id = request.query_params.get('post_id')
-        user_id = request.query_params.get('user_id')
-        
-        if not post_id or not user_id:
+        return self._set_liked(request.query_params, False)
+
+    def _set_liked(self, params, liked):
+        post_id = _int_param(params.get('post_id'))
+        user_id = _int_param(params.get('user_id'))
+        if post_id is None or user_id is None:
             return Response({
                 'status': 'error',
                 'message': 'Invalid post_id or user_id'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
+
         try:
-            like = Like.objects.get(post_id=post_id, user_id=user_id)
-            like.delete()
+            liked, changed, likes = Like.set_liked(post_id, user_id, liked)
+        except Post.DoesNotExist:
             return Response({
-                'status': 'success',
-                'message': 'Unliked'
-            })
-        except Like.DoesNotExist:
+                'status': 'error',
+                'message': 'Post not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError:
+            # Foreign keys are checked on commit: the user does not exist
+            return Response({
+                'status': 'error',
+                'message': 'User not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        if self.action == 'unlike' and not changed:
             return Response({
                 'status': 'error',
                 'message': 'Like not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'status': 'success',
+            'message': 'Liked' if liked else 'Unliked',
+            'liked': liked,
+            'changed': changed,
+            'likes': likes
+        })
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(StreamingUploadMixin, viewsets.ModelViewSet):
     """Project CRUD operations"""
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
-    
-    def list(self, request):
-        """Get all projects"""
+
+    def get_list_queryset(self):
         projects = self.get_queryset()
-        serializer = self.get_serializer(projects, many=True)
+        tag = self.request.query_params.get('tag')
+        if tag:
+            projects = projects.filter(tag_links__tag__slug=slugify(tag))
+        return projects
+
+    @conditional_get(lambda request: ['projects'])
+    @cache_response(lambda request: ['projects'])
+    def list(self, request):
+        """Get all projects, optionally only those with ``?tag=``"""
+        serializer = self.get_serializer(self.get_list_queryset(), many=True)
         return Response({
             'status': 'success',
             'data': serializer.data
         })
+
+    @conditional_get(lambda request: ['projects'])
+    def retrieve(self, request, *args, **kwargs):
+        """Get a single project"""
+        return super().retrieve(request, *args, **kwargs)
     
     def create(self, request):
         """Create a new project"""
-        data = request.data.copy()
+        # Shallow copy: QueryDict.copy() deep-copies, which fails on streamed upload files
+        data = dict(request.data.items())
         if isinstance(data.get('tags'), list):
             data['tags'] = ','.join(data['tags'])
         
         serializer = self.get_serializer(data=data)
         if serializer.is_valid():
             serializer.save()
+            log_activity(
+                'project_created',
+                user=request.user,
+                entity_type='project',
+                entity_id=serializer.instance.id,
+                details=serializer.instance.title,
+                ip_address=client_ip(request)
+            )
             return Response({
                 'status': 'success',
                 'message': 'Project created successfully'
@@ -276,48 +480,98 @@ class ProjectViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def reply_queryset(parent_ids):
+    return Comment.objects.filter(parent_id__in=parent_ids).select_related('user', 'post').order_by('-created_at')
+
+
+def attach_replies(comments):
+    """Load the reply threads of ``comments``, one query per level.
+
+    Sets ``reply_list`` on every comment, which ``CommentSerializer`` reads
+    instead of querying ``replies`` for each comment.
+    """
+    level = comments
+    while level:
+        by_id = {comment.id: comment for comment in level}
+        for comment in level:
+            comment.reply_list = []
+        level = list(reply_queryset(by_id))
+        for reply in level:
+            by_id[reply.parent_id].reply_list.append(reply)
+    return comments
+
+
 class CommentViewSet(viewsets.ModelViewSet):
     """Comment CRUD operations"""
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
-    
-    def list(self, request):
-        """Get comments with optional filters"""
-        post_id = request.query_params.get('post_id')
-        status_filter = request.query_params.get('status')
-        limit = request.query_params.get('limit')
 
+    def get_list_queryset(self):
+        """Newest comments, filtered by ``post_id`` and ``status`` and cut to ``limit``."""
+        params = self.request.query_params
         comments = self.get_queryset().select_related('user', 'post').order_by('-created_at')
-        if post_id:
-            comments = comments.filter(post_id=post_id)
-        if status_filter:
-            comments = comments.filter(status=status_filter)
+        if params.get('post_id'):
+            comments = comments.filter(post_id=params['post_id'])
+        if params.get('status'):
+            comments = comments.filter(status=params['status'])
 
-        if limit:
+        if params.get('limit'):
             try:
-                limit_value = int(limit)
-                comments = comments[:limit_value]
+                comments = comments[:int(params['limit'])]
             except (TypeError, ValueError):
                 pass
+        return comments
 
+    @conditional_get(_comment_scopes)
+    def list(self, request):
+        """Get comments with optional filters"""
+        comments = attach_replies(list(self.get_list_queryset()))
         serializer = self.get_serializer(comments, many=True)
         return Response({
             'status': 'success',
             'data': serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    @conditional_get(_comment_scopes)
+    def tree(self, request):
+        """Get the threaded comments of a post, fetched in a single query"""
+        post_id = _int_param(request.query_params.get('post_id'))
+        if post_id is None:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid post_id'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        comments = Comment.objects.filter(post_id=post_id).select_related('user', 'post')
+        status_filter = request.query_params.get('status', 'approved')
+        if status_filter != 'all':
+            comments = comments.filter(status=status_filter)
+
+        comments = drop_orphan_replies(list(comments))
+        roots = build_comment_tree(
+            comments,
+            max_depth=_int_param(request.query_params.get('max_depth')),
+            max_replies=_int_param(request.query_params.get('max_replies')),
+        )
+        return Response({
+            'status': 'success',
+            'count': len(comments),
+            'data': CommentTreeSerializer(roots, many=True, context=self.get_serializer_context()).data
+        })
+
     def create(self, request):
         """Create a new comment"""
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            ActivityLog.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                action='comment_created',
+            log_activity(
+                'comment_created',
+                user=request.user,
                 entity_type='comment',
                 entity_id=serializer.instance.id,
                 details=f"Comment on post {serializer.instance.post_id}",
-                ip_address=request.META.get('REMOTE_ADDR')
+                ip_address=client_ip(request)
             )
             return Response({
                 'status': 'success',
@@ -351,27 +605,157 @@ class ContactViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 def analytics_view(request):
-    """Get analytics data"""
-    total_posts = Post.objects.count()
-    total_projects = Project.objects.count()
-    total_comments = Comment.objects.count()
-    total_likes = Like.objects.count()
-    total_views = PostView.objects.count()
-    
-    popular_posts = Post.objects.annotate(
-        view_count=Count('views')
-    ).order_by('-view_count')[:5]
-    
+    """Get analytics data from the cached snapshot"""
     return Response({
         'status': 'success',
-        'data': {
-            'total_posts': total_posts,
-            'total_projects': total_projects,
-            'total_comments': total_comments,
-            'total_likes': total_likes,
-            'total_views': total_views,
-            'popular_posts': PostSerializer(popular_posts, many=True).data
-        }
+        'data': get_analytics_snapshot()
+    })
+
+
+# Default and maximum span of a rollup series request, per bucket size
+SERIES_RANGES = {
+    'hour': (timedelta(days=2), timedelta(days=31)),
+    'day': (timedelta(days=90), timedelta(days=366)),
+}
+
+
+def _parse_when(value):
+    """Parse an ISO datetime or date query parameter into an aware datetime."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _series_params(request):
+    """Read ``bucket``, ``start`` and ``end`` for a rollup series request."""
+    period = request.query_params.get('bucket', 'day')
+    if period not in ROLLUP_PERIODS:
+        raise ValueError('bucket must be one of: ' + ', '.join(ROLLUP_PERIODS))
+    default_span, max_span = SERIES_RANGES[period]
+    end = _parse_when(request.query_params.get('end')) or timezone.now()
+    start = _parse_when(request.query_params.get('start')) or end - default_span
+    if start >= end:
+        raise ValueError('start must be before end')
+    if end - start > max_span:
+        raise ValueError(f'Range too large for {period} buckets (max {max_span.days} days)')
+    return period, start, end
+
+
+@api_view(['GET'])
+def view_series_view(request):
+    """Get post views per hour or day from the rollup tables"""
+    try:
+        period, start, end = _series_params(request)
+    except ValueError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    post_id = _int_param(request.query_params.get('post_id'))
+    return Response({
+        'status': 'success',
+        'bucket': period,
+        'start': start,
+        'end': end,
+        'data': view_series(period, start, end, post_id=post_id)
+    })
+
+
+@api_view(['GET'])
+def activity_series_view(request):
+    """Get activity log entries per hour or day and action from the rollup tables"""
+    try:
+        period, start, end = _series_params(request)
+    except ValueError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'status': 'success',
+        'bucket': period,
+        'start': start,
+        'end': end,
+        'data': activity_series(
+            period,
+            start,
+            end,
+            action=request.query_params.get('action'),
+            entity_type=request.query_params.get('entity_type'),
+        )
+    })
+
+
+@api_view(['GET'])
+@conditional_get(lambda request: ['posts', 'projects'])
+@cache_response(lambda request: ['posts', 'projects'])
+def tags_view(request):
+    """Get tags with their published post and project counts, most used first"""
+    kind = request.query_params.get('type')
+    tags = Tag.objects.with_counts()
+    if kind == 'post':
+        tags = tags.filter(post_count__gt=0).order_by('-post_count', 'name')
+    elif kind == 'project':
+        tags = tags.filter(project_count__gt=0).order_by('-project_count', 'name')
+    else:
+        tags = tags.filter(Q(post_count__gt=0) | Q(project_count__gt=0))
+        tags = tags.order_by((F('post_count') + F('project_count')).desc(), 'name')
+    limit = _int_param(request.query_params.get('limit'))
+    if limit is not None:
+        tags = tags[:limit]
+    return Response({
+        'status': 'success',
+        'data': [
+            {
+                'name': tag.name,
+                'slug': tag.slug,
+                'posts': tag.post_count,
+                'projects': tag.project_count,
+            }
+            for tag in tags
+        ]
+    })
+
+
+SEARCH_MAX_LIMIT = 50
+
+
+@api_view(['GET'])
+@cache_response(lambda request: ['posts', 'projects'])
+def search_view(request):
+    """Full-text search over published posts and projects"""
+    query = request.query_params.get('q', '').strip()
+    if not search.query_terms(query):
+        return Response({
+            'status': 'error',
+            'message': 'q is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    kinds = _split_param(request.query_params.get('type')) or search.KINDS
+    limit = min(_int_param(request.query_params.get('limit'), 20), SEARCH_MAX_LIMIT)
+    hits = search.search(query, kinds=kinds, limit=limit)
+    return Response({
+        'status': 'success',
+        'data': [
+            {
+                'type': hit.kind,
+                'id': hit.object_id,
+                'title': search.render_highlight(hit.title),
+                'snippet': search.render_highlight(hit.snippet),
+                'rank': hit.rank,
+            }
+            for hit in hits
+        ]
     })
 
 
@@ -388,19 +772,43 @@ def activity_view(request):
 
 @api_view(['GET'])
 def online_users_view(request):
-    """Get online users"""
-    online_users = OnlineUser.objects.all()
-    serializer = OnlineUserSerializer(online_users, many=True)
+    """Get users seen within the presence window, most recent first"""
     return Response({
         'status': 'success',
-        'data': serializer.data
+        'data': get_presence_tracker().online()
     })
 
 
 @api_view(['GET'])
+def metrics_view(request):
+    """Get background writer queue depths and response cache hit rates"""
+    return Response({
+        'status': 'success',
+        'data': {
+            'activity_log': get_activity_log_writer().stats(),
+            'post_views': get_post_view_buffer().stats(),
+            'presence': get_presence_tracker().stats(),
+            'last_active': get_last_active_buffer().stats(),
+            'events': events.get_broker().stats(),
+            'response_cache': caching.metrics.stats(),
+        }
+    })
+
+
+@api_view(['GET'])
+@conditional_get(lambda request: ['menus'])
+@cache_response(lambda request: ['menus'])
 def menu_view(request):
     """Get active menus grouped by type."""
-    menus = Menu.objects.filter(is_active=True).order_by('menu_type', 'order', 'title')
+    return Response({'status': 'success', 'data': group_menus(active_menus())})
+
+
+def active_menus():
+    return Menu.objects.filter(is_active=True).order_by('menu_type', 'order', 'title')
+
+
+def group_menus(menus):
+    """Menu entries keyed by ``menu_type``."""
     grouped = {}
     for menu in menus:
         data = {
@@ -411,7 +819,42 @@ def menu_view(request):
             'parent': menu.parent_id,
         }
         grouped.setdefault(menu.menu_type, []).append(data)
-    return Response({'status': 'success', 'data': grouped})
+    return grouped
+
+
+def image_variant_view(request, variant, fmt, source):
+    """Generate a resized image on first request and redirect to its content-hash URL"""
+    if variant not in images.variant_widths() or fmt not in images.FORMATS or not images.is_source(source):
+        raise Http404('No such image variant')
+    try:
+        manifest = images.generate_variants(source)
+    except ValueError:
+        raise Http404('Not a readable image')
+    return redirect(default_storage.url(manifest['variants'][variant][fmt]))
+
+
+async def post_events_view(request, pk):
+    """Stream a post's new comments, likes and counter changes as server-sent events"""
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would hold a worker forever
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Event streams are only served by the ASGI application'
+        }, status=501)
+    try:
+        counters = await Post.objects.filter(pk=pk).values('id', *events.COUNTER_FIELDS).aget()
+    except Post.DoesNotExist:
+        raise Http404('Post not found')
+    response = StreamingHttpResponse(
+        events.stream(events.post_topic(pk), initial=[('counters', counters)]),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @api_view(['GET'])
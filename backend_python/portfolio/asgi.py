@@ -2,6 +2,8 @@
 ASGI config for portfolio project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests it serves are routed through ``portfolio.asgi_urls``, which puts the
+async read endpoints in front of the regular URLconf.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,19 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfolio.settings')
 
-application = get_asgi_application()
+
+class PortfolioASGIHandler(ASGIHandler):
+    urlconf = 'portfolio.asgi_urls'
+
+    async def get_response_async(self, request):
+        request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = PortfolioASGIHandler()
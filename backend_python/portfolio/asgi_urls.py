@@ -0,0 +1,18 @@
+"""URLconf of the ASGI application: async read endpoints ahead of ``portfolio.urls``.
+
+Each route here shadows the DRF route of the same path; requests other
+than GET/HEAD are passed on to the DRF view by ``core.async_views``.
+"""
+from django.urls import path
+
+from core import async_views
+from portfolio.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('posts/', async_views.post_list, name='post-list'),
+    path('posts/<int:pk>/', async_views.post_detail, name='post-detail'),
+    path('projects/', async_views.project_list, name='project-list'),
+    path('comments/', async_views.comment_list, name='comment-list'),
+    path('menus', async_views.menu_list, name='menus'),
+    *sync_urlpatterns,
+]
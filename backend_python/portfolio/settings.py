@@ -46,12 +46,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.presence.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -129,6 +130,60 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Serve MEDIA_ROOT from the app (core.media) in every environment; turn off when a web server
+# or CDN serves it. MEDIA_MAX_AGE is the browser cache lifetime of files without a content hash.
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', 'True') == 'True'
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+
+# Limits for images uploaded through the API. Uploads are streamed to temporary files and
+# rejected as soon as they exceed MAX_SIZE bytes, are not one of FORMATS or declare more
+# than MAX_PIXELS pixels.
+UPLOADS = {
+    'MAX_SIZE': int(os.environ.get('UPLOAD_MAX_SIZE', 10 * 1024 * 1024)),
+    'MAX_PIXELS': int(os.environ.get('UPLOAD_MAX_PIXELS', 40_000_000)),
+    'FORMATS': os.environ.get('UPLOAD_FORMATS', 'JPEG,PNG,GIF,WEBP').split(','),
+}
+
+# Resized/WebP variants of uploaded images (see core.images). EAGER generates them in a
+# WORKERS-thread pool right after upload; otherwise on the first request for each variant.
+IMAGE_VARIANTS = {
+    'WIDTHS': {'thumb': 320, 'card': 800, 'full': 1600},
+    'QUALITY': int(os.environ.get('IMAGE_VARIANT_QUALITY', 82)),
+    'WEBP_QUALITY': int(os.environ.get('IMAGE_VARIANT_WEBP_QUALITY', 80)),
+    'EAGER': os.environ.get('IMAGE_VARIANTS_EAGER', 'True') == 'True',
+    'WORKERS': int(os.environ.get('IMAGE_VARIANT_WORKERS', 2)),
+}
+
+# Caches
+# The "responses" cache backs core.caching; RESPONSE_CACHE_BACKEND picks local memory (per process),
+# files shared by all workers on one host, or a Redis-compatible server at REDIS_URL (Redis 6+,
+# Valkey, KeyDB, Render Key Value) that must be running and reachable; the client is in requirements.txt.
+RESPONSE_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'portfolio-responses',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('RESPONSE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        **RESPONSE_CACHE_BACKENDS[os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')],
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+        'KEY_PREFIX': 'portfolio',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -157,3 +212,84 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
 }
+
+# Buffered PostView ingestion (see core.tracking)
+POST_VIEW_BUFFER = {
+    'FLUSH_SIZE': int(os.environ.get('POST_VIEW_FLUSH_SIZE', 500)),
+    'FLUSH_INTERVAL': float(os.environ.get('POST_VIEW_FLUSH_INTERVAL', 5)),
+    'MAX_PENDING': int(os.environ.get('POST_VIEW_MAX_PENDING', 10000)),
+}
+
+# Proxies whose X-Forwarded-For header is believed (see core.tracking.client_ip): addresses or
+# networks, comma separated; "*" trusts the connecting peer, e.g. a platform load balancer
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.environ.get('TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+
+# Per-visitor view deduplication in front of the PostView buffer
+# BACKEND is 'bloom' (fixed MAX_BYTES, ERROR_RATE false positives) or 'lru' (exact, MAX_ENTRIES keys)
+POST_VIEW_DEDUP = {
+    'BACKEND': os.environ.get('POST_VIEW_DEDUP_BACKEND', 'bloom'),
+    'WINDOW': int(os.environ.get('POST_VIEW_DEDUP_WINDOW', 1800)),
+    'ERROR_RATE': float(os.environ.get('POST_VIEW_DEDUP_ERROR_RATE', 0.001)),
+    'MAX_BYTES': int(os.environ.get('POST_VIEW_DEDUP_MAX_BYTES', 1024 * 1024)),
+    'MAX_ENTRIES': int(os.environ.get('POST_VIEW_DEDUP_MAX_ENTRIES', 100000)),
+}
+
+# Presence (see core.presence): users are online for WINDOW seconds after their last request;
+# OnlineUser rows are written at most once per WRITE_INTERVAL per user, in batches every
+# FLUSH_INTERVAL seconds. CACHE names a shared cache alias (e.g. "responses" on Redis)
+# so that every worker process sees the users of the others.
+PRESENCE = {
+    'WINDOW': int(os.environ.get('PRESENCE_WINDOW', 300)),
+    'WRITE_INTERVAL': int(os.environ.get('PRESENCE_WRITE_INTERVAL', 60)),
+    'FLUSH_INTERVAL': float(os.environ.get('PRESENCE_FLUSH_INTERVAL', 10)),
+    'CACHE': os.environ.get('PRESENCE_CACHE', ''),
+}
+
+# User.last_active is kept in memory and written every FLUSH_INTERVAL seconds in batches of
+# BATCH_SIZE users, only when it moves forward by at least GRANULARITY seconds
+LAST_ACTIVE = {
+    'GRANULARITY': int(os.environ.get('LAST_ACTIVE_GRANULARITY', 60)),
+    'FLUSH_INTERVAL': float(os.environ.get('LAST_ACTIVE_FLUSH_INTERVAL', 30)),
+    'BATCH_SIZE': int(os.environ.get('LAST_ACTIVE_BATCH_SIZE', 500)),
+}
+
+# Server-sent post events (see core.events; served by portfolio.asgi). BROKER 'local' fans out
+# within one process; 'redis' relays through Redis pub/sub for several processes (needs `redis`).
+# QUEUE_SIZE bounds the events buffered per connection, KEEPALIVE the seconds between pings.
+EVENTS = {
+    'BROKER': os.environ.get('EVENTS_BROKER', 'local'),
+    'REDIS_URL': os.environ.get('EVENTS_REDIS_URL', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/2')),
+    'QUEUE_SIZE': int(os.environ.get('EVENTS_QUEUE_SIZE', 100)),
+    'KEEPALIVE': int(os.environ.get('EVENTS_KEEPALIVE', 15)),
+}
+
+# Maximum age in seconds of the cached /analytics snapshot (see core.analytics)
+ANALYTICS_SNAPSHOT_MAX_AGE = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', 60))
+
+# Full-text search engine (see core.search): 'auto' uses SQLite FTS5 or PostgreSQL
+# tsvector when the index table exists, 'python' forces the in-process inverted index
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+
+# Rollups (manage.py rollup_analytics) only fold rows older than this many seconds, so that
+# rows whose ids were assigned before a concurrent commit are never skipped
+ROLLUP_LAG = int(os.environ.get('ROLLUP_LAG', 600))
+
+# Retention for high-volume history tables (manage.py prune_history)
+HISTORY_RETENTION = {
+    'activity_log': {
+        'MAX_AGE_DAYS': int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 180)),
+        'ARCHIVE': True,
+    },
+    'post_views': {
+        'MAX_AGE_DAYS': int(os.environ.get('POST_VIEW_RETENTION_DAYS', 90)),
+        'ARCHIVE': False,
+    },
+}
+HISTORY_ARCHIVE_DIR = os.environ.get('HISTORY_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+
+# Background ActivityLog writer (see core.audit)
+AUDIT_LOG = {
+    'BATCH_SIZE': int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 200)),
+    'FLUSH_INTERVAL': float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 1)),
+    'MAX_PENDING': int(os.environ.get('AUDIT_LOG_MAX_PENDING', 10000)),
+}
@@ -17,8 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.http import JsonResponse
+from core.media import serve_media
+from core.views import image_variant_view
 
 def api_root(request):
     return JsonResponse({
@@ -40,7 +41,12 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_root),
     path('', include('core.urls')),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}resize/<str:variant>/<str:fmt>/<path:source>",
+        image_variant_view,
+        name='image-variant',
+    ),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_MEDIA:
+    urlpatterns.append(path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", serve_media, name='media'))
@@ -26,4 +26,17 @@ axiosInstance.interceptors.response.use(
   }
 );
 
+// Fetch every item of a cursor-paginated listing by following its `next` links
+export async function fetchAllPages(path) {
+  const items = [];
+  let url = path;
+  while (url) {
+    const res = await axiosInstance.get(url);
+    const page = res.data?.data;
+    if (Array.isArray(page)) items.push(...page);
+    url = res.data?.next || null;
+  }
+  return items;
+}
+
 export default axiosInstance;
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import axiosInstance from "../axiosConfig";
+import axiosInstance, { fetchAllPages } from "../axiosConfig";
 
 function getUser() {
   try {
@@ -33,9 +33,7 @@ export default function AdminBlog() {
   const fetchPosts = async () => {
     try {
       setLoading(true);
-      const res = await axiosInstance.get("/posts");
-      const postsData = res.data?.data || res.data || [];
-      setPosts(Array.isArray(postsData) ? postsData : []);
+      setPosts(await fetchAllPages("/posts?page_size=100"));
       setError("");
     } catch (err) {
       setError("Failed to fetch posts: " + (err.response?.data?.message || err.message));
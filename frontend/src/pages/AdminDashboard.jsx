@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import axiosInstance from "../axiosConfig";
+import axiosInstance, { fetchAllPages } from "../axiosConfig";
 
 function getUser() {
   try {
@@ -36,8 +36,7 @@ export default function AdminDashboard() {
   }, [activeTab]);
 
   const fetchPosts = async () => {
-    const res = await axiosInstance.get("/posts");
-    setPosts(Array.isArray(res.data.data) ? res.data.data : []);
+    setPosts(await fetchAllPages("/posts?page_size=100"));
   };
 
   const fetchProjects = async () => {
@@ -76,11 +75,11 @@ export default function AdminDashboard() {
 
   const fetchAnalytics = async () => {
     try {
-      const postsRes = await axiosInstance.get("/posts");
+      const allPosts = await fetchAllPages("/posts?view=summary&page_size=100");
       const projectsRes = await axiosInstance.get("/projects");
       const usersRes = await axiosInstance.get(`auth?action=users&user_id=${user.id}`);
       setAnalytics({
-        totalPosts: Array.isArray(postsRes.data?.data) ? postsRes.data.data.length : 0,
+        totalPosts: allPosts.length,
         totalProjects: Array.isArray(projectsRes.data?.data) ? projectsRes.data.data.length : 0,
         totalUsers: Array.isArray(usersRes.data?.users) ? usersRes.data.users.length : 0,
         totalComments: 0,
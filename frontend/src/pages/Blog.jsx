@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import axiosInstance from "../axiosConfig";
+import axiosInstance, { fetchAllPages } from "../axiosConfig";
 
 function getUser() {
   try {
@@ -23,16 +23,13 @@ export default function Blog() {
 
   useEffect(() => {
     fetchPosts();
-    if (user) {
-      checkUserLikes();
-    }
   }, []);
 
   const fetchPosts = async () => {
     try {
       setLoading(true);
-      const res = await axiosInstance.get("/posts");
-      const apiPosts = Array.isArray(res.data?.data) ? res.data.data : [];
+      // Every page of the listing; comment threads are only needed on the post page
+      const apiPosts = await fetchAllPages("/posts?exclude=comments&page_size=100");
       // Normalize posts data to ensure arrays exist
       const normalizedPosts = apiPosts.map(post => ({
         ...post,
@@ -40,6 +37,9 @@ export default function Blog() {
         tags: Array.isArray(post.tags) ? post.tags : []
       }));
       setPosts(normalizedPosts);
+      if (user) {
+        checkUserLikes(normalizedPosts);
+      }
     } catch (err) {
       console.error("Failed to fetch posts:", err);
       setPosts([]);
@@ -48,23 +48,17 @@ export default function Blog() {
     }
   };
 
-  const checkUserLikes = async () => {
+  const checkUserLikes = async (apiPosts) => {
     try {
-      const res = await axiosInstance.get("/posts");
-      const apiPosts = Array.isArray(res.data?.data) ? res.data.data : [];
-      const liked = new Set();
-      
-      for (const post of apiPosts) {
-        try {
-          const likeRes = await axiosInstance.get(`/posts?action=check_like&post_id=${post.id}&user_id=${user.id}`);
-          if (likeRes.data.liked) {
-            liked.add(post.id);
-          }
-        } catch (err) {
-          console.error(`Error checking like for post ${post.id}:`, err);
-        }
+      // One request per 100 posts instead of one per post
+      const state = {};
+      for (let i = 0; i < apiPosts.length; i += 100) {
+        const ids = apiPosts.slice(i, i + 100).map(post => post.id).join(",");
+        const stateRes = await axiosInstance.get(`/posts/like_state/?post_ids=${ids}&user_id=${user.id}`);
+        Object.assign(state, stateRes.data?.data || {});
       }
-      
+      const liked = new Set(apiPosts.filter(post => state[post.id]?.liked).map(post => post.id));
+
       setLikedPosts(liked);
     } catch (err) {
       console.error("Error checking user likes:", err);
@@ -83,24 +77,25 @@ export default function Blog() {
     
     try {
       const isLiked = likedPosts.has(postId);
-      
-      if (isLiked) {
-        await axiosInstance.delete(`/posts?action=like&post_id=${postId}&user_id=${user.id}`);
-        setLikedPosts(prev => {
-          const newSet = new Set(prev);
+      const res = await axiosInstance.post("/posts/toggle_like/", {
+        post_id: postId,
+        user_id: user.id,
+        liked: !isLiked
+      });
+      const { liked, likes } = res.data;
+
+      setLikedPosts(prev => {
+        const newSet = new Set(prev);
+        if (liked) {
+          newSet.add(postId);
+        } else {
           newSet.delete(postId);
-          return newSet;
-        });
-        setPosts(prevPosts => prevPosts.map(p => 
-          p.id === postId ? { ...p, likes: Math.max(0, (p.likes || 0) - 1) } : p
-        ));
-      } else {
-        await axiosInstance.post("/posts?action=like", { post_id: postId, user_id: user.id });
-        setLikedPosts(prev => new Set(prev).add(postId));
-        setPosts(prevPosts => prevPosts.map(p => 
-          p.id === postId ? { ...p, likes: (p.likes || 0) + 1 } : p
-        ));
-      }
+        }
+        return newSet;
+      });
+      setPosts(prevPosts => prevPosts.map(p =>
+        p.id === postId ? { ...p, likes } : p
+      ));
     } catch (err) {
       console.error("Failed to like/unlike:", err);
       alert("Failed to update like. Please try again.");
@@ -205,7 +200,7 @@ export default function Blog() {
                     onClick={(e) => e.stopPropagation()}
                   >
                     <i className="bi bi-chat-fill me-1"></i>
-                    {post.comments?.length || 0}
+                    {post.comments_count || 0}
                   </Link>
                 </div>
                 <Link to={`/blog/${post.id}`} className="btn btn-sm btn-primary">
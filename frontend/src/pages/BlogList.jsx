@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import axiosInstance from "../axiosConfig";
+import { fetchAllPages } from "../axiosConfig";
 import BlogCard from "../components/BlogCard";
 import CategoryFilter from "../components/CategoryFilter";
 import SearchBar from "../components/SearchBar";
@@ -10,9 +10,7 @@ export default function BlogList() {
   const [search, setSearch] = useState("");
 
   useEffect(() => {
-    axiosInstance.get("/posts").then(res => {
-      setPosts(Array.isArray(res.data) ? res.data : []);
-    });
+    fetchAllPages("/posts?exclude=comments&page_size=100").then(setPosts);
   }, []);
 
   const filteredPosts = posts.filter(post => {
@@ -46,12 +46,46 @@ export default function BlogPost() {
 
   useEffect(() => {
     fetchPost();
-    // Auto-refresh every 30 seconds for real-time updates
-    const interval = setInterval(() => {
-      fetchPostSilently();
-    }, 30000);
-    
-    return () => clearInterval(interval);
+
+    // Live counters and comments over server-sent events; poll every 30 seconds
+    // only if the stream is not available (e.g. a WSGI deployment answers 501)
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) interval = setInterval(fetchPostSilently, 30000);
+    };
+
+    if (typeof EventSource === "undefined") {
+      startPolling();
+      return () => clearInterval(interval);
+    }
+
+    const source = new EventSource(`${axiosInstance.defaults.baseURL}/posts/${id}/events`, {
+      withCredentials: true,
+    });
+    let connected = false;
+    source.onopen = () => {
+      connected = true;
+    };
+    source.addEventListener("counters", (event) => {
+      const counters = JSON.parse(event.data);
+      setLikeCount(counters.likes_count || 0);
+      setCommentCount(counters.approved_comments_count || 0);
+    });
+    source.addEventListener("comment", () => {
+      setRefreshComments(prev => prev + 1);
+    });
+    source.onerror = () => {
+      // EventSource reconnects by itself after a dropped stream; give up if it never opened
+      if (!connected || source.readyState === EventSource.CLOSED) {
+        source.close();
+        startPolling();
+      }
+    };
+
+    return () => {
+      source.close();
+      clearInterval(interval);
+    };
   }, [id]);
 
   const fetchPost = async () => {
@@ -68,7 +102,10 @@ export default function BlogPost() {
       setPost(normalizedPost);
       setLikeCount(p.likes || 0);
       setCommentCount(normalizedPost.comments.length);
-      
+
+      // Record the page view once per load (not on the silent refreshes)
+      axiosInstance.post(`/posts/${p.id}/view/`).catch(() => {});
+
       if (user) {
         // Check if user has liked this post
         checkUserLike();
@@ -95,8 +132,8 @@ export default function BlogPost() {
 
   const checkUserLike = async () => {
     try {
-      const res = await axiosInstance.get(`/posts?action=check_like&post_id=${id}&user_id=${user.id}`);
-      setLiked(res.data.liked || false);
+      const res = await axiosInstance.get(`/posts/like_state/?post_ids=${id}&user_id=${user.id}`);
+      setLiked(res.data?.data?.[id]?.liked || false);
     } catch (err) {
       console.error("Error checking like status:", err);
       setLiked(false);
@@ -111,15 +148,13 @@ export default function BlogPost() {
     }
     
     try {
-      if (liked) {
-        await axiosInstance.delete(`/posts?action=like&post_id=${post.id}&user_id=${user.id}`);
-        setLikeCount(prev => Math.max(0, prev - 1));
-        setLiked(false);
-      } else {
-        await axiosInstance.post("/posts?action=like", { post_id: post.id, user_id: user.id });
-        setLikeCount(prev => prev + 1);
-        setLiked(true);
-      }
+      const res = await axiosInstance.post("/posts/toggle_like/", {
+        post_id: post.id,
+        user_id: user.id,
+        liked: !liked
+      });
+      setLiked(res.data.liked);
+      setLikeCount(res.data.likes);
     } catch (err) {
       console.error("Failed to like/unlike:", err);
       alert("Failed to update like. Please try again.");